@@ -1,5 +1,6 @@
  from config import *
 import glob
+import json
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, accuracy_score, precision_recall_fscore_support
 from tensorflow.keras.utils import plot_model
@@ -106,6 +107,9 @@ class DementiaDetectionModel:
         self.model_save_dir = os.path.join(model_save_dir, model_name)  # 保存模型路径 # Model saving path
         if not os.path.exists(self.model_save_dir):
             os.makedirs(self.model_save_dir)
+        # 保存手工特征标准化参数，供后端推理使用 # Save the handcrafted-feature scaler for the backend (features.py)
+        with open(os.path.join(self.model_save_dir, "handcrafted_scaler.json"), "w") as f:
+            json.dump({"mean": ss_hand.mean_.tolist(), "scale": ss_hand.scale_.tolist()}, f)
         self.num_heads = 4
         self.model_name = model_name
         self.wr = get_weight_regularizer(self.train_label.shape[0], l=1e-2, tau=1.0)
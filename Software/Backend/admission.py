@@ -0,0 +1,200 @@
+"""
+Admission control for CPU- and memory-heavy prediction stages.
+
+A StageLimiter lets at most `limit` callers into a stage at once and parks
+up to `max_queue` more in a FIFO-ish wait queue for at most `max_wait`
+seconds (or until the request deadline, if sooner). Anyone beyond that is
+refused straight away with Overloaded, which the API turns into a 429 with
+Retry-After: under overload most requests are served quickly and the rest
+are told to come back, instead of every request getting slow.
+
+Threads take a slot with `slot()`; coroutines (asgi.py) with
+`async_slot()`, which waits on the event loop instead of blocking a thread.
+Both share the same slots and queue.
+"""
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import callback, counter, histogram
+from resilience import remaining
+
+WAIT_SECONDS = histogram("neurovoice_admission_wait_seconds", "Time spent queued for a stage slot.", ["stage"],
+                         buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+REJECTED = counter("neurovoice_admission_rejected_total", "Requests refused a stage slot (queue_full, timeout).",
+                   ["stage", "reason"])
+
+
+class Overloaded(Exception):
+    """No slot in `stage` now or soon; retry after `retry_after` seconds."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"Server busy ({stage}), retry in {retry_after}s.")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    _all = []
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit  # 0 disables the limiter
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._service = 1.0  # moving average of the time a slot is held, for Retry-After
+        self._reset()
+        StageLimiter._all.append(self)
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._async_waiters = collections.deque()  # (loop, future) of queued coroutines
+
+    @contextmanager
+    def slot(self):
+        """Holds one slot of the stage for the block; raises Overloaded if none comes up in time."""
+        if self.limit <= 0:
+            yield
+            return
+        self._acquire()
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - t0)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """slot() for coroutines."""
+        if self.limit <= 0:
+            yield
+            return
+        await self._acquire_async()
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - t0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"running": self._running, "waiting": self._waiting, "limit": self.limit}
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained, at least 1."""
+        return max(1, math.ceil(self._service * (self._waiting + 1) / self.limit))
+
+    def _acquire(self):
+        with self._cond:
+            if self._running < self.limit and self._waiting == 0:
+                self._running += 1
+                WAIT_SECONDS.observe(0, stage=self.name)
+                return
+            if self._waiting >= self.max_queue:
+                REJECTED.inc(stage=self.name, reason="queue_full")
+                raise Overloaded(self.name, self.retry_after())
+            wait = self.max_wait
+            left = remaining()
+            if left is not None:
+                wait = min(wait, left)
+            t0 = time.monotonic()
+            self._waiting += 1
+            try:
+                while self._running >= self.limit:
+                    timeout = t0 + wait - time.monotonic()
+                    if timeout <= 0:
+                        REJECTED.inc(stage=self.name, reason="timeout")
+                        raise Overloaded(self.name, self.retry_after())
+                    self._cond.wait(timeout)
+                self._running += 1
+            finally:
+                self._waiting -= 1
+            WAIT_SECONDS.observe(time.monotonic() - t0, stage=self.name)
+
+    async def _acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._running < self.limit and self._waiting == 0:
+                self._running += 1
+                WAIT_SECONDS.observe(0, stage=self.name)
+                return
+            if self._waiting >= self.max_queue:
+                REJECTED.inc(stage=self.name, reason="queue_full")
+                raise Overloaded(self.name, self.retry_after())
+            wait = self.max_wait
+            left = remaining()
+            if left is not None:
+                wait = min(wait, left)
+            waiter = (loop, loop.create_future())
+            self._async_waiters.append(waiter)
+            self._waiting += 1
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter[1], max(0.0, wait))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+            if waiter[1].done() and not waiter[1].cancelled():
+                self._free()  # the slot was handed over just as we gave up
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            REJECTED.inc(stage=self.name, reason="timeout")
+            raise Overloaded(self.name, self.retry_after())
+        finally:
+            with self._cond:
+                self._waiting -= 1
+        WAIT_SECONDS.observe(time.monotonic() - t0, stage=self.name)
+
+    def _release(self, held: float):
+        with self._cond:
+            self._service = 0.9 * self._service + 0.1 * held
+        self._free()
+
+    def _free(self):
+        with self._cond:
+            while self._async_waiters:
+                # A queued coroutine gets the slot directly (it stays counted as running); if it
+                # gave up meanwhile, _hand_over() frees the slot again
+                loop, future = self._async_waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, future)
+                    return
+                except RuntimeError:
+                    continue  # its event loop is closed
+            self._running -= 1
+            self._cond.notify()
+
+    def _hand_over(self, future: asyncio.Future):
+        if future.done():
+            self._free()
+        else:
+            future.set_result(None)
+
+
+def _after_fork():
+    for limiter in StageLimiter._all:
+        limiter._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _in_flight():
+    out = {}
+    for limiter in StageLimiter._all:
+        st = limiter.stats()
+        out[(limiter.name, "running")] = st["running"]
+        out[(limiter.name, "queued")] = st["waiting"]
+    return out
+
+
+callback("neurovoice_admission_stage_depth", "Requests holding (running) or waiting for (queued) a stage slot.",
+         "gauge", ["stage", "state"], _in_flight)
@@ -1,43 +1,458 @@
+import io
 import os
 import json
+import importlib
 import tempfile
-from typing import Tuple, Optional
+import threading
+import time
+import array
+import math
+import operator
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import IO, Any, Callable, Dict, List, NamedTuple, Tuple, Optional, Union
 from flask_login import current_user
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Request, Response, request, jsonify, current_app, stream_with_context, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import speech_recognition as sr
 import boto3
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
+from admission import Overloaded, StageLimiter
+from batching import MicroBatcher
+from cache import TieredCache, audio_digest
+from decoding import COMPRESSED_EXTENSIONS, read_audio
+from jobs import JobQueue, QueueFull
+from uploads import UploadError, UploadStore
+from metrics import stage, callback, counter
+from resilience import CircuitBreaker, DeadlineExceeded, LatencyWindow, deadline_scope, hedged_call, remaining, retry_call
 
 load_dotenv()
 
 api = Blueprint("api", __name__)
 
 # --- Config ---
-ALLOWED_EXTENSIONS = {"wav", "flac", "aif", "aiff", "aifc"}
+ALLOWED_EXTENSIONS = {"wav", "flac", "aif", "aiff", "aifc"} | COMPRESSED_EXTENSIONS  # see decoding.py
 MAX_FILE_MB = 25  # guardrail
+# Uploads stay in memory up to this size and only spill to disk above it
+UPLOAD_SPOOL_MB = float(os.getenv("UPLOAD_SPOOL_MB", str(MAX_FILE_MB)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR")  # where spilled uploads go, e.g. /dev/shm
 
-def get_sagemaker_client():
-    region = os.getenv("AWS_REGION")
-    aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
-    aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-    return boto3.client(
+# Resumable chunked uploads (/api/uploads) for recordings too large or connections too
+# flaky for one request; assembled on disk, so they may exceed MAX_FILE_MB
+UPLOAD_STORE_DIR = os.getenv("UPLOAD_STORE_DIR", os.path.join(os.path.dirname(__file__), "instance", "uploads"))
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "500"))
+UPLOAD_CHUNK_MB = float(os.getenv("UPLOAD_CHUNK_MB", "8"))  # largest chunk one PUT may carry
+UPLOAD_MIN_CHUNK_KB = float(os.getenv("UPLOAD_MIN_CHUNK_KB", "64"))  # smallest chunk size clients should use
+UPLOAD_TTL = float(os.getenv("UPLOAD_TTL", str(24 * 3600)))  # unfinished sessions and stored recordings
+# Scoring decodes the whole recording into memory (16 kHz 16-bit PCM, ~1.9 MB per minute, on top
+# of the file for WAV; an hour of MP3 decodes to ~115 MB), so finalize only scores recordings up to this
+UPLOAD_PREDICT_MAX_MB = min(UPLOAD_MAX_MB, float(os.getenv("UPLOAD_PREDICT_MAX_MB", "100")))
+
+# Background prediction jobs (/api/predict/jobs): ASR concurrency is sized here, not by the WSGI server
+PREDICT_JOB_WORKERS = int(os.getenv("PREDICT_JOB_WORKERS", "4"))
+PREDICT_JOB_MAX_PENDING = int(os.getenv("PREDICT_JOB_MAX_PENDING", "32"))  # queued + running
+PREDICT_JOB_TTL = float(os.getenv("PREDICT_JOB_TTL", "3600"))  # seconds a finished job is kept
+
+# Speech recognition: "google" (remote), "vosk" or "sphinx" (offline, CPU) or "stub" (fixed text, for tests)
+ASR_ENGINE = os.getenv("ASR_ENGINE", "google").lower()
+ASR_GOOGLE_ENDPOINT = os.getenv("ASR_GOOGLE_ENDPOINT", "http://www.google.com/speech-api/v2/recognize")
+ASR_GOOGLE_KEY = os.getenv("ASR_GOOGLE_KEY")  # None: speech_recognition's shared demo key
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", os.path.join(os.path.dirname(__file__), "models", "vosk"))
+ASR_STUB_TEXT = os.getenv("ASR_STUB_TEXT", "the boy is on the stool reaching for the cookie jar "
+                                           "and the mother is drying dishes while the sink overflows")
+
+# Long recordings are split at pauses and the pieces transcribed concurrently
+ASR_CHUNKED = os.getenv("ASR_CHUNKED", "1") == "1"
+ASR_CHUNK_MAX_SECONDS = float(os.getenv("ASR_CHUNK_MAX_SECONDS", "30"))
+ASR_CHUNK_MIN_SILENCE = float(os.getenv("ASR_CHUNK_MIN_SILENCE", "0.3"))  # shortest pause to cut at, seconds
+ASR_CHUNK_SILENCE_DB = float(os.getenv("ASR_CHUNK_SILENCE_DB", "-25"))  # relative to the loudest frame
+ASR_CHUNK_WORKERS = int(os.getenv("ASR_CHUNK_WORKERS", "8"))
+
+# Multi-file uploads (/api/predict/batch)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_MAX_CONTENT_MB = int(os.getenv("BATCH_MAX_CONTENT_MB", "500"))  # whole request; MAX_FILE_MB still applies per file
+# Batch files are kept in memory only up to this (UPLOAD_SPOOL_MB would let one request hold
+# BATCH_MAX_CONTENT_MB of RAM); the rest spills to UPLOAD_SPOOL_DIR
+BATCH_SPOOL_MB = float(os.getenv("BATCH_SPOOL_MB", "1"))
+BATCH_ASR_WORKERS = int(os.getenv("BATCH_ASR_WORKERS", "4"))
+
+# Inference backend: "sagemaker" (remote endpoint) or "local" (in-process Keras DEMENTIA model)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "sagemaker").lower()
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", os.path.join(os.path.dirname(__file__), "models", "DEMENTIA.h5"))
+# "module:callable" turning a ModelInput into {"in_a": ..., "mask_a": ..., "in_t": ..., "in_h": ...}
+LOCAL_MODEL_FEATURIZER = os.getenv("LOCAL_MODEL_FEATURIZER", "features:pipeline")
+# INFERENCE_FALLBACK=local puts the SageMaker backend behind a circuit breaker that
+# sends scoring to the local model while the endpoint is failing or too slow
+INFERENCE_FALLBACK = os.getenv("INFERENCE_FALLBACK", "").lower()
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # recent calls the failure rate is taken over
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_MS = float(os.getenv("BREAKER_SLOW_MS", "5000"))  # slower calls count as failures
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))  # before probing the endpoint again
+
+# Content-addressed caches for transcripts and predictions; size 0 and no DB disables them
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))  # entries per cache, per process
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB")  # optional SQLite file shared by workers on a host
+MODEL_VERSION = os.getenv("MODEL_VERSION")  # part of prediction cache keys; defaults to the backend's endpoint (or model file hash)
+
+# Micro-batching of model calls across concurrent requests; 1 disables it.
+# Also the most rows /api/predict/batch puts into one model call.
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "1"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+PREDICT_BATCH_MAX_INFLIGHT = int(os.getenv("PREDICT_BATCH_MAX_INFLIGHT", "4"))
+
+# SageMaker runtime client: one per process, shared by all request threads
+SAGEMAKER_MAX_CONNECTIONS = int(os.getenv("SAGEMAKER_MAX_CONNECTIONS", "32"))
+SAGEMAKER_CONNECT_TIMEOUT = float(os.getenv("SAGEMAKER_CONNECT_TIMEOUT", "2"))
+SAGEMAKER_READ_TIMEOUT = float(os.getenv("SAGEMAKER_READ_TIMEOUT", "30"))
+SAGEMAKER_MAX_ATTEMPTS = int(os.getenv("SAGEMAKER_MAX_ATTEMPTS", "2"))  # total, first try included
+SAGEMAKER_RETRY_BASE_MS = float(os.getenv("SAGEMAKER_RETRY_BASE_MS", "50"))  # full-jitter backoff between attempts
+SAGEMAKER_RETRY_CAP_MS = float(os.getenv("SAGEMAKER_RETRY_CAP_MS", "1000"))
+# Hedging: a second invocation starts once the first has run longer than this
+# percentile of recent call latencies (never sooner than the min delay); 0 disables it
+SAGEMAKER_HEDGE_PERCENTILE = float(os.getenv("SAGEMAKER_HEDGE_PERCENTILE", "0"))
+SAGEMAKER_HEDGE_MIN_DELAY_MS = float(os.getenv("SAGEMAKER_HEDGE_MIN_DELAY_MS", "20"))
+SAGEMAKER_ENDPOINT_URL = os.getenv("SAGEMAKER_ENDPOINT_URL")  # e.g. a local stand-in
+
+# Admission control: requests allowed into each heavy stage at once, how many more may
+# queue for a slot (beyond that: 429 + Retry-After) and how long they may wait; 0 disables a limit
+ADMIT_DECODE_CONCURRENCY = int(os.getenv("ADMIT_DECODE_CONCURRENCY", str(os.cpu_count() or 2)))
+ADMIT_DECODE_QUEUE = int(os.getenv("ADMIT_DECODE_QUEUE", str(2 * (os.cpu_count() or 2))))
+ADMIT_ASR_CONCURRENCY = int(os.getenv("ADMIT_ASR_CONCURRENCY", "8"))
+ADMIT_ASR_QUEUE = int(os.getenv("ADMIT_ASR_QUEUE", "16"))
+ADMIT_INFERENCE_CONCURRENCY = int(os.getenv("ADMIT_INFERENCE_CONCURRENCY", "16"))
+ADMIT_INFERENCE_QUEUE = int(os.getenv("ADMIT_INFERENCE_QUEUE", "32"))
+ADMIT_MAX_WAIT_SECONDS = float(os.getenv("ADMIT_MAX_WAIT_SECONDS", "10"))
+
+# Time budget for one prediction; a client (or proxy) can lower it with an X-Deadline-Ms header
+PREDICT_DEADLINE_SECONDS = float(os.getenv("PREDICT_DEADLINE_SECONDS", "60"))
+# The same for background jobs and finalized resumable uploads, made for recordings too long
+# to transcribe within the interactive budget; 0 means no deadline
+PREDICT_LONG_DEADLINE_SECONDS = float(os.getenv("PREDICT_LONG_DEADLINE_SECONDS", "900"))
+
+_sagemaker_client = None
+_sagemaker_lock = threading.Lock()
+
+def _build_sagemaker_client():
+    config = Config(
+        max_pool_connections=SAGEMAKER_MAX_CONNECTIONS,
+        connect_timeout=SAGEMAKER_CONNECT_TIMEOUT,
+        read_timeout=SAGEMAKER_READ_TIMEOUT,
+        # Retries happen in SageMakerBackend (deadline-aware, jittered), not inside botocore
+        retries={"total_max_attempts": 1, "mode": "standard"},
+        tcp_keepalive=True,
+    )
+    return boto3.session.Session().client(
         "sagemaker-runtime",
-        region_name=region,
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
+        region_name=os.getenv("AWS_REGION"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        endpoint_url=SAGEMAKER_ENDPOINT_URL,
+        config=config,
     )
 
+def get_sagemaker_client():
+    """
+    Returns the process-wide sagemaker-runtime client.
+    boto3 clients are thread-safe once built, but building one is not, so the
+    first caller builds it under a lock and everyone else reuses its
+    keep-alive connection pool (sized by SAGEMAKER_MAX_CONNECTIONS).
+    """
+    global _sagemaker_client
+    client = _sagemaker_client
+    if client is None:
+        with _sagemaker_lock:
+            if _sagemaker_client is None:
+                _sagemaker_client = _build_sagemaker_client()
+            client = _sagemaker_client
+    return client
+
+def reset_sagemaker_client():
+    """Drops the shared client; the next call to get_sagemaker_client() rebuilds it."""
+    global _sagemaker_client, _sagemaker_lock
+    _sagemaker_client = None
+    _sagemaker_lock = threading.Lock()
+
+# Sockets and locks must not be shared across a fork (e.g. gunicorn --preload)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_sagemaker_client)
+
+decode_limiter = StageLimiter("decode", ADMIT_DECODE_CONCURRENCY, ADMIT_DECODE_QUEUE, ADMIT_MAX_WAIT_SECONDS)
+asr_limiter = StageLimiter("asr", ADMIT_ASR_CONCURRENCY, ADMIT_ASR_QUEUE, ADMIT_MAX_WAIT_SECONDS)
+inference_limiter = StageLimiter("inference", ADMIT_INFERENCE_CONCURRENCY, ADMIT_INFERENCE_QUEUE,
+                                 ADMIT_MAX_WAIT_SECONDS)
+
+class PredictError(Exception):
+    """A prediction failure carrying the HTTP status of its JSON error response."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# Process-wide thread pools, created on first use
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def shared_pool(name: str, workers: int) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        return pool
+
+def _reset_pools():
+    global _pools, _pools_lock
+    _pools, _pools_lock = {}, threading.Lock()
+
+# Worker threads do not survive a fork
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+class _UploadSpool(tempfile.SpooledTemporaryFile):
+    """In-memory upload buffer (up to spool_mb, then on disk) that refuses to grow past MAX_FILE_MB."""
+
+    def __init__(self, spool_mb: float = UPLOAD_SPOOL_MB):
+        # max_size=0 would never spill: 0 MB means straight to disk
+        super().__init__(max_size=max(1, int(spool_mb * 1024 * 1024)), mode="w+b", dir=UPLOAD_SPOOL_DIR)
+        self._limit = MAX_FILE_MB * 1024 * 1024
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data)
+        if self._written > self._limit:
+            raise RequestEntityTooLarge(f"File too large (> {MAX_FILE_MB} MB).")
+        return super().write(data)
+
+class UploadRequest(Request):
+    """
+    Request class for the app: multipart file parts are streamed into an
+    _UploadSpool instead of werkzeug's default 500 KB spool, so a typical
+    recording never touches disk and oversized files are cut off mid-stream.
+    A view can lower spool_mb, like max_content_length, before reading files.
+    """
+    spool_mb = UPLOAD_SPOOL_MB
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return _UploadSpool(self.spool_mb)
+
 def allowed_file(fname: str) -> bool:
     return "." in fname and fname.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def transcribe_wav(path: str) -> str:
-    r = sr.Recognizer()
-    with sr.AudioFile(path) as source:
-        audio = r.record(source)
-    # You can swap to r.recognize_sphinx(audio) if you need offline
-    return r.recognize_google(audio)
+# --- Speech recognition engines ---
+class AsrEngine:
+    """Turns sr.AudioData into text; raises sr.UnknownValueError / sr.RequestError like speech_recognition."""
+    name = "base"
+
+    def recognize(self, audio: "sr.AudioData") -> str:
+        raise NotImplementedError
+
+    def load(self):
+        """Loads model weights without running them; safe before a fork."""
+
+    def warm_up(self):
+        """Loads models and runs them once so the first request does not pay for it."""
+
+class GoogleAsrEngine(AsrEngine):
+    """Google Web Speech API via speech_recognition; remote, rate limited."""
+    name = "google"
+
+    def __init__(self, endpoint: str, key: Optional[str] = None):
+        self.endpoint = endpoint
+        self.key = key
+
+    def recognize(self, audio):
+        return sr.Recognizer().recognize_google(audio, key=self.key, endpoint=self.endpoint)
+
+class SphinxAsrEngine(AsrEngine):
+    """CMU PocketSphinx via speech_recognition; offline, but reloads its decoder on every call."""
+    name = "sphinx"
+
+    def recognize(self, audio):
+        return sr.Recognizer().recognize_sphinx(audio)
+
+class VoskAsrEngine(AsrEngine):
+    """
+    Offline, CPU-only Kaldi recogniser (vosk). The acoustic model is loaded
+    once per process and shared by all threads; each call gets its own
+    lightweight KaldiRecognizer.
+    """
+    name = "vosk"
+    sample_rate = 16000
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                import vosk
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_path)
+        return self._model
+
+    def warm_up(self):
+        self.recognize(sr.AudioData(b"\0\0" * (self.sample_rate // 2), self.sample_rate, 2), strict=False)
+
+    def recognize(self, audio, strict: bool = True):
+        import vosk
+        rec = vosk.KaldiRecognizer(self.load(), self.sample_rate)
+        rec.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        text = json.loads(rec.FinalResult()).get("text", "").strip()
+        if not text and strict:
+            raise sr.UnknownValueError()
+        return text
+
+class StubAsrEngine(AsrEngine):
+    """Deterministic local stand-in for tests and benchmarks: always returns ASR_STUB_TEXT."""
+    name = "stub"
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def recognize(self, audio):
+        return self.text
+
+def build_asr_engine(kind: str) -> AsrEngine:
+    if kind == "google":
+        return GoogleAsrEngine(ASR_GOOGLE_ENDPOINT, ASR_GOOGLE_KEY)
+    if kind == "sphinx":
+        return SphinxAsrEngine()
+    if kind == "vosk":
+        return VoskAsrEngine(VOSK_MODEL_PATH)
+    if kind == "stub":
+        return StubAsrEngine(ASR_STUB_TEXT)
+    raise PredictError(f"Unknown ASR_ENGINE '{kind}'.", 503)
+
+_asr_engine = None
+_asr_engine_lock = threading.Lock()
+
+def get_asr_engine() -> AsrEngine:
+    """The configured ASR engine, built once per process."""
+    global _asr_engine
+    if _asr_engine is None:
+        with _asr_engine_lock:
+            if _asr_engine is None:
+                _asr_engine = build_asr_engine(ASR_ENGINE)
+    return _asr_engine
+
+def transcribe_wav(audio: Union[str, IO[bytes]]) -> str:
+    """Transcribes a WAV/FLAC/AIFF given as a path or a seekable file object."""
+    return " ".join(seg["text"] for seg in transcribe_segments(audio) if seg["text"])
+
+def transcribe_segments(audio: Union[str, IO[bytes]], engine: Optional[AsrEngine] = None) -> List[dict]:
+    """
+    Transcript as [{"start": s, "end": s, "text": ...}] in time order.
+    Recordings longer than ASR_CHUNK_MAX_SECONDS are cut at pauses and the
+    pieces recognised concurrently on the shared "asr-chunk" pool.
+    """
+    engine = engine or get_asr_engine()
+    audio = decode_audio(audio)
+    with asr_limiter.slot():
+        return _recognize_segments(engine, audio)
+
+def _recognize_segments(engine: AsrEngine, audio: "sr.AudioData") -> List[dict]:
+    chunks = audio_chunks(audio)
+    if chunks is None:
+        return [{"start": 0.0, "end": audio_duration(audio), "text": engine.recognize(audio)}]
+
+    pool = shared_pool("asr-chunk", ASR_CHUNK_WORKERS)
+    futures = [pool.submit(_recognize_chunk, engine, chunk) for _, _, chunk in chunks]
+    segments = [{"start": start, "end": end, "text": fut.result()}
+                for (start, end, _), fut in zip(chunks, futures)]
+    if not any(seg["text"] for seg in segments):
+        raise sr.UnknownValueError()
+    return segments
+
+def decode_audio(audio: Union[str, IO[bytes]]) -> "sr.AudioData":
+    """
+    read_audio() on the shared "decode" pool, in one of its
+    ADMIT_DECODE_CONCURRENCY slots: however many request threads are
+    waiting, at most that many decode at once (soundfile and soxr release
+    the GIL meanwhile), and a request thread never decodes itself.
+    """
+    if ADMIT_DECODE_CONCURRENCY <= 0:
+        return read_audio(audio)
+    with decode_limiter.slot():
+        return shared_pool("decode", ADMIT_DECODE_CONCURRENCY).submit(read_audio, audio).result()
+
+def audio_duration(audio: "sr.AudioData") -> float:
+    return round(len(audio.frame_data) / (audio.sample_rate * audio.sample_width), 3)
+
+def audio_chunks(audio: "sr.AudioData") -> Optional[List[Tuple[float, float, "sr.AudioData"]]]:
+    """
+    (start, end, chunk) pieces for chunked recognition, or None when the
+    recording is short enough (or ASR_CHUNKED is off) to go in one piece.
+    """
+    if not ASR_CHUNKED or audio_duration(audio) <= ASR_CHUNK_MAX_SECONDS:
+        return None
+    pcm = audio.get_raw_data(convert_width=2)
+    chunks = split_on_silence(pcm, audio.sample_rate)
+    if not chunks:
+        raise sr.UnknownValueError()
+    rate = audio.sample_rate
+    return [(round(a / rate, 3), round(b / rate, 3), sr.AudioData(pcm[a * 2:b * 2], rate, 2)) for a, b in chunks]
+
+def _recognize_chunk(engine: AsrEngine, chunk: "sr.AudioData") -> str:
+    for attempt in range(2):  # one retry: a flaky chunk should not sink the whole recording
+        try:
+            return engine.recognize(chunk)
+        except sr.UnknownValueError:
+            return ""  # noise or silence; the other chunks still count
+        except sr.RequestError:
+            if attempt:
+                raise
+
+def split_on_silence(pcm: bytes, sample_rate: int) -> List[Tuple[int, int]]:
+    """
+    Cuts 16-bit mono PCM into (start, end) sample ranges of at most
+    ASR_CHUNK_MAX_SECONDS, preferring the middle of pauses of at least
+    ASR_CHUNK_MIN_SILENCE seconds. Like HandcraftedFeatures' silence
+    TextGrid, a frame is silent when it is more than ASR_CHUNK_SILENCE_DB
+    below the loudest frame. Chunks that are silent throughout are dropped.
+    """
+    samples = array.array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    frame = max(1, int(sample_rate * 0.03))
+    energy = []
+    for i in range(0, len(samples), frame):
+        f = samples[i:i + frame]
+        energy.append(math.sqrt(sum(map(operator.mul, f, f)) / len(f)))
+    if not energy or max(energy) == 0:
+        return []
+    threshold = max(energy) * 10 ** (-abs(ASR_CHUNK_SILENCE_DB) / 20)
+    silent = [e < threshold for e in energy]
+
+    # Candidate cuts: centre of each long enough pause, in frames
+    cuts, run_start = [], None
+    min_run = max(1, int(ASR_CHUNK_MIN_SILENCE * sample_rate / frame))
+    for i, s in enumerate(silent + [False]):
+        if s and run_start is None:
+            run_start = i
+        elif not s and run_start is not None:
+            if i - run_start >= min_run:
+                cuts.append((run_start + i) // 2)
+            run_start = None
+
+    max_len = max(1, int(ASR_CHUNK_MAX_SECONDS * sample_rate / frame))
+    chunks, start, n = [], 0, len(energy)
+    while start < n:
+        end = min(start + max_len, n)
+        if end < n:
+            usable = [c for c in cuts if start < c <= end]
+            if usable:
+                end = usable[-1]
+        if not all(silent[start:end]):
+            chunks.append((start * frame, min(end * frame, len(samples))))
+        start = end
+    return chunks
 
 def parse_model_output(raw: str) -> Tuple[str, Optional[float]]:
     """
@@ -73,101 +488,871 @@ def parse_model_output(raw: str) -> Tuple[str, Optional[float]]:
     # Fallback: just a label
     return s, None
 
+def split_model_output(raw: str) -> List[str]:
+    """
+    Splits a multi-row endpoint response into one raw output per row, each
+    of which parse_model_output() understands. Handles a JSON list of rows
+    (objects, ["pred", conf] pairs or bare labels such as ["1", "0"]),
+    {"predictions": [...]} and newline-separated "pred,conf" lines.
+    """
+    s = raw.strip()
+    try:
+        obj = json.loads(s)
+        if isinstance(obj, dict) and isinstance(obj.get("predictions"), list):
+            obj = obj["predictions"]
+        if isinstance(obj, list) and all(isinstance(o, (list, dict)) for o in obj):
+            return [json.dumps(o) for o in obj]
+        if isinstance(obj, list) and all(isinstance(o, (str, int, float)) for o in obj):
+            return [str(o) for o in obj]
+    except json.JSONDecodeError:
+        pass
+    return [line for line in s.splitlines() if line.strip()]
+
 def label_text(pred: str) -> str:
     p = pred.strip().lower()
     if p in {"1", "true", "dementia", "positive", "likely_dementia"}:
         return "Likely Dementia"
     return "Not Dementia"
 
-@api.route("/api/predict", methods=["POST"])
-def predict():
+def read_upload(detach: bool = False) -> IO[bytes]:
+    """
+    Validates the 'audio' upload of the current request and returns its
+    buffer (already size-checked by UploadRequest), rewound to the start.
+    With detach=True the buffer is taken away from the request so it is not
+    closed when the request ends; the caller must close it.
+    """
     try:
-        file_storage = request.files.get("audio")
-        
-        # Validate small things early
-        if not file_storage:
-            return jsonify({"error": "Missing audio. Provide 'audio' file or 'audio_base64'."}), 400
-
-        # Validate fields
-        sex = 1 if current_user.sex == 'M' else 0
-        age = int(current_user.age)
-        mmse = current_user.mmse_score
-
-        # Prepare a temp file for the transcription lib
-        if file_storage:
-            if file_storage.filename == "":
-                return jsonify({"error": "Empty file name."}), 400
-            if not allowed_file(file_storage.filename):
-                return jsonify({"error": f"Unsupported audio type. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"}), 415
-
-            file_storage.seek(0, os.SEEK_END)
-            size_mb = file_storage.tell() / (1024 * 1024)
-            if size_mb > MAX_FILE_MB:
-                return jsonify({"error": f"File too large (> {MAX_FILE_MB} MB)."}), 413
-            file_storage.seek(0)
-
-            suffix = "." + file_storage.filename.rsplit(".", 1)[1].lower()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp_path = tmp.name
-                file_storage.save(tmp_path)
-        else:
-            return jsonify({"error": "Base64 upload not implemented in this example."}), 400
+        with stage("upload"):  # the multipart body is parsed on first access
+            file_storage = request.files.get("audio")
+    except RequestEntityTooLarge:
+        raise PredictError(f"File too large (> {MAX_FILE_MB} MB).", 413)
+    if not file_storage:
+        raise PredictError("Missing audio. Provide 'audio' file or 'audio_base64'.", 400)
+    return upload_buffer(file_storage, detach)
 
-        # Transcribe
-        try:
-            transcript = transcribe_wav(tmp_path)
-        except sr.UnknownValueError:
-            os.unlink(tmp_path)
-            return jsonify({"error": "Could not understand audio (speech recognition)."}), 422
-        except sr.RequestError as e:
-            os.unlink(tmp_path)
-            return jsonify({"error": f"Speech recognition service error: {e}"}), 502
-        finally:
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
+def upload_buffer(file_storage, detach: bool = False) -> IO[bytes]:
+    """read_upload() for one FileStorage: checks its name and type and returns its buffer."""
+    check_filename(file_storage.filename)
+    audio = file_storage.stream
+    if detach:
+        file_storage.stream = io.BytesIO()
+    audio.seek(0)
+    return audio
+
+def check_filename(filename: str):
+    if filename == "":
+        raise PredictError("Empty file name.", 400)
+    if not allowed_file(filename):
+        raise PredictError(f"Unsupported audio type. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}", 415)
+
+def user_inputs(user) -> Tuple[int, int, Optional[int]]:
+    """(sex, age, mmse) model inputs from a user's profile."""
+    sex = 1 if user.sex == 'M' else 0
+    age = int(user.age)
+    mmse = user.mmse_score
+    return sex, age, mmse
+
+# --- Inference backends ---
+class ModelInput(NamedTuple):
+    """Everything a backend may score one recording on."""
+    sex: int
+    age: int
+    mmse: Optional[int]
+    transcript: str
+    audio: Union[str, IO[bytes], None] = None  # the recording, for backends that need acoustic features
+    acoustics: Optional[dict] = None  # its audio features, when already computed while streaming (asgi.py)
+
+class InferenceBackend:
+    """Scores a batch of ModelInputs; returns one raw output per input, for parse_model_output()."""
+    name = "base"
+
+    def predict(self, inputs: List[ModelInput]) -> List[str]:
+        raise NotImplementedError
+
+    def load(self):
+        """Loads model weights without running them; safe before a fork."""
+
+    def warm_up(self):
+        """Loads whatever the backend needs and runs it once so the first request does not pay for it."""
+
+    def describe(self) -> str:
+        """Reported as "endpoint" in prediction responses."""
+        return self.name
+
+    def version(self) -> str:
+        """The model version in prediction cache keys, when MODEL_VERSION is not set."""
+        return self.describe()
+
+    def answer(self, inputs: List[ModelInput]) -> Tuple["InferenceBackend", List[str]]:
+        """predict(), plus the backend that actually scored the inputs (see FallbackBackend)."""
+        return self, self.predict(inputs)
+
+class SageMakerBackend(InferenceBackend):
+    """The deployed endpoint; scores rows of [sex, age, mmse, transcript]."""
+    name = "sagemaker"
+
+    def __init__(self, endpoint_name: str):
+        self.endpoint_name = endpoint_name
+        self.latencies = LatencyWindow()
+
+    def describe(self) -> str:
+        return self.endpoint_name
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds before a hedged second invocation, or None (hedging off or no latency history yet)."""
+        if SAGEMAKER_HEDGE_PERCENTILE <= 0:
+            return None
+        p = self.latencies.percentile(SAGEMAKER_HEDGE_PERCENTILE)
+        if p is None:
+            return None
+        return max(p, SAGEMAKER_HEDGE_MIN_DELAY_MS / 1000)
 
+    def invoke(self, body: bytes) -> str:
+        """One invoke_endpoint call, hedged if enabled; waits no longer than the deadline."""
+        def call():
+            resp = get_sagemaker_client().invoke_endpoint(
+                EndpointName=self.endpoint_name,
+                ContentType="application/json",
+                Body=body,
+            )
+            return resp["Body"].read().decode("utf-8")
+
+        return hedged_call(call, "invoke_endpoint", shared_pool("sagemaker", SAGEMAKER_MAX_CONNECTIONS),
+                           hedge_after=self.hedge_delay(), latencies=self.latencies)
+
+    def warm_up(self):
+        get_sagemaker_client()  # no endpoint call: that would be billed and counted as traffic
+
+    def predict(self, inputs: List[ModelInput]) -> List[str]:
         # Build payload for your model
-        endpoint_name = os.getenv("SAGEMAKER_ENDPOINT_NAME", "canvas-Dementia-Deployment")
-        payload = {
-            "data": {
-                "features": {
-                    "values": [[sex, age, mmse, transcript]]
+        with stage("payload"):
+            rows = [[i.sex, i.age, i.mmse, i.transcript] for i in inputs]
+            payload = {
+                "data": {
+                    "features": {
+                        "values": rows
+                    }
                 }
             }
-        }
-        body = json.dumps(payload).encode("utf-8")
+            body = json.dumps(payload).encode("utf-8")
 
         # Call SageMaker
         try:
-            client = get_sagemaker_client()
-            resp = client.invoke_endpoint(
-                EndpointName=endpoint_name,
-                ContentType="application/json",
-                Body=body,
-            )
-            raw = resp["Body"].read().decode("utf-8")
+            with stage("invoke_endpoint"):
+                raw = retry_call(lambda: self.invoke(body), "invoke_endpoint", SAGEMAKER_MAX_ATTEMPTS,
+                                 retryable=_retryable_endpoint_error,
+                                 base=SAGEMAKER_RETRY_BASE_MS / 1000, cap=SAGEMAKER_RETRY_CAP_MS / 1000)
+        except DeadlineExceeded:
+            raise PredictError("SageMaker error: prediction deadline exceeded", 504)
         except (BotoCoreError, ClientError) as e:
-            return jsonify({"error": f"SageMaker error: {str(e)}"}), 502
+            raise PredictError(f"SageMaker error: {str(e)}", 502)
+
+        if len(rows) == 1:
+            return [raw]
+        outputs = split_model_output(raw)
+        if len(outputs) != len(rows):
+            raise PredictError(f"SageMaker error: got {len(outputs)} predictions for {len(rows)} rows", 502)
+        return outputs
+
+def _retryable_endpoint_error(e: BaseException) -> bool:
+    """Connection problems, timeouts, throttling and 5xx are retried; model errors (4xx) are not."""
+    if isinstance(e, ClientError):
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        code = e.response.get("Error", {}).get("Code", "")
+        return status >= 500 or status == 429 or "Throttl" in code
+    return isinstance(e, BotoCoreError)
+
+def scaled_sigmoid(x):
+    # Same as MainCode/models.py: sigmoid scaled to the 0-30 MMSE range (reg_mmse head)
+    import tensorflow as tf
+    return tf.multiply(tf.sigmoid(x), 30)
+
+class KerasBackend(InferenceBackend):
+    """
+    The DEMENTIA model trained by MainCode/models.py (DementiaDetectionModel),
+    loaded once per process and run in-process on whole batches. A featurizer
+    maps each ModelInput to the model's named inputs (in_a/mask_a/in_t/in_h).
+    """
+    name = "local"
 
+    def __init__(self, model_path: str, featurizer: Callable[[ModelInput], Dict[str, Any]]):
+        self.model_path = model_path
+        self.featurizer = featurizer
+        self._model = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def describe(self) -> str:
+        return f"local:{os.path.basename(self.model_path)}"
+
+    def version(self) -> str:
+        # The weights' contents, not their file name: retraining into the same
+        # DEMENTIA.h5 must not serve the old model's cached predictions
+        with self._lock:
+            if self._fingerprint is None:
+                self._fingerprint = audio_digest(self.model_path)[:16]
+        return f"{self.describe()}@{self._fingerprint}"
+
+    def load(self):
+        if hasattr(self.featurizer, "load"):
+            self.featurizer.load()
+        return self._load_model()
+
+    def _load_model(self):
+        with self._lock:
+            if self._model is None:
+                from tensorflow.keras.models import load_model
+                from attention import Attention
+                from concretedropout.tensorflow import ConcreteDenseDropout
+                custom_objects = {'Attention': Attention, 'scaled_sigmoid': scaled_sigmoid,
+                                  'ConcreteDenseDropout': ConcreteDenseDropout}
+                model = load_model(self.model_path, custom_objects=custom_objects, compile=False)
+                # predict() labels from cls_ad; without it every recording would read "Not Dementia"
+                if "cls_ad" not in model.output_names:
+                    raise PredictError(f"Local model {self.model_path} has no cls_ad output "
+                                       f"(outputs: {', '.join(model.output_names)}).", 503)
+                self._model = model
+                self._fingerprint = audio_digest(self.model_path)[:16]
+        return self._model
+
+    def warm_up(self):
+        if hasattr(self.featurizer, "warm_up"):
+            self.featurizer.warm_up()
+        # One dummy batch builds the predict function so real requests skip tracing
+        import numpy as np
+        model = self._load_model()
+        model.predict_on_batch({name: np.zeros((1,) + tuple(t.shape[1:]), dtype="float32")
+                                for name, t in zip(model.input_names, model.inputs)})
+
+    def predict(self, inputs: List[ModelInput]) -> List[str]:
+        import numpy as np
+        model = self._load_model()
+        with stage("featurize"):
+            feats = []
+            for i in inputs:
+                if hasattr(i.audio, "seek"):
+                    i.audio.seek(0)  # already read once by transcription
+                feats.append(self.featurizer(i))
+            batch = {name: np.stack([f[name] for f in feats]).astype("float32") for name in model.input_names}
+        with stage("model"):
+            out = model.predict_on_batch(batch)
+        out = dict(zip(model.output_names, out if isinstance(out, list) else [out]))
+        outputs = []
+        for i in range(len(inputs)):
+            res = {}
+            if "cls_ad" in out:
+                p = float(np.ravel(out["cls_ad"][i])[0])
+                res["prediction"] = "1" if p > 0.5 else "0"
+                res["confidence"] = round(100 * (p if p > 0.5 else 1 - p), 2)
+            if "reg_mmse" in out:
+                res["mmse"] = round(float(np.ravel(out["reg_mmse"][i])[0]), 2)
+            outputs.append(json.dumps(res))
+        return outputs
+
+def _load_featurizer(spec: Optional[str]) -> Callable[[ModelInput], Dict[str, Any]]:
+    if not spec:
+        raise PredictError("Local model needs LOCAL_MODEL_FEATURIZER (module:callable).", 503)
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+BACKEND_ANSWERS = counter("neurovoice_backend_answers_total", "Rows scored, by the backend that answered.",
+                          ["backend"])
+
+class FallbackBackend(InferenceBackend):
+    """
+    A remote backend behind a circuit breaker, with an in-process model that
+    answers while the breaker is open and for calls the remote fails. Named
+    and described as the primary; answer() reports who actually scored.
+    """
+
+    def __init__(self, primary: InferenceBackend, fallback: InferenceBackend, breaker: CircuitBreaker):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+        self.name = primary.name
+
+    def describe(self) -> str:
+        return self.primary.describe()
+
+    def version(self) -> str:
+        return self.primary.version()
+
+    def load(self):
+        self.primary.load()
+        self.fallback.load()
+
+    def warm_up(self):
+        self.primary.warm_up()
+        self.fallback.warm_up()
+
+    def predict(self, inputs: List[ModelInput]) -> List[str]:
+        return self.answer(inputs)[1]
+
+    def answer(self, inputs: List[ModelInput]) -> Tuple[InferenceBackend, List[str]]:
+        answered, outputs = self._answer(inputs)
+        BACKEND_ANSWERS.inc(len(inputs), backend=answered.name)
+        return answered, outputs
+
+    def _answer(self, inputs):
+        if not self.breaker.allow():
+            return self._fall_back(inputs, PredictError(f"{self.primary.name} unavailable (circuit open)", 503))
+        t0 = time.perf_counter()
+        try:
+            outputs = self.primary.predict(inputs)
+        except Exception as e:
+            self.breaker.record(False)
+            left = remaining()
+            if left is not None and left <= 0:
+                raise
+            return self._fall_back(inputs, e)
+        self.breaker.record(True, time.perf_counter() - t0)
+        return self.primary, outputs
+
+    def _fall_back(self, inputs, error: Exception):
+        try:
+            with stage("fallback"):
+                return self.fallback, self.fallback.predict(inputs)
+        except Exception:
+            raise error  # the remote's failure is the one worth reporting
+
+def build_inference_backend(kind: str) -> InferenceBackend:
+    if kind == "sagemaker":
+        backend = SageMakerBackend(os.getenv("SAGEMAKER_ENDPOINT_NAME", "canvas-Dementia-Deployment"))
+        if INFERENCE_FALLBACK == "local":
+            breaker = CircuitBreaker(backend.name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                                     failure_rate=BREAKER_FAILURE_RATE, slow_after=BREAKER_SLOW_MS / 1000,
+                                     cooldown=BREAKER_COOLDOWN_SECONDS)
+            return FallbackBackend(backend, build_inference_backend("local"), breaker)
+        return backend
+    if kind == "local":
+        return KerasBackend(LOCAL_MODEL_PATH, _load_featurizer(LOCAL_MODEL_FEATURIZER))
+    raise PredictError(f"Unknown INFERENCE_BACKEND '{kind}'.", 503)
+
+_inference_backend = None
+_inference_backend_lock = threading.Lock()
+
+def get_inference_backend() -> InferenceBackend:
+    """The configured backend, built once per process."""
+    global _inference_backend
+    if _inference_backend is None:
+        with _inference_backend_lock:
+            if _inference_backend is None:
+                _inference_backend = build_inference_backend(INFERENCE_BACKEND)
+    return _inference_backend
+
+def _predict_batch(inputs: List[ModelInput]) -> List[Tuple[InferenceBackend, str]]:
+    answered, outputs = get_inference_backend().answer(inputs)
+    return [(answered, raw) for raw in outputs]
+
+# --- Model preloading and readiness ---
+_readiness = {"state": "cold", "pid": os.getpid()}
+
+def preload_models():
+    """
+    Loads the ASR engine and inference backend weights in this process
+    without running them. Called in the gunicorn master with preload_app
+    (see gunicorn.conf.py) so forked workers share the weights copy-on-write.
+    """
+    get_asr_engine().load()
+    get_inference_backend().load()
+    _readiness.update(state="preloaded")
+
+def warm_up_models():
+    """Runs every model once in this process; /api/ready answers 200 afterwards."""
+    _readiness.update(state="warming", pid=os.getpid())
+    t0 = time.perf_counter()
+    try:
+        get_asr_engine().warm_up()
+        get_inference_backend().warm_up()
+    except Exception as e:
+        _readiness.update(state="failed", error=repr(e))
+        raise
+    _readiness.update(state="ready", warm_up_seconds=round(time.perf_counter() - t0, 3), ready_at=time.time())
+
+def start_warm_up() -> threading.Thread:
+    """warm_up_models() on a background thread, so the server can answer /api/ready meanwhile."""
+    t = threading.Thread(target=warm_up_models, name="warm-up", daemon=True)
+    t.start()
+    return t
+
+@api.route("/api/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once this worker's models are warm, 503 before (or if warm-up failed)."""
+    body = dict(_readiness, asr_engine=ASR_ENGINE, inference_backend=INFERENCE_BACKEND, pid=os.getpid())
+    return jsonify(body), 200 if _readiness["state"] == "ready" else 503
+
+# Coalesces inputs from concurrent requests into one backend call
+model_batcher = MicroBatcher(
+    _predict_batch,
+    max_batch=PREDICT_BATCH_MAX_SIZE,
+    max_wait=PREDICT_BATCH_MAX_WAIT_MS / 1000,
+    max_inflight=PREDICT_BATCH_MAX_INFLIGHT,
+    name="model-batcher",
+)
+
+transcript_cache = TieredCache("transcripts", RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_DB)
+prediction_cache = TieredCache("predictions", RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_DB)
+
+def transcribe_cached(audio: Union[str, IO[bytes]], digest: str) -> str:
+    """transcribe_wav() behind the transcript cache; ASR failures raise PredictError."""
+    key = f"{get_asr_engine().name}:{digest}"
+    transcript = transcript_cache.get(key)
+    if transcript is None:
+        try:
+            with stage("transcribe"):
+                transcript = transcribe_wav(audio)
+        except sr.UnknownValueError:
+            raise PredictError("Could not understand audio (speech recognition).", 422)
+        except sr.RequestError as e:
+            raise PredictError(f"Speech recognition service error: {e}", 502)
+        transcript_cache.set(key, transcript)
+    return transcript
+
+def prediction_cache_key(digest: str, model_input: ModelInput, backend: InferenceBackend) -> str:
+    return f"{digest}:{model_input.sex}:{model_input.age}:{model_input.mmse}:{MODEL_VERSION or backend.version()}"
+
+def prediction_body(backend: InferenceBackend, model_input: ModelInput, raw: str) -> dict:
+    """The /api/predict response body for one scored input."""
+    with stage("parse"):
         pred_raw, conf = parse_model_output(raw)
         result_label = label_text(pred_raw)
 
-        return jsonify({
-            "ok": True,
-            "endpoint": endpoint_name,
-            "inputs": {"sex": sex, "age": age, "mmse": mmse},
-            "transcript": transcript,
-            "model_raw": raw,
-            "prediction": result_label,
-            "confidence": conf  # may be None if the model didn't return it parsably
-        }), 200
+    return {
+        "ok": True,
+        "backend": backend.name,
+        "endpoint": backend.describe(),
+        "inputs": {"sex": model_input.sex, "age": model_input.age, "mmse": model_input.mmse},
+        "transcript": model_input.transcript,
+        "model_raw": raw,
+        "prediction": result_label,
+        "confidence": conf  # may be None if the model didn't return it parsably
+    }
+
+# Called with (user id, response body) for every prediction served, by every route
+# that serves them (asgi.py's too); main.py records them as the user's history
+prediction_listeners: List[Callable[[Optional[str], dict], None]] = []
 
+def prediction_served(user_id: Optional[str], body: dict):
+    """Hands a successful prediction to the listeners; they must not block or raise."""
+    for listener in prediction_listeners:
+        listener(user_id, body)
+
+def score(backend: InferenceBackend, model_input: ModelInput) -> Tuple[InferenceBackend, str]:
+    """Scores one input (micro-batched if enabled) in an inference slot; returns (answered by, raw output)."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise PredictError("Prediction deadline exceeded.", 504)
+    with inference_limiter.slot():
+        if PREDICT_BATCH_MAX_SIZE > 1:
+            # The batch itself runs on the batcher's threads; only our wait is bounded
+            try:
+                return model_batcher.submit(model_input, timeout=remaining())
+            except FutureTimeout:
+                raise PredictError("Prediction deadline exceeded.", 504)
+        answered, outputs = backend.answer([model_input])
+        return answered, outputs[0]
+
+def run_prediction(audio: Union[str, IO[bytes]], sex: int, age: int, mmse: Optional[int],
+                   digest: Optional[str] = None) -> dict:
+    """
+    Transcribes the recording, scores it and returns the /api/predict
+    response body. `digest` is the recording's sha256 if already known.
+    """
+    if digest is None:
+        with stage("digest"):
+            digest = audio_digest(audio)
+    # Transcribe straight from the buffer, unless this exact recording was seen before
+    transcript = transcribe_cached(audio, digest)
+
+    backend = get_inference_backend()
+    model_input = ModelInput(sex, age, mmse, transcript, audio)
+    prediction_key = prediction_cache_key(digest, model_input, backend)
+    raw = prediction_cache.get(prediction_key)
+    if raw is None:
+        answered, raw = score(backend, model_input)
+        # Fallback answers are not cached: the primary should score this input once it is back
+        if answered.describe() == backend.describe():
+            prediction_cache.set(prediction_key, raw)
+        return prediction_body(answered, model_input, raw)
+    return prediction_body(backend, model_input, raw)
+
+def request_deadline(header: Optional[str] = None,
+                     budget: Optional[float] = PREDICT_DEADLINE_SECONDS) -> Optional[float]:
+    """`budget` seconds (None: no deadline), or less if the caller sent a smaller X-Deadline-Ms."""
+    if header is None:
+        header = request.headers.get("X-Deadline-Ms")
+    if header:
+        try:
+            asked = max(0.0, float(header) / 1000)
+            budget = asked if budget is None else min(budget, asked)
+        except ValueError:
+            pass
+    return budget
+
+def long_deadline() -> Optional[float]:
+    """The budget of background jobs and finalized uploads: PREDICT_LONG_DEADLINE_SECONDS, None if 0."""
+    return PREDICT_LONG_DEADLINE_SECONDS if PREDICT_LONG_DEADLINE_SECONDS > 0 else None
+
+@api.route("/api/predict", methods=["POST"])
+def predict():
+    try:
+        with deadline_scope(request_deadline()):
+            audio = read_upload()
+            sex, age, mmse = user_inputs(current_user)
+            body = run_prediction(audio, sex, age, mmse)
+        prediction_served(current_user.get_id(), body)
+        return jsonify(body), 200
+
+    except Overloaded as ol:
+        return jsonify({"error": str(ol)}), 429, {"Retry-After": str(ol.retry_after)}
+    except PredictError as pe:
+        return jsonify({"error": pe.message}), pe.status
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
     except Exception as e:
         # Don’t leak internals in prod; log instead
         if current_app.debug:
             return jsonify({"error": f"Unhandled error: {repr(e)}"}), 500
-        return jsonify({"error": "Internal error"}), 500
\ No newline at end of file
+        return jsonify({"error": "Internal error"}), 500
+
+# --- Background prediction jobs ---
+def _prediction_job(audio: IO[bytes], sex: int, age: int, mmse: Optional[int],
+                    user_id: Optional[str]) -> Tuple[dict, int]:
+    try:
+        with deadline_scope(long_deadline()):
+            body = run_prediction(audio, sex, age, mmse)
+        prediction_served(user_id, body)
+        return body, 200
+    except Overloaded as ol:
+        return {"error": str(ol), "retry_after": ol.retry_after}, 429
+    except PredictError as pe:
+        return {"error": pe.message}, pe.status
+    except ValueError as ve:
+        return {"error": str(ve)}, 400
+    finally:
+        audio.close()
+
+prediction_jobs = JobQueue(
+    workers=PREDICT_JOB_WORKERS,
+    max_pending=PREDICT_JOB_MAX_PENDING,
+    ttl=PREDICT_JOB_TTL,
+)
+
+@api.route("/api/predict/jobs", methods=["POST"])
+def submit_prediction_job():
+    """Queues a prediction and returns its job id right away (202)."""
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required."}), 401
+    try:
+        sex, age, mmse = user_inputs(current_user)
+        audio = read_upload(detach=True)
+    except PredictError as pe:
+        return jsonify({"error": pe.message}), pe.status
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    try:
+        job = prediction_jobs.submit(_prediction_job, audio, sex, age, mmse, current_user.get_id(),
+                                     owner=current_user.get_id())
+    except QueueFull:
+        audio.close()
+        return jsonify({"error": "Too many pending predictions, try again later."}), 503
+
+    status_url = url_for("api.prediction_job_status", job_id=job.id)
+    return jsonify({"ok": True, "job_id": job.id, "status": job.status, "status_url": status_url}), 202, \
+        {"Location": status_url}
+
+@api.route("/api/predict/jobs/<job_id>", methods=["GET"])
+def prediction_job_status(job_id):
+    """Job status; once finished, also the prediction (or error) and its HTTP status."""
+    job = prediction_jobs.get(job_id)
+    if job is None or job.owner != current_user.get_id():
+        return jsonify({"error": "Unknown or expired job."}), 404
+    return jsonify(job.to_dict()), 200
+
+
+# --- Resumable chunked uploads ---
+upload_store = UploadStore(
+    UPLOAD_STORE_DIR,
+    max_bytes=int(UPLOAD_MAX_MB * 1024 * 1024),
+    chunk_bytes=int(UPLOAD_CHUNK_MB * 1024 * 1024),
+    ttl=UPLOAD_TTL,
+    # Bounds the chunk index, so a session holds at most this many chunk files
+    max_chunks=math.ceil(UPLOAD_PREDICT_MAX_MB * 1024 / UPLOAD_MIN_CHUNK_KB),
+)
+
+def _upload_view(meta: dict) -> dict:
+    return {"ok": True, "upload_id": meta["upload_id"], "filename": meta["filename"], "size": meta["size"],
+            "received": meta.get("received", []), "bytes": meta.get("bytes", 0),
+            "chunk_size": upload_store.chunk_bytes, "max_size": upload_store.max_bytes,
+            "max_chunks": upload_store.max_chunks}
+
+@api.route("/api/uploads", methods=["POST"])
+def initiate_upload():
+    """
+    Starts a resumable upload. JSON body: {"filename", "size"?, "sha256"?}.
+    Then PUT each chunk to /api/uploads/<id>/chunks/<n> (n = 0, 1, ...)
+    and POST /api/uploads/<id>/finalize to score the recording. Recordings
+    over UPLOAD_PREDICT_MAX_MB are refused (413) before being scored.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required."}), 401
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object."}), 400
+    filename, size, sha256 = body.get("filename", ""), body.get("size"), body.get("sha256")
+    if not isinstance(filename, str):
+        return jsonify({"error": "filename must be a string."}), 400
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+        return jsonify({"error": "size must be a non-negative integer."}), 400
+    if sha256 is not None and not isinstance(sha256, str):
+        return jsonify({"error": "sha256 must be a string."}), 400
+    if size is not None and size > UPLOAD_PREDICT_MAX_MB * 1024 * 1024:
+        return jsonify({"error": f"Recording too large to score (> {UPLOAD_PREDICT_MAX_MB:g} MB)."}), 413
+    try:
+        check_filename(filename)
+        meta = upload_store.initiate(current_user.get_id(), filename, size, sha256)
+    except (PredictError, UploadError) as e:
+        return jsonify({"error": e.message}), e.status
+    status_url = url_for("api.upload_status", upload_id=meta["upload_id"])
+    return jsonify(dict(_upload_view(meta), status_url=status_url)), 201, {"Location": status_url}
+
+@api.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Chunks received so far, so an interrupted client knows what to resend."""
+    try:
+        return jsonify(_upload_view(upload_store.session(upload_id, current_user.get_id()))), 200
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
+
+@api.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    try:
+        upload_store.close(upload_id, current_user.get_id())
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
+    return jsonify({"ok": True}), 200
+
+@api.route("/api/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def upload_chunk(upload_id, index):
+    """
+    Raw chunk bytes as the body; an optional X-Chunk-SHA256 header is
+    verified. Chunks but the last should be at least UPLOAD_MIN_CHUNK_KB:
+    indexes beyond UPLOAD_PREDICT_MAX_MB / UPLOAD_MIN_CHUNK_KB are refused.
+    """
+    request.max_content_length = upload_store.chunk_bytes
+    try:
+        with stage("upload"):
+            meta = upload_store.append(upload_id, current_user.get_id(), index, request.stream,
+                                       request.headers.get("X-Chunk-SHA256"))
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Chunk too large (> {UPLOAD_CHUNK_MB:g} MB)."}), 413
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
+    return jsonify(_upload_view(meta)), 200
+
+@api.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """
+    Assembles and verifies the recording ({"sha256"} unless given at
+    initiate), then scores it like /api/predict. Safe to retry on failure;
+    while another finalize of the same upload is running it answers 409.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required."}), 401
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object."}), 400
+    if body.get("sha256") is not None and not isinstance(body["sha256"], str):
+        return jsonify({"error": "sha256 must be a string."}), 400
+    try:
+        with deadline_scope(request_deadline(budget=long_deadline())):
+            received = upload_store.session(upload_id, current_user.get_id())["bytes"]
+            if received > UPLOAD_PREDICT_MAX_MB * 1024 * 1024:
+                return jsonify({"error": f"Recording too large to score (> {UPLOAD_PREDICT_MAX_MB:g} MB)."}), 413
+            stored = upload_store.finalize(upload_id, current_user.get_id(), body.get("sha256"))
+            sex, age, mmse = user_inputs(current_user)
+            result = run_prediction(stored["path"], sex, age, mmse, digest=stored["sha256"])
+        # Until here a failed finalize can simply be retried; the session is not needed anymore
+        upload_store.close(upload_id, current_user.get_id())
+        prediction_served(current_user.get_id(), result)
+        result["upload"] = {"sha256": stored["sha256"], "bytes": stored["bytes"], "filename": stored["filename"]}
+        return jsonify(result), 200
+
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
+    except Overloaded as ol:
+        return jsonify({"error": str(ol)}), 429, {"Retry-After": str(ol.retry_after)}
+    except PredictError as pe:
+        return jsonify({"error": pe.message}), pe.status
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        if current_app.debug:
+            return jsonify({"error": f"Unhandled error: {repr(e)}"}), 500
+        return jsonify({"error": "Internal error"}), 500
+
+
+# --- Multi-file batch prediction ---
+def _transcribe_item(audio: IO[bytes]) -> Tuple[str, str]:
+    digest = audio_digest(audio)
+    return digest, transcribe_cached(audio, digest)
+
+def _score_items(items: List[dict]) -> List[dict]:
+    """
+    Scores transcribed batch items in as few backend calls as possible
+    (PREDICT_BATCH_MAX_SIZE rows per call) and returns their result lines.
+    """
+    backend = get_inference_backend()
+    lines, todo = [], []
+    for item in items:
+        key = prediction_cache_key(item["digest"], item["input"], backend)
+        raw = prediction_cache.get(key)
+        if raw is None:
+            todo.append((item, key))
+        else:
+            lines.append(dict(item["line"], **prediction_body(backend, item["input"], raw)))
+    step = max(1, PREDICT_BATCH_MAX_SIZE)
+    for start in range(0, len(todo), step):
+        chunk = todo[start:start + step]
+        try:
+            with inference_limiter.slot():
+                answered, raws = backend.answer([item["input"] for item, _ in chunk])
+        except Overloaded as ol:
+            lines.extend(dict(item["line"], ok=False, error=str(ol), status=429, retry_after=ol.retry_after)
+                         for item, _ in chunk)
+            continue
+        except PredictError as pe:
+            lines.extend(dict(item["line"], ok=False, error=pe.message, status=pe.status) for item, _ in chunk)
+            continue
+        for (item, key), raw in zip(chunk, raws):
+            if answered.describe() == backend.describe():
+                prediction_cache.set(key, raw)
+            lines.append(dict(item["line"], **prediction_body(answered, item["input"], raw)))
+    return lines
+
+@api.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Scores every 'audio' file of one multipart request. Responds with NDJSON,
+    one line per file ({"index", "filename", ...} plus the /api/predict body,
+    or "ok": false with "error" and "status"), in completion order.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required."}), 401
+    request.max_content_length = BATCH_MAX_CONTENT_MB * 1024 * 1024
+    request.spool_mb = BATCH_SPOOL_MB
+    try:
+        sex, age, mmse = user_inputs(current_user)
+        try:
+            uploads = request.files.getlist("audio")
+        except RequestEntityTooLarge:
+            return jsonify({"error": f"Upload too large (> {MAX_FILE_MB} MB per file, "
+                                     f"{BATCH_MAX_CONTENT_MB} MB in total)."}), 413
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    if not uploads:
+        return jsonify({"error": "Missing audio. Provide one or more 'audio' files."}), 400
+    if len(uploads) > BATCH_MAX_FILES:
+        return jsonify({"error": f"Too many files (> {BATCH_MAX_FILES})."}), 413
+
+    user_id = current_user.get_id()
+    rejected, accepted = [], []
+    for index, file_storage in enumerate(uploads):
+        line = {"index": index, "filename": file_storage.filename}
+        try:
+            accepted.append((line, upload_buffer(file_storage, detach=True)))
+        except PredictError as pe:
+            rejected.append(dict(line, ok=False, error=pe.message, status=pe.status))
+
+    def generate():
+        # Shared by all batch requests, so BATCH_ASR_WORKERS bounds batch ASR load per process
+        pool = shared_pool("batch-asr", BATCH_ASR_WORKERS)
+        pending = {pool.submit(_transcribe_item, audio): (line, audio) for line, audio in accepted}
+        try:
+            for out in rejected:
+                yield json.dumps(out) + "\n"
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                # Everything transcribed by now is scored together
+                ready = []
+                for fut in done:
+                    line, audio = pending.pop(fut)
+                    try:
+                        digest, transcript = fut.result()
+                    except Overloaded as ol:
+                        yield json.dumps(dict(line, ok=False, error=str(ol), status=429,
+                                              retry_after=ol.retry_after)) + "\n"
+                        audio.close()
+                        continue
+                    except PredictError as pe:
+                        yield json.dumps(dict(line, ok=False, error=pe.message, status=pe.status)) + "\n"
+                        audio.close()
+                        continue
+                    except ValueError as ve:  # not decodable as WAV/FLAC/AIFF
+                        yield json.dumps(dict(line, ok=False, error=str(ve), status=400)) + "\n"
+                        audio.close()
+                        continue
+                    except Exception:
+                        yield json.dumps(dict(line, ok=False, error="Internal error", status=500)) + "\n"
+                        audio.close()
+                        continue
+                    ready.append({"line": line, "digest": digest,
+                                  "input": ModelInput(sex, age, mmse, transcript, audio)})
+                try:
+                    for out in _score_items(ready):
+                        if out["ok"]:
+                            prediction_served(user_id, out)
+                        yield json.dumps(out) + "\n"
+                finally:
+                    for item in ready:
+                        item["input"].audio.close()
+        finally:
+            # Client went away: drop what has not started, release the buffers
+            for fut, (_, audio) in pending.items():
+                if fut.cancel():
+                    audio.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+# --- Metrics (served on /metrics, see metrics.init_app) ---
+def _cache_lookups():
+    out = {}
+    for cache in TieredCache._all:
+        st = cache.stats()
+        out[(cache.name, "hit_memory")] = st["hits_memory"]
+        out[(cache.name, "hit_disk")] = st["hits_disk"]
+        out[(cache.name, "miss")] = st["misses"]
+    return out
+
+def _cache_hit_ratio():
+    return {(cache.name,): cache.stats()["hit_rate"] for cache in TieredCache._all}
+
+def _batch_sizes():
+    return {(size,): n for size, n in model_batcher.stats()["batch_sizes"].items()}
+
+def _job_queue():
+    st = prediction_jobs.stats()
+    return {("pending",): st["pending"], ("tracked",): st["jobs"]}
+
+def _breaker_state():
+    backend = _inference_backend
+    if not isinstance(backend, FallbackBackend):
+        return {}
+    current = backend.breaker.state
+    return {(backend.breaker.name, st): int(st == current)
+            for st in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)}
+
+callback("neurovoice_cache_lookups_total", "Cache lookups by outcome.", "counter",
+         ["cache", "result"], _cache_lookups)
+callback("neurovoice_cache_hit_ratio", "Share of cache lookups answered from the cache since start.", "gauge",
+         ["cache"], _cache_hit_ratio)
+callback("neurovoice_model_batches_total", "Micro-batched model calls by batch size.", "counter",
+         ["size"], _batch_sizes)
+callback("neurovoice_prediction_jobs", "Background prediction jobs (pending = queued + running).", "gauge",
+         ["state"], _job_queue)
+callback("neurovoice_breaker_state", "Circuit breaker state (1 for the current one).", "gauge",
+         ["breaker", "state"], _breaker_state)
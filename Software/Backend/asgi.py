@@ -0,0 +1,550 @@
+"""
+ASGI variant of the prediction API:
+
+    uvicorn asgi:app --port 6350
+
+POST /api/predict is served natively async: the Google speech request and
+the SageMaker invocation are awaited on a shared httpx client instead of
+pinning a thread each, so in-flight predictions are bounded by sockets, not
+threads. CPU-bound work (multipart parsing aside: decoding, hashing, FLAC
+encoding, offline ASR engines, local models) runs on the "asgi-cpu" pool.
+Validation, caching, output parsing and the response body are the ones of
+the Flask blueprint in api.py. Every other route (pages, jobs, batch,
+/metrics) is passed through to the Flask app in main.py.
+
+Only SageMakerBackend and GoogleAsrEngine have async clients; other engines
+and backends (vosk, sphinx, local, the circuit-breaker fallback) are run on
+the CPU pool as they are. Micro-batching (PREDICT_BATCH_MAX_SIZE) and the
+inference admission limit only apply to those; decoding takes a decode slot
+and recognition an ASR slot as in api.py (each stream utterance one of its
+own), and overload is answered with the same 429 + Retry-After.
+
+The WebSocket /api/predict/stream scores a recording while it is being made
+(see PredictionStream); it only exists here, the Flask app has no WebSockets.
+"""
+import asyncio
+import contextvars
+import io
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import IO, List, Optional, Tuple
+from urllib.parse import quote
+
+import boto3
+import httpx
+import speech_recognition as sr
+from a2wsgi import WSGIMiddleware
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from speech_recognition.recognizers import google
+from starlette.applications import Starlette
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+import api
+import main
+from admission import Overloaded
+from cache import audio_digest
+from decoding import TARGET_RATE
+from metrics import counter, gauge, histogram, stage
+from resilience import CALLS, DEADLINES, RETRIES, deadline_scope, remaining
+from streaming import StreamAnalyzer
+
+ASGI_CPU_WORKERS = int(os.getenv("ASGI_CPU_WORKERS", str(os.cpu_count() or 4)))
+ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "16"))  # threads for the routes passed to Flask
+
+# /api/predict/stream
+STREAM_MAX_ACTIVE = int(os.getenv("STREAM_MAX_ACTIVE", "64"))  # open streams per worker process
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))  # longest recording a stream may send
+STREAM_IDLE_SECONDS = float(os.getenv("STREAM_IDLE_SECONDS", "30"))  # close a stream that sends nothing this long
+STREAM_STATS_SECONDS = float(os.getenv("STREAM_STATS_SECONDS", "1"))  # audio between two "stats" messages
+STREAM_SPECULATE_AFTER = float(os.getenv("STREAM_SPECULATE_AFTER", "0.8"))  # pause before pre-scoring; 0 = off
+
+STREAMS = counter("neurovoice_stream_sessions_total", "Streaming predictions by outcome "
+                  "(ok, error, disconnected, rejected).", ["outcome"])
+STREAMS_ACTIVE = gauge("neurovoice_stream_active", "Open /api/predict/stream connections.")
+STREAM_FINAL_SECONDS = histogram("neurovoice_stream_final_seconds", "Time from the client's stop to the prediction.",
+                                 buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+SPECULATIONS = counter("neurovoice_stream_speculations_total", "Transcripts scored during a pause, by whether the "
+                       "prediction used them (used, wasted).", ["outcome"])
+
+flask_app = main.app
+_http: Optional[httpx.AsyncClient] = None
+_credentials = None
+_streams = 0
+
+
+async def _cpu(fn, *args):
+    """fn(*args) on the CPU pool, so the event loop keeps serving other requests; the deadline goes along."""
+    pool = api.shared_pool("asgi-cpu", ASGI_CPU_WORKERS)
+    return await asyncio.get_running_loop().run_in_executor(pool, contextvars.copy_context().run, fn, *args)
+
+
+# --- Auth: the Flask-Login session cookie set by /login ---
+def _load_user_inputs(user_id: str) -> Optional[Tuple[int, int, Optional[int]]]:
+    with flask_app.app_context():
+        user = main.load_user(user_id)
+        return None if user is None else api.user_inputs(user)
+
+
+def session_user_id(request: HTTPConnection) -> Optional[str]:
+    """The logged-in user's id, or None without a valid session."""
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return None
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+    return session.get("_user_id")
+
+
+async def session_user_inputs(request: HTTPConnection) -> Optional[Tuple[int, int, Optional[int]]]:
+    """(sex, age, mmse) of the logged-in user, or None without a valid session."""
+    user_id = session_user_id(request)
+    return None if user_id is None else await _cpu(_load_user_inputs, user_id)
+
+
+def _limited_receive(receive, limit: int):
+    """receive() that raises a 413 PredictError once the body passes `limit` bytes."""
+    received = 0
+
+    async def limited():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise api.PredictError(f"File too large (> {api.MAX_FILE_MB} MB).", 413)
+        return message
+    return limited
+
+
+async def read_upload(request: Request) -> IO[bytes]:
+    """api.read_upload() for a Starlette request."""
+    limit = flask_app.config.get("MAX_CONTENT_LENGTH")
+    length = request.headers.get("content-length")
+    if limit and length and length.isdigit() and int(length) > limit:
+        raise api.PredictError(f"File too large (> {api.MAX_FILE_MB} MB).", 413)
+    if limit:
+        # Counted as the body arrives: a chunked request has no Content-Length to check up front,
+        # and the parser would otherwise spool all of it to disk first
+        request = Request(request.scope, _limited_receive(request.receive, limit))
+    with stage("upload"):
+        form = await request.form(max_files=1)
+    upload = form.get("audio")
+    if upload is None or isinstance(upload, str):
+        raise api.PredictError("Missing audio. Provide 'audio' file or 'audio_base64'.", 400)
+    if upload.size is not None and upload.size > api.MAX_FILE_MB * 1024 * 1024:
+        raise api.PredictError(f"File too large (> {api.MAX_FILE_MB} MB).", 413)
+    api.check_filename(upload.filename or "")
+    upload.file.seek(0)
+    return upload.file
+
+
+# --- Speech recognition ---
+async def recognize(engine: api.AsrEngine, audio: "sr.AudioData") -> str:
+    """engine.recognize(audio), awaiting the HTTP call for the Google engine."""
+    if not isinstance(engine, api.GoogleAsrEngine):
+        return await _cpu(engine.recognize, audio)
+    builder = google.create_request_builder(endpoint=engine.endpoint, key=engine.key)
+    flac = await _cpu(builder.build_data, audio)
+    left = remaining()
+    try:
+        resp = await _http.post(builder.build_url(), content=flac, headers=builder.build_headers(audio),
+                                timeout=httpx.USE_CLIENT_DEFAULT if left is None else max(0.0, left))
+    except httpx.HTTPError as e:
+        raise sr.RequestError(f"recognition connection failed: {e}")
+    if resp.status_code >= 400:
+        raise sr.RequestError(f"recognition request failed: {resp.reason_phrase}")
+    return google.OutputParser(show_all=False, with_confidence=False).parse(resp.text)
+
+
+async def _recognize_chunk(engine: api.AsrEngine, chunk: "sr.AudioData") -> str:
+    for attempt in range(2):  # as api._recognize_chunk
+        try:
+            return await recognize(engine, chunk)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError:
+            if attempt:
+                raise
+
+
+async def transcribe(audio: IO[bytes]) -> str:
+    """api.transcribe_wav(), with the chunks of long recordings recognised concurrently."""
+    engine = api.get_asr_engine()
+    recording = await _cpu(api.decode_audio, audio)
+    async with api.asr_limiter.async_slot():
+        chunks = await _cpu(api.audio_chunks, recording)
+        if chunks is None:
+            return await recognize(engine, recording)
+        texts = await asyncio.gather(*(_recognize_chunk(engine, chunk) for _, _, chunk in chunks))
+    if not any(texts):
+        raise sr.UnknownValueError()
+    return " ".join(t for t in texts if t)
+
+
+async def transcribe_cached(audio: IO[bytes], digest: str) -> str:
+    key = f"{api.get_asr_engine().name}:{digest}"
+    transcript = api.transcript_cache.get(key)
+    if transcript is None:
+        try:
+            with stage("transcribe"):
+                transcript = await transcribe(audio)
+        except sr.UnknownValueError:
+            raise api.PredictError("Could not understand audio (speech recognition).", 422)
+        except sr.RequestError as e:
+            raise api.PredictError(f"Speech recognition service error: {e}", 502)
+        api.transcript_cache.set(key, transcript)
+    return transcript
+
+
+# --- SageMaker ---
+def _signed_headers(url: str, body: bytes) -> dict:
+    global _credentials
+    if _credentials is None:
+        _credentials = boto3.session.Session(
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        ).get_credentials()
+    region = api.get_sagemaker_client().meta.region_name
+    req = AWSRequest(method="POST", url=url, data=body, headers={"Content-Type": "application/json"})
+    SigV4Auth(_credentials.get_frozen_credentials(), "sagemaker", region).add_auth(req)
+    return dict(req.headers.items())
+
+
+async def invoke_endpoint(backend: api.SageMakerBackend, body: bytes) -> str:
+    """
+    SageMakerBackend.predict()'s invoke_endpoint call over httpx, with the
+    same attempts, jittered backoff and deadline; no hedging.
+    """
+    url = f"{api.get_sagemaker_client().meta.endpoint_url}/endpoints/{quote(backend.endpoint_name)}/invocations"
+    for attempt in range(api.SAGEMAKER_MAX_ATTEMPTS):
+        if attempt:
+            RETRIES.inc(call="invoke_endpoint")
+        left = remaining()
+        if left is not None and left <= 0:
+            break
+        CALLS.inc(call="invoke_endpoint")
+        try:
+            resp = await asyncio.wait_for(_http.post(url, content=body, headers=_signed_headers(url, body)), left)
+        except asyncio.TimeoutError:
+            break
+        except httpx.HTTPError as e:
+            error = f"SageMaker error: {e!r}"
+        else:
+            if resp.status_code < 400:
+                return resp.text
+            error = f"SageMaker error: {resp.status_code} {resp.text[:200]}"
+            if resp.status_code < 500 and resp.status_code != 429:
+                raise api.PredictError(error, 502)
+        if attempt == api.SAGEMAKER_MAX_ATTEMPTS - 1:
+            raise api.PredictError(error, 502)
+        delay = random.uniform(0, min(api.SAGEMAKER_RETRY_CAP_MS, api.SAGEMAKER_RETRY_BASE_MS * 2 ** attempt) / 1000)
+        left = remaining()
+        if left is not None and delay >= left:
+            break
+        await asyncio.sleep(delay)
+    DEADLINES.inc(call="invoke_endpoint")
+    raise api.PredictError("SageMaker error: prediction deadline exceeded", 504)
+
+
+async def score(backend: api.InferenceBackend, model_input: api.ModelInput) -> Tuple[api.InferenceBackend, str]:
+    if not isinstance(backend, api.SageMakerBackend):
+        return await _cpu(api.score, backend, model_input)
+    with stage("payload"):
+        body = json.dumps({"data": {"features": {"values": [
+            [model_input.sex, model_input.age, model_input.mmse, model_input.transcript]]}}}).encode("utf-8")
+    with stage("invoke_endpoint"):
+        return backend, await invoke_endpoint(backend, body)
+
+
+async def run_prediction(audio: IO[bytes], sex: int, age: int, mmse: Optional[int]) -> dict:
+    """api.run_prediction(), awaiting the remote calls."""
+    with stage("digest"):
+        digest = await _cpu(audio_digest, audio)
+    transcript = await transcribe_cached(audio, digest)
+
+    backend = api.get_inference_backend()
+    model_input = api.ModelInput(sex, age, mmse, transcript, audio)
+    prediction_key = api.prediction_cache_key(digest, model_input, backend)
+    raw = api.prediction_cache.get(prediction_key)
+    if raw is None:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise api.PredictError("Prediction deadline exceeded.", 504)
+        answered, raw = await score(backend, model_input)
+        if answered.describe() == backend.describe():
+            api.prediction_cache.set(prediction_key, raw)
+        return api.prediction_body(answered, model_input, raw)
+    return api.prediction_body(backend, model_input, raw)
+
+
+async def predict(request: Request):
+    try:
+        with deadline_scope(api.request_deadline(request.headers.get("X-Deadline-Ms", ""))):
+            inputs = await session_user_inputs(request)
+            if inputs is None:
+                return JSONResponse({"error": "Login required."}, 401)
+            audio = await read_upload(request)
+            try:
+                body = await run_prediction(audio, *inputs)
+            finally:
+                audio.close()
+        api.prediction_served(session_user_id(request), body)
+        return JSONResponse(body, 200)
+
+    except Overloaded as ol:
+        return JSONResponse({"error": str(ol)}, 429, {"Retry-After": str(ol.retry_after)})
+    except api.PredictError as pe:
+        return JSONResponse({"error": pe.message}, pe.status)
+    except ValueError as ve:
+        return JSONResponse({"error": str(ve)}, 400)
+    except Exception as e:
+        if flask_app.debug:
+            return JSONResponse({"error": f"Unhandled error: {repr(e)}"}, 500)
+        return JSONResponse({"error": "Internal error"}, 500)
+
+
+# --- Streaming: /api/predict/stream ---
+class PredictionStream:
+    """
+    One /api/predict/stream connection. The client sends mono 16-bit
+    little-endian PCM (at ?rate=, 16000 by default) in binary messages, then
+    {"type": "stop"}. While it talks, the server sends
+        {"type": "partial", "segment": {"start", "end", "text"}, "transcript"}
+            as each utterance (cut at a pause) is recognised,
+        {"type": "stats", "duration", "hesitation_ratio", ...}
+            every STREAM_STATS_SECONDS of audio,
+    and after the stop {"type": "result", ...the /api/predict body..., "stats"}
+    or {"type": "error", "error", "status"}, then closes the socket.
+
+    By the time the client stops, every utterance but the last has been
+    recognised, and the acoustic features have been computed as the audio
+    came in. For transcript-only backends (SageMaker) the transcript is also
+    scored as soon as it is complete and the speaker has paused for
+    STREAM_SPECULATE_AFTER seconds; a stop during that pause is answered
+    with that result.
+    """
+
+    def __init__(self, websocket: WebSocket, inputs: Tuple[int, int, Optional[int]], rate: int):
+        self.ws = websocket
+        self.sex, self.age, self.mmse = inputs
+        self.engine = api.get_asr_engine()
+        self.backend = api.get_inference_backend()
+        self.analyzer = StreamAnalyzer(rate, acoustic=not isinstance(self.backend, api.SageMakerBackend),
+                                       min_pause=api.ASR_CHUNK_MIN_SILENCE, max_utterance=api.ASR_CHUNK_MAX_SECONDS,
+                                       silence_db=api.ASR_CHUNK_SILENCE_DB)
+        self.segments: List[dict] = []
+        self.tasks: List[asyncio.Task] = []
+        self.speculation: Optional[Tuple[str, asyncio.Task]] = None
+        self._send_lock = asyncio.Lock()
+        self._stats_at = STREAM_STATS_SECONDS
+
+    async def send(self, message: dict):
+        async with self._send_lock:
+            await self.ws.send_json(message)
+
+    async def run(self) -> dict:
+        """Takes audio until the stop message; returns the prediction body."""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.ws.receive(), STREAM_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                raise api.PredictError(f"No audio for {STREAM_IDLE_SECONDS:g} s.", 408)
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                await self.feed(message["bytes"])
+                continue
+            try:
+                control = json.loads(message.get("text") or "")
+            except ValueError:
+                control = None
+            if not isinstance(control, dict) or control.get("type") != "stop":
+                raise api.PredictError('Send binary PCM frames, then {"type": "stop"}.', 400)
+            return await self.finish()
+
+    async def feed(self, pcm: bytes):
+        for start, end in await _cpu(self.analyzer.feed, pcm):
+            self.recognize(start, end)
+        if self.analyzer.duration > STREAM_MAX_SECONDS:
+            raise api.PredictError(f"Recording too long (> {STREAM_MAX_SECONDS:g} s).", 413)
+        if self.analyzer.duration >= self._stats_at:
+            self._stats_at = self.analyzer.duration + STREAM_STATS_SECONDS
+            await self.send({"type": "stats", **await _cpu(self.analyzer.stats)})
+        self.speculate()
+
+    def recognize(self, start: int, end: int):
+        segment = {"start": round(start / TARGET_RATE, 3), "end": round(end / TARGET_RATE, 3), "text": None}
+        self.segments.append(segment)
+        chunk = sr.AudioData(self.analyzer.audio(start, end), TARGET_RATE, 2)
+        self.tasks.append(_background(self._recognize(segment, chunk)))
+
+    async def _recognize(self, segment: dict, chunk: "sr.AudioData") -> str:
+        async with api.asr_limiter.async_slot():
+            segment["text"] = await _recognize_chunk(self.engine, chunk)
+        await self.send({"type": "partial", "segment": segment, "transcript": self.transcript()[0]})
+        self.speculate()
+        return segment["text"]
+
+    def transcript(self) -> Tuple[str, bool]:
+        """The text recognised so far, in order, and whether every utterance cut so far is in it."""
+        texts = [seg["text"] for seg in self.segments]
+        return " ".join(t for t in texts if t), None not in texts
+
+    def speculate(self):
+        if STREAM_SPECULATE_AFTER <= 0 or self.analyzer.acoustic or self.analyzer.in_utterance \
+                or self.analyzer.trailing_silence < STREAM_SPECULATE_AFTER:
+            return
+        transcript, complete = self.transcript()
+        if not complete or not transcript or (self.speculation and self.speculation[0] == transcript):
+            return
+        self._drop_speculation()
+        self.speculation = (transcript, _background(self.score(transcript)))
+
+    def _drop_speculation(self):
+        if self.speculation is not None:
+            self.speculation[1].cancel()
+            SPECULATIONS.inc(outcome="wasted")
+            self.speculation = None
+
+    async def score(self, transcript: str, acoustics: Optional[dict] = None) -> dict:
+        audio = io.BytesIO(self.analyzer.wav()) if acoustics is not None else None
+        model_input = api.ModelInput(self.sex, self.age, self.mmse, transcript, audio, acoustics)
+        answered, raw = await score(self.backend, model_input)
+        return api.prediction_body(answered, model_input, raw)
+
+    async def finish(self) -> dict:
+        stopped = time.perf_counter()
+        with deadline_scope(api.request_deadline(self.ws.headers.get("X-Deadline-Ms", ""))):
+            for start, end in await _cpu(self.analyzer.flush):
+                self.recognize(start, end)
+            acoustics = _background(_cpu(self.analyzer.acoustics)) if self.analyzer.acoustic else None
+            try:
+                with stage("transcribe"):
+                    await asyncio.gather(*self.tasks)
+            except sr.RequestError as e:
+                raise api.PredictError(f"Speech recognition service error: {e}", 502)
+            transcript, _ = self.transcript()
+            if not transcript:
+                raise api.PredictError("Could not understand audio (speech recognition).", 422)
+
+            body = None
+            if self.speculation is not None and self.speculation[0] == transcript:
+                try:
+                    body = await self.speculation[1]
+                    SPECULATIONS.inc(outcome="used")
+                except Exception:
+                    SPECULATIONS.inc(outcome="wasted")  # scored again below, under the deadline
+                self.speculation = None
+            self._drop_speculation()
+            if body is None:
+                body = await self.score(transcript, await acoustics if acoustics is not None else None)
+        body["stats"] = await _cpu(self.analyzer.stats)
+        STREAM_FINAL_SECONDS.observe(time.perf_counter() - stopped)
+        return body
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.speculation is not None:
+            self.speculation[1].cancel()
+
+
+def _background(coro) -> asyncio.Task:
+    """A task whose failure is seen by whoever awaits it, and not logged as unretrieved if nobody does."""
+    task = asyncio.ensure_future(coro)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+
+# WebSocket close codes for error statuses: message too big, try again later; otherwise 1011
+# (server error) for 5xx and 1008 (policy violation) for the other 4xx
+_CLOSE_CODES = {413: 1009, 429: 1013}
+
+
+async def predict_stream(websocket: WebSocket):
+    global _streams
+    await websocket.accept()
+    stream = None
+    try:
+        try:
+            inputs = await session_user_inputs(websocket)
+            if inputs is None:
+                raise api.PredictError("Login required.", 401)
+            if _streams >= STREAM_MAX_ACTIVE:
+                STREAMS.inc(outcome="rejected")
+                raise Overloaded("stream", 1)
+            rate = websocket.query_params.get("rate", str(TARGET_RATE))
+            if not rate.isdigit() or not 8000 <= int(rate) <= 192000:
+                raise api.PredictError("rate must be a sample rate in Hz, 8000-192000.", 400)
+            _streams += 1
+            STREAMS_ACTIVE.inc()
+            try:
+                stream = PredictionStream(websocket, inputs, int(rate))
+                body = await stream.run()
+            finally:
+                _streams -= 1
+                STREAMS_ACTIVE.dec()
+        except WebSocketDisconnect:
+            STREAMS.inc(outcome="disconnected")
+            return
+        except Overloaded as ol:
+            error = {"error": str(ol), "status": 429, "retry_after": ol.retry_after}
+        except api.PredictError as pe:
+            error = {"error": pe.message, "status": pe.status}
+        except ValueError as ve:
+            error = {"error": str(ve), "status": 400}
+        except Exception as e:
+            error = {"error": f"Unhandled error: {repr(e)}" if flask_app.debug else "Internal error", "status": 500}
+        else:
+            STREAMS.inc(outcome="ok")
+            api.prediction_served(session_user_id(websocket), body)
+            await stream.send({"type": "result", **body})
+            await websocket.close(1000)
+            return
+        if error["status"] != 429:
+            STREAMS.inc(outcome="error")
+        await websocket.send_json({"type": "error", **error})
+        await websocket.close(_CLOSE_CODES.get(error["status"], 1011 if error["status"] >= 500 else 1008))
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # the client went away while we were answering
+    finally:
+        if stream is not None:
+            stream.close()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # One keep-alive pool per worker process, shared by every request on its event loop
+    global _http
+    _http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=api.SAGEMAKER_MAX_CONNECTIONS,
+                            max_keepalive_connections=api.SAGEMAKER_MAX_CONNECTIONS),
+        timeout=httpx.Timeout(api.SAGEMAKER_READ_TIMEOUT, connect=api.SAGEMAKER_CONNECT_TIMEOUT),
+    )
+    # As gunicorn's post_fork: warm this worker's models in the background, so /api/ready turns 200
+    api.start_warm_up()
+    main.start_background()
+    try:
+        yield
+    finally:
+        await _http.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/predict", predict, methods=["POST"]),
+        WebSocketRoute("/api/predict/stream", predict_stream),
+        Mount("/", app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_WORKERS)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,96 @@
+"""
+Dynamic micro-batching: concurrent callers each submit one item, a
+dispatcher thread groups whatever arrives within max_wait seconds (up to
+max_batch items) and hands the group to a single batch function call.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int, max_wait: float,
+                 max_inflight: int = 4, name: str = "batcher"):
+        """
+        :param fn: called with a list of items, must return one result per item, in order
+        :param max_batch: most items sent in one call
+        :param max_wait: seconds the first item of a batch waits for company
+        :param max_inflight: batch calls allowed to run at once; while all are busy,
+                             new items keep accumulating into the next batch
+        """
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.max_inflight = max(1, max_inflight)
+        self.name = name
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sizes: Counter = Counter()
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Blocks until the batch containing item is done; re-raises the batch's exception."""
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        if self._thread is None:
+            self._start()
+        return fut.result(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = dict(self._sizes)
+        batches = sum(sizes.values())
+        rows = sum(size * n for size, n in sizes.items())
+        return {
+            "batches": batches,
+            "rows": rows,
+            "mean_batch_size": rows / batches if batches else 0.0,
+            "max_batch_size": max(sizes) if sizes else 0,
+            "batch_sizes": sizes,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Wait for a free slot first: items that arrive meanwhile join this batch
+            self._slots.acquire()
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                self._sizes[len(batch)] += 1
+            threading.Thread(target=self._dispatch, args=(batch,), name=f"{self.name}-call", daemon=True).start()
+
+    def _dispatch(self, batch: List[tuple]):
+        try:
+            results = self.fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: got {len(results)} results for {len(batch)} items")
+        except BaseException as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for (_, fut), result in zip(batch, results):
+            fut.set_result(result)
@@ -0,0 +1,134 @@
+"""
+Load test: /api/predict on the Flask blueprint (gunicorn, gthread workers)
+vs the ASGI variant (uvicorn asgi:app), both against the stand-in for the
+Google speech API and the SageMaker endpoint with the same injected delay.
+
+    cd Software/Backend && python -m bench.asgi_load --concurrency 8 32 128 --latency 0.2
+
+Each server gets one worker process; the WSGI one has --threads threads,
+which caps how many predictions it can wait on at once.
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import httpx
+
+from bench.standin import StandinEndpoint
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wav(seconds: float = 2.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * i / rate)))
+                               for i in range(int(seconds * rate))))
+    return buf.getvalue()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _create_user(env: dict):
+    code = ("import main\n"
+            "with main.app.app_context():\n"
+            "    main.db.create_all()\n"
+            "    u = main.User(email='bench@example.com', username='bench', sex='M', age=70, mmse_score=25)\n"
+            "    u.set_password('bench-password')\n"
+            "    main.db.session.add(u); main.db.session.commit()\n")
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, check=True)
+
+
+async def _wait_up(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(200):
+            try:
+                await client.get(url + "/metrics")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def _load(url: str, concurrency: int, requests: int, wav: bytes):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        await client.post("/login", data={"email": "bench@example.com", "password": "bench-password"})
+        lat, errors, todo = [], 0, iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in todo:
+                t0 = time.perf_counter()
+                r = await client.post("/api/predict", files={"audio": ("bench.wav", wav, "audio/wav")})
+                lat.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    lat.sort()
+    return requests / wall, statistics.median(lat) * 1000, lat[int(len(lat) * 0.99) - 1] * 1000, errors
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    ap.add_argument("--requests", type=int, default=256)
+    ap.add_argument("--latency", type=float, default=0.2, help="stand-in delay per remote call, seconds")
+    ap.add_argument("--threads", type=int, default=8, help="gthread threads of the WSGI worker")
+    args = ap.parse_args()
+
+    wav = _wav()
+    with StandinEndpoint(latency=args.latency) as ep, tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                   ASR_ENGINE="google",
+                   ASR_GOOGLE_ENDPOINT=ep.url + "/speech-api/v2/recognize",
+                   SAGEMAKER_ENDPOINT_URL=ep.url,
+                   RESULT_CACHE_SIZE="0",
+                   AWS_REGION=os.getenv("AWS_REGION", "us-east-1"),
+                   AWS_ACCESS_KEY_ID=os.getenv("AWS_ACCESS_KEY_ID", "bench"),
+                   AWS_SECRET_ACCESS_KEY=os.getenv("AWS_SECRET_ACCESS_KEY", "bench"))
+        _create_user(env)
+        servers = {
+            "wsgi": lambda port: [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread",
+                                  "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "main:app"],
+            "asgi": lambda port: [sys.executable, "-m", "uvicorn", "--port", str(port),
+                                  "--log-level", "warning", "asgi:app"],
+        }
+        print(f"{'server':<8}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name, cmd in servers.items():
+            port = _free_port()
+            proc = subprocess.Popen(cmd(port), cwd=HERE, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                url = f"http://127.0.0.1:{port}"
+                asyncio.run(_wait_up(url))
+                for concurrency in args.concurrency:
+                    rps, p50, p99, errors = asyncio.run(_load(url, concurrency, args.requests, wav))
+                    print(f"{name:<8}{concurrency:>6}{rps:>10.1f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
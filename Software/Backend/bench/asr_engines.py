@@ -0,0 +1,68 @@
+"""
+Benchmark: real-time factor (processing time / audio duration) of each ASR engine.
+
+    cd Software/Backend && python -m bench.asr_engines recording1.wav recording2.wav --engines stub vosk google
+
+Without files, a synthetic 60 s recording (tone bursts separated by pauses)
+is used; only meaningful for the stub and for chunking overhead. Engines
+whose dependencies or models are missing are reported and skipped.
+"""
+import argparse
+import io
+import math
+import struct
+import time
+import wave
+
+import speech_recognition as sr
+
+
+def synthetic_wav(seconds: float = 60.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            t = i / rate
+            amp = 8000 if int(t / 3) % 2 == 0 else 0  # 3 s of "speech", 3 s of pause
+            frames += struct.pack("<h", int(amp * math.sin(2 * math.pi * 220 * t)))
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--engines", nargs="+", default=["stub", "vosk", "sphinx", "google"])
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    import api
+    recordings = [(f, open(f, "rb").read()) for f in args.files] or [("synthetic-60s", synthetic_wav())]
+
+    print(f"{'engine':<8}{'file':<28}{'audio s':>9}{'wall s':>9}{'RTF':>8}")
+    for kind in args.engines:
+        engine = api.build_asr_engine(kind)
+        try:
+            engine.warm_up()
+        except Exception as e:
+            print(f"{kind:<8}skipped: {e!r}")
+            continue
+        for name, data in recordings:
+            with sr.AudioFile(io.BytesIO(data)) as source:
+                duration = source.DURATION
+            t0 = time.perf_counter()
+            try:
+                for _ in range(args.repeat):
+                    api.transcribe_segments(io.BytesIO(data), engine=engine)
+            except (sr.UnknownValueError, sr.RequestError) as e:
+                print(f"{kind:<8}{name[-27:]:<28}failed: {e!r}")
+                continue
+            wall = (time.perf_counter() - t0) / args.repeat
+            print(f"{kind:<8}{name[-27:]:<28}{duration:>9.1f}{wall:>9.2f}{wall / duration:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
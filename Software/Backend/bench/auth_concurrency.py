@@ -0,0 +1,123 @@
+"""
+Load test: the auth routes (login, register, password reset request) with
+concurrent clients against gunicorn main:app on a local SQLite file, with
+SQLite's defaults (rollback journal, fsync on every commit, the sqlite3
+module's 5 s lock wait) and with database.py's settings (WAL,
+synchronous=NORMAL, SQLITE_BUSY_TIMEOUT_MS).
+
+    cd Software/Backend && python -m bench.auth_concurrency --concurrency 4 16 64 --workers 2 --threads 4
+
+Each client loops over a mix of requests, by default 60% logins of existing
+users, 20% registrations and 20% reset requests (a read, a delete and an
+insert of an OTPCode, and a spooled email). Logins and registrations mostly
+measure password hashing; --mix 0 0 1 (resets only) isolates the database.
+Email addresses are not checked for deliverability (no DNS lookups) and the
+spooled mail goes nowhere.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.asgi_load import HERE, _free_port, _wait_up
+
+MODES = {
+    "default": {"SQLITE_JOURNAL_MODE": "delete", "SQLITE_SYNCHRONOUS": "full", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+    "tuned": {},  # database.py's defaults
+}
+# gunicorn, with email_validator's DNS check off
+SERVER = ("import sys, email_validator\n"
+          "email_validator.CHECK_DELIVERABILITY = False\n"
+          "from gunicorn.app.wsgiapp import run\n"
+          "sys.argv[0] = 'gunicorn'\n"
+          "run()\n")
+
+
+def _seed(env: dict, users: int):
+    code = ("import main\n"
+            "with main.app.app_context():\n"
+            "    main.db.create_all()\n"
+            f"    for i in range({users}):\n"
+            "        u = main.User(email=f'user{i}@example.com', username=f'user{i}', sex='M', age=70, mmse_score=25)\n"
+            "        u.set_password('bench-password')\n"
+            "        main.db.session.add(u)\n"
+            "    main.db.session.commit()\n")
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, check=True)
+
+
+async def _load(url: str, concurrency: int, requests: int, users: int, mix, run: str):
+    lat = {"login": [], "register": [], "reset": []}
+    errors, todo, rng = 0, iter(range(requests)), random.Random(0)
+
+    async def client():
+        nonlocal errors
+        async with httpx.AsyncClient(base_url=url, timeout=120) as c:
+            for n in todo:
+                op = rng.choices(("login", "register", "reset"), mix)[0]
+                if op == "login":
+                    path, expect = "/login", "/ai"
+                    data = {"email": f"user{rng.randrange(users)}@example.com", "password": "bench-password"}
+                elif op == "register":
+                    path, expect = "/register", "/login"
+                    data = {"email": f"new{run}-{n}@example.com", "username": f"new{run}-{n}", "password": "bench-password",
+                            "confirmPassword": "bench-password", "sex": "f", "age": "70", "mmse": "25"}
+                else:
+                    path, expect = "/reset", "/verify-code"
+                    data = {"email": f"user{rng.randrange(users)}@example.com"}
+                t0 = time.perf_counter()
+                r = await c.post(path, data=data)
+                lat[op].append(time.perf_counter() - t0)
+                errors += r.status_code != 302 or not r.headers.get("location", "").endswith(expect)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    everything = sorted(x for xs in lat.values() for x in xs)
+    p50 = {op: statistics.median(xs) * 1000 if xs else 0.0 for op, xs in lat.items()}
+    return requests / wall, p50, everything[int(len(everything) * 0.99) - 1] * 1000, errors
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64])
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--users", type=int, default=100, help="existing accounts")
+    ap.add_argument("--mix", type=float, nargs=3, default=[0.6, 0.2, 0.2], metavar=("LOGIN", "REGISTER", "RESET"),
+                    help="relative weights of the three requests")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    ap.add_argument("--threads", type=int, default=4, help="gthread threads per worker")
+    args = ap.parse_args()
+
+    print(f"{'mode':<9}{'conc':>5}{'req/s':>8}{'login p50':>11}{'register p50':>14}{'reset p50':>11}"
+          f"{'p99 ms':>9}{'errors':>8}")
+    for mode, settings in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", MAIL_SPOOL_DIR=f"{tmp}/mail",
+                       OTP_SWEEP_INTERVAL_SECONDS="0", USER_CACHE_SIZE="0", **settings)
+            _seed(env, args.users)
+            port = _free_port()
+            proc = subprocess.Popen([sys.executable, "-c", SERVER, "-w", str(args.workers), "-k", "gthread",
+                                     "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "main:app"],
+                                    cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                url = f"http://127.0.0.1:{port}"
+                asyncio.run(_wait_up(url))
+                for concurrency in args.concurrency:
+                    rps, p50, p99, errors = asyncio.run(_load(url, concurrency, args.requests, args.users,
+                                                              args.mix, f"{concurrency}"))
+                    print(f"{mode:<9}{concurrency:>5}{rps:>8.1f}{p50['login']:>11.1f}{p50['register']:>14.1f}"
+                          f"{p50['reset']:>11.1f}{p99:>9.1f}{errors:>8}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
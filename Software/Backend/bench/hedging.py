@@ -0,0 +1,86 @@
+"""
+Benchmark: SageMakerBackend.predict() against a stand-in endpoint where every
+Nth call straggles, with and without hedging, plus a run with injected 503s
+to exercise the retries.
+
+    cd Software/Backend && python -m bench.hedging --slow-every 20 --slow-latency 0.5
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.standin import StandinEndpoint
+
+
+def _run(backend, threads: int, calls: int, deadline: float):
+    import api
+    from resilience import deadline_scope
+
+    lat, errors = [], 0
+    item = api.ModelInput(1, 70, 24, "the boy is on the stool", None)
+
+    def one(_):
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            with deadline_scope(deadline):
+                backend.predict([item])
+        except api.PredictError:
+            errors += 1
+        lat.append(time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    lat.sort()
+    return statistics.median(lat) * 1000, lat[int(len(lat) * 0.99) - 1] * 1000, lat[-1] * 1000, errors
+
+
+def _counter(metric, **labels) -> float:
+    return metric._values.get(metric._key(labels), 0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--calls", type=int, default=400)
+    ap.add_argument("--latency", type=float, default=0.01, help="normal stand-in call time, seconds")
+    ap.add_argument("--slow-every", type=int, default=20)
+    ap.add_argument("--slow-latency", type=float, default=0.5)
+    ap.add_argument("--fail-every", type=int, default=10, help="503 rate for the retry run")
+    ap.add_argument("--percentile", type=float, default=90, help="hedge delay percentile")
+    ap.add_argument("--deadline", type=float, default=2.0, help="per-call deadline, seconds")
+    args = ap.parse_args()
+
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    import api
+    import resilience
+
+    runs = (
+        ("plain", 0, 0),
+        ("hedged", args.percentile, 0),
+        ("503s+retry", 0, args.fail_every),
+    )
+    print(f"{'mode':<12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}{'hedges':>8}{'won':>6}{'retries':>9}")
+    for mode, percentile, fail_every in runs:
+        with StandinEndpoint(latency=args.latency, slow_every=args.slow_every,
+                             slow_latency=args.slow_latency, fail_every=fail_every) as ep:
+            api.SAGEMAKER_ENDPOINT_URL = ep.url
+            api.SAGEMAKER_HEDGE_PERCENTILE = percentile
+            api.reset_sagemaker_client()
+            backend = api.SageMakerBackend("bench")
+            before = {k: _counter(resilience.HEDGES, call="invoke_endpoint", outcome=k) for k in ("fired", "won")}
+            retries = _counter(resilience.RETRIES, call="invoke_endpoint")
+            _run(backend, args.threads, 50, args.deadline)  # fills the latency window
+            p50, p99, worst, errors = _run(backend, args.threads, args.calls, args.deadline)
+            fired = _counter(resilience.HEDGES, call="invoke_endpoint", outcome="fired") - before["fired"]
+            won = _counter(resilience.HEDGES, call="invoke_endpoint", outcome="won") - before["won"]
+            retried = _counter(resilience.RETRIES, call="invoke_endpoint") - retries
+            print(f"{mode:<12}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}{errors:>8}{fired:>8.0f}{won:>6.0f}{retried:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
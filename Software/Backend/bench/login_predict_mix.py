@@ -0,0 +1,113 @@
+"""
+Mixed load: a login storm next to steady /api/predict traffic on one
+gunicorn gthread worker, with password hashing inline in the request
+threads (PASSWORD_HASH_WORKERS=0, as before passwords.py) and on its
+bounded pool. Predictions go to the stand-in for the Google speech API and
+the SageMaker endpoint.
+
+    cd Software/Backend && python -m bench.login_predict_mix --logins 16 --predicts 4 --seconds 20
+
+Prints p50/p99 latency of each kind of request. Logins refused with a 303
+back to the form (hashing saturated, Retry-After) are counted as shed.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.asgi_load import HERE, _create_user, _free_port, _wait_up, _wav
+from bench.standin import StandinEndpoint
+
+MODES = {"inline": {"PASSWORD_HASH_WORKERS": "0"}, "pool": {}}
+
+
+def _pct(xs, p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000 if xs else 0.0
+
+
+async def _mixed(url: str, logins: int, predicts: int, seconds: float, wav: bytes):
+    lat = {"login": [], "predict": []}
+    shed, errors = 0, 0
+    stop = time.perf_counter() + seconds
+
+    async def login_client():
+        nonlocal shed, errors
+        async with httpx.AsyncClient(base_url=url, timeout=120) as c:
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                r = await c.post("/login", data={"email": "bench@example.com", "password": "bench-password"})
+                if r.status_code == 303:
+                    shed += 1
+                    await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+                    continue
+                lat["login"].append(time.perf_counter() - t0)
+                errors += not r.headers.get("location", "").endswith("/ai")
+
+    async def predict_client():
+        nonlocal errors
+        async with httpx.AsyncClient(base_url=url, timeout=120) as c:
+            await c.post("/login", data={"email": "bench@example.com", "password": "bench-password"})
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                r = await c.post("/api/predict", files={"audio": ("bench.wav", wav, "audio/wav")})
+                lat["predict"].append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+
+    # Predictions first, so their clients are logged in before the storm
+    tasks = [asyncio.ensure_future(predict_client()) for _ in range(predicts)]
+    await asyncio.sleep(1.0)
+    await asyncio.gather(*tasks, *(login_client() for _ in range(logins)))
+    return lat, shed, errors
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    ap.add_argument("--predicts", type=int, default=4, help="concurrent /api/predict clients")
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--threads", type=int, default=16, help="gthread threads of the worker")
+    ap.add_argument("--latency", type=float, default=0.2, help="stand-in delay per remote call, seconds")
+    args = ap.parse_args()
+
+    wav = _wav()
+    print(f"{'mode':<8}{'logins':>8}{'shed':>6}{'login p50':>11}{'login p99':>11}"
+          f"{'predicts':>10}{'pred p50':>10}{'pred p99':>10}{'errors':>8}")
+    with StandinEndpoint(latency=args.latency) as ep:
+        for mode, settings in MODES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ,
+                           DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                           ASR_ENGINE="google",
+                           ASR_GOOGLE_ENDPOINT=ep.url + "/speech-api/v2/recognize",
+                           SAGEMAKER_ENDPOINT_URL=ep.url,
+                           RESULT_CACHE_SIZE="0",
+                           PREDICTION_HISTORY="0",
+                           AWS_REGION=os.getenv("AWS_REGION", "us-east-1"),
+                           AWS_ACCESS_KEY_ID=os.getenv("AWS_ACCESS_KEY_ID", "bench"),
+                           AWS_SECRET_ACCESS_KEY=os.getenv("AWS_SECRET_ACCESS_KEY", "bench"),
+                           **settings)
+                _create_user(env)
+                port = _free_port()
+                proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread",
+                                         "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "main:app"],
+                                        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    url = f"http://127.0.0.1:{port}"
+                    asyncio.run(_wait_up(url))
+                    lat, shed, errors = asyncio.run(_mixed(url, args.logins, args.predicts, args.seconds, wav))
+                    print(f"{mode:<8}{len(lat['login']):>8}{shed:>6}{_pct(lat['login'], 0.5):>11.0f}"
+                          f"{_pct(lat['login'], 0.99):>11.0f}{len(lat['predict']):>10}"
+                          f"{_pct(lat['predict'], 0.5):>10.0f}{_pct(lat['predict'], 0.99):>10.0f}{errors:>8}")
+                finally:
+                    proc.terminate()
+                    proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: the verify_code OTP lookup and the reset delete as otp_code
+grows, through ix_otp_code_lookup and by a full scan (as before the index),
+then one sweep of the used and expired rows.
+
+    cd Software/Backend && python -m bench.otp_lookup --sizes 10000 100000 1000000 3000000
+
+The table is filled as it would be without the sweeper: per user a handful
+of used or expired codes and at most one live one. SQLite in a temporary
+file; the scan figures use the same query with NOT INDEXED.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def _fill(db, start: int, stop: int, users: int, rng: random.Random):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(start, stop):
+        used = rng.random() < 0.7
+        expires = now + timedelta(minutes=10) if rng.random() < 0.02 else now - timedelta(days=rng.uniform(0, 365))
+        rows.append((i + 1, rng.randrange(1, users + 1), f"{rng.randrange(10 ** 6):06d}", "reset",
+                     expires.strftime("%Y-%m-%d %H:%M:%S.%f"), used))
+        if len(rows) == 100_000 or i == stop - 1:
+            db.session.connection().exec_driver_sql(
+                "INSERT INTO otp_code (id, user_id, code, purpose, expires_at, used) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    db.session.commit()
+
+
+def _time(fn, calls: int) -> float:
+    lat = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    return statistics.median(lat) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--calls", type=int, default=500, help="indexed lookups per size")
+    ap.add_argument("--scan-calls", type=int, default=5, help="full-scan lookups per size")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ["OTP_SWEEP_INTERVAL_SECONDS"] = "0"
+        from sqlalchemy import text
+        from main import OTPCode, app, db, otp_sweeper
+
+        rng = random.Random(0)
+        with app.app_context():
+            db.create_all()
+            where = "WHERE user_id = :u AND purpose = 'reset' AND used = 0 AND code = :c LIMIT 1"
+            scan_sql = text(f"SELECT * FROM otp_code NOT INDEXED {where}")
+            plan = db.session.execute(text(f"EXPLAIN QUERY PLAN SELECT * FROM otp_code {where}"),
+                                      {"u": 1, "c": "1"}).fetchall()
+            print("plan:", "; ".join(row[-1] for row in plan))
+            print(f"{'rows':>10}{'verify us':>12}{'reset us':>11}{'scan verify us':>17}")
+            filled = 0
+            for size in sorted(args.sizes):
+                users = max(1000, size // 5)
+                _fill(db, filled, size, users, rng)
+                filled = size
+
+                def verify():
+                    OTPCode.query.filter_by(user_id=rng.randrange(1, users + 1), purpose="reset", used=False,
+                                            code=f"{rng.randrange(10 ** 6):06d}").first()
+
+                def reset():  # as /reset, minus the new code: delete the user's unused codes, rolled back
+                    OTPCode.query.filter_by(user_id=rng.randrange(1, users + 1), purpose="reset", used=False).delete()
+                    db.session.rollback()
+
+                def scan():
+                    db.session.execute(scan_sql, {"u": rng.randrange(1, users + 1),
+                                                  "c": f"{rng.randrange(10 ** 6):06d}"}).first()
+
+                print(f"{size:>10}{_time(verify, args.calls):>12.0f}{_time(reset, args.calls):>11.0f}"
+                      f"{_time(scan, args.scan_calls):>17.0f}")
+                db.session.rollback()
+
+            t0 = time.perf_counter()
+            deleted = otp_sweeper.sweep()
+            seconds = time.perf_counter() - t0
+            left = OTPCode.query.count()
+            print(f"sweep: deleted {deleted} of {filled} rows in {seconds:.1f}s "
+                  f"({deleted / seconds:,.0f} rows/s, batches of {otp_sweeper.batch} "
+                  f"{otp_sweeper.pause * 1000:g} ms apart); {left} live codes left")
+
+
+if __name__ == "__main__":
+    main()
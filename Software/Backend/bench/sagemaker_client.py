@@ -0,0 +1,62 @@
+"""
+Benchmark: a fresh sagemaker-runtime client per call vs the shared pooled client.
+
+    cd Software/Backend && python -m bench.sagemaker_client --threads 1 4 16
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.standin import StandinEndpoint
+
+
+def _run(invoke, threads: int, calls: int):
+    lat = []
+
+    def one(_):
+        t0 = time.perf_counter()
+        invoke()
+        lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return calls / wall, statistics.median(lat) * 1000, lat[int(len(lat) * 0.99) - 1] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--calls", type=int, default=400)
+    ap.add_argument("--latency", type=float, default=0.005, help="stand-in model time, seconds")
+    args = ap.parse_args()
+
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    with StandinEndpoint(latency=args.latency) as ep:
+        os.environ["SAGEMAKER_ENDPOINT_URL"] = ep.url
+        import api  # reads SAGEMAKER_* at import time
+        api.SAGEMAKER_ENDPOINT_URL = ep.url
+        api.reset_sagemaker_client()
+        body = json.dumps({"data": {"features": {"values": [[1, 70, 24, "the boy is on the stool"]]}}})
+
+        def call(client):
+            resp = client.invoke_endpoint(EndpointName="bench", ContentType="application/json", Body=body)
+            return resp["Body"].read()
+
+        print(f"{'mode':<8}{'threads':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for threads in args.threads:
+            for mode, invoke in (("fresh", lambda: call(api._build_sagemaker_client())),
+                                 ("pooled", lambda: call(api.get_sagemaker_client()))):
+                rps, p50, p99 = _run(invoke, threads, args.calls)
+                print(f"{mode:<8}{threads:>8}{rps:>10.1f}{p50:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
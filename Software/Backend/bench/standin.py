@@ -0,0 +1,110 @@
+"""
+Local stand-in for a SageMaker runtime endpoint.
+
+Answers POST /endpoints/<name>/invocations with one "pred,conf" line per row
+in payload["data"]["features"]["values"], after an optional artificial delay.
+Every `slow_every`-th call instead takes `slow_latency` (a straggling
+instance, for hedging) and every `fail_every`-th call answers 503 (for retries).
+Point the backend at it with SAGEMAKER_ENDPOINT_URL=http://127.0.0.1:<port>.
+It also answers POST /speech-api/v2/recognize like Google's Web Speech API
+(ASR_GOOGLE_ENDPOINT=http://127.0.0.1:<port>/speech-api/v2/recognize), with
+a fixed transcript after the same delay.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRANSCRIPT = "the boy is on the stool reaching for the cookie jar"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.calls += 1
+            n = self.server.calls
+        srv = self.server
+        if srv.fail_every and n % srv.fail_every == 0:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        latency = srv.slow_latency if srv.slow_every and n % srv.slow_every == 0 else srv.latency
+        if latency:
+            time.sleep(latency)
+        if self.path.startswith("/speech-api/"):
+            result = {"result": [{"alternative": [{"transcript": TRANSCRIPT}], "final": True}], "result_index": 0}
+            out = ('{"result":[]}\n' + json.dumps(result) + "\n").encode("utf-8")
+            content_type = "application/json"
+        else:
+            try:
+                rows = json.loads(body)["data"]["features"]["values"]
+            except (ValueError, KeyError, TypeError):
+                rows = [None]
+            out = "\n".join(f"{i % 2},{90.0 - i % 10}" for i in range(len(rows))).encode("utf-8")
+            content_type = "text/csv"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandinEndpoint:
+    """Runs the stand-in on a background thread: `with StandinEndpoint() as url: ...`"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 slow_every: int = 0, slow_latency: float = 0.0, fail_every: int = 0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.slow_every = slow_every
+        self.server.slow_latency = slow_latency
+        self.server.fail_every = fail_every
+        self.server.calls = 0
+        self.server.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def calls(self) -> int:
+        return self.server.calls
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    ap.add_argument("--slow-every", type=int, default=0, help="every Nth call is slow")
+    ap.add_argument("--slow-latency", type=float, default=1.0, help="seconds taken by the slow calls")
+    ap.add_argument("--fail-every", type=int, default=0, help="every Nth call answers 503")
+    args = ap.parse_args()
+    with StandinEndpoint(port=args.port, latency=args.latency, slow_every=args.slow_every,
+                         slow_latency=args.slow_latency, fail_every=args.fail_every) as ep:
+        print(f"stand-in endpoint listening on {ep.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
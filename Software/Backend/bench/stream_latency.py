@@ -0,0 +1,127 @@
+"""
+Perceived latency: time from the end of a recording to its prediction, when
+the recording is uploaded to /api/predict after it ends vs streamed to
+/api/predict/stream while it is made. Both go through uvicorn asgi:app
+against the stand-in for the Google speech API and the SageMaker endpoint.
+
+    cd Software/Backend && python -m bench.stream_latency --seconds 30 --latency 0.3
+
+The recording is synthetic "speech" (tone bursts between pauses) sent in
+100 ms frames at real-time pace, ending with --tail seconds of silence, as
+when someone finishes a description and then presses stop.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import httpx
+import numpy as np
+import websockets
+
+from bench.asgi_load import HERE, _create_user, _free_port, _wait_up
+from bench.standin import StandinEndpoint
+
+RATE = 16000
+FRAME = RATE // 10
+
+
+def _recording(seconds: float, tail: float, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    parts, total = [], 0.0
+    while total < seconds - tail:
+        speech, pause = rng.uniform(0.5, 2.0), rng.uniform(0.3, 1.0)
+        t = np.arange(int(speech * RATE)) / RATE
+        parts += [0.3 * np.sin(2 * np.pi * rng.uniform(100, 200) * t), rng.normal(0, 0.001, int(pause * RATE))]
+        total += speech + pause
+    parts.append(np.zeros(int(tail * RATE)))
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+
+def _wav(pcm: bytes) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+async def _session(url: str) -> str:
+    async with httpx.AsyncClient(base_url=url) as client:
+        await client.post("/login", data={"email": "bench@example.com", "password": "bench-password"})
+        return client.cookies["session"]
+
+
+async def _upload(url: str, cookie: str, pcm: bytes) -> float:
+    await asyncio.sleep(len(pcm) / 2 / RATE)  # the recording is made first
+    async with httpx.AsyncClient(base_url=url, cookies={"session": cookie}, timeout=120) as client:
+        t0 = time.perf_counter()
+        r = await client.post("/api/predict", files={"audio": ("bench.wav", _wav(pcm), "audio/wav")})
+        r.raise_for_status()
+        return time.perf_counter() - t0
+
+
+async def _stream(url: str, cookie: str, pcm: bytes) -> float:
+    ws_url = url.replace("http://", "ws://") + "/api/predict/stream"
+    async with websockets.connect(ws_url, additional_headers={"Cookie": f"session={cookie}"}) as ws:
+        start = time.perf_counter()
+        for i, offset in enumerate(range(0, len(pcm), 2 * FRAME)):
+            await ws.send(pcm[offset:offset + 2 * FRAME])
+            await asyncio.sleep(max(0.0, start + (i + 1) * 0.1 - time.perf_counter()))
+        t0 = time.perf_counter()
+        await ws.send(json.dumps({"type": "stop"}))
+        async for message in ws:
+            message = json.loads(message)
+            if message["type"] in ("result", "error"):
+                if message["type"] == "error":
+                    raise RuntimeError(message["error"])
+                return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--seconds", type=float, default=30, help="recording length")
+    ap.add_argument("--tail", type=float, default=1.5, help="silence before the stop, seconds")
+    ap.add_argument("--latency", type=float, default=0.3, help="stand-in delay per remote call, seconds")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    with StandinEndpoint(latency=args.latency) as ep, tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                   ASR_ENGINE="google",
+                   ASR_GOOGLE_ENDPOINT=ep.url + "/speech-api/v2/recognize",
+                   SAGEMAKER_ENDPOINT_URL=ep.url,
+                   RESULT_CACHE_SIZE="0",
+                   AWS_REGION=os.getenv("AWS_REGION", "us-east-1"),
+                   AWS_ACCESS_KEY_ID=os.getenv("AWS_ACCESS_KEY_ID", "bench"),
+                   AWS_SECRET_ACCESS_KEY=os.getenv("AWS_SECRET_ACCESS_KEY", "bench"))
+        _create_user(env)
+        port = _free_port()
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "--port", str(port), "--log-level", "warning",
+                                 "asgi:app"], cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            asyncio.run(_wait_up(url))
+            cookie = asyncio.run(_session(url))
+            print(f"{'mode':<8}{'median ms':>12}{'max ms':>10}   (end of recording -> prediction)")
+            for name, run in (("upload", _upload), ("stream", _stream)):
+                lat = [asyncio.run(run(url, cookie, _recording(args.seconds, args.tail, seed)))
+                       for seed in range(args.runs)]
+                print(f"{name:<8}{statistics.median(lat) * 1000:>12.0f}{max(lat) * 1000:>10.0f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Content-addressed result caches: an in-process LRU tier in front of an
+optional SQLite tier that several worker processes on one host can share.
+Both tiers expire entries after ttl seconds. Values must be JSON-serialisable.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any, Optional, Union
+
+_MISSING = object()
+
+
+def audio_digest(audio: Union[str, IO[bytes]], chunk_size: int = 1 << 20) -> str:
+    """sha256 of a recording given as a path or a seekable file object (rewound afterwards)."""
+    h = hashlib.sha256()
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+    else:
+        audio.seek(0)
+        for chunk in iter(lambda: audio.read(chunk_size), b""):
+            h.update(chunk)
+        audio.seek(0)
+    return h.hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """One table per cache in a SQLite file; one connection per thread and process."""
+
+    def __init__(self, path: str, table: str, ttl: float, sweep_every: int = 500):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         f"(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # never reuse a connection across fork
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute(f"SELECT value FROM {self.table} WHERE key = ? AND expires > ?",
+                                   (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any):
+        conn = self._conn()
+        conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), time.time() + self.ttl))
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            conn.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+
+class TieredCache:
+    """LRU in front of an optional SQLite tier, with hit/miss counters."""
+    _all = []  # every cache, for the lookup metrics
+
+    def __init__(self, name: str, maxsize: int, ttl: float, db_path: Optional[str] = None):
+        self.name = name
+        self.enabled = maxsize > 0 or bool(db_path)
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = SQLiteCache(db_path, name, ttl) if db_path else None
+        self._counts = {"hits_memory": 0, "hits_disk": 0, "misses": 0}
+        self._lock = threading.Lock()
+        TieredCache._all.append(self)
+
+    def _count(self, what: str):
+        with self._lock:
+            self._counts[what] += 1
+
+    def get(self, key: str) -> Any:
+        """The cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count("hits_memory")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                self._count("hits_disk")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = sum(counts.values())
+        counts["hit_rate"] = (counts["hits_memory"] + counts["hits_disk"]) / lookups if lookups else 0.0
+        counts["size"] = len(self.memory)
+        return counts
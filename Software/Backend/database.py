@@ -0,0 +1,96 @@
+"""
+Database engine configuration for DATABASE_URL.
+
+PostgreSQL (production) gets a sized connection pool: DB_POOL_SIZE
+connections kept open per process, up to DB_MAX_OVERFLOW more under load,
+each checked with a round trip before use (pre-ping) and replaced after
+DB_POOL_RECYCLE seconds, so connections the server or a proxy dropped are
+never handed to a request.
+
+SQLite (development and small installs) is set up per connection for
+concurrent requests:
+    journal_mode=WAL     readers no longer block the writer or each other
+    busy_timeout         a writer waits for the lock instead of failing
+                         with "database is locked"
+    synchronous=NORMAL   no fsync per commit; with WAL a power cut can lose
+                         the last commits but never corrupts the file
+Writes still go one at a time (SQLite has one writer), but they no longer
+queue behind reads.
+"""
+import os
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# PostgreSQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # per process; size for the threads that query concurrently
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # extra connections opened under load, closed after
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # wait for a free connection before failing
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; below the server's/proxy's idle timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0: the server's default
+
+# SQLite
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")  # "delete" for SQLite's own default
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal")  # "full" to fsync every commit
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+
+
+def database_url(url: str) -> str:
+    """
+    Accepts the postgres:// scheme many hosts hand out, which SQLAlchemy no
+    longer does, and pins PostgreSQL URLs without a driver to psycopg2 (what
+    requirements.txt installs; SQLAlchemy 2.1 would pick psycopg 3).
+    """
+    for scheme in ("postgres://", "postgresql://"):
+        if url.startswith(scheme):
+            return "postgresql+psycopg2://" + url[len(scheme):]
+    return url
+
+
+def engine_options(url: str) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the given database URL."""
+    backend = make_url(url).get_backend_name()
+    if backend == "postgresql":
+        connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT, "application_name": "neurovoice"}
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "connect_args": connect_args,
+        }
+    if backend == "sqlite":
+        # The sqlite3 module's own lock wait, used before the PRAGMA below runs
+        return {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {}
+
+
+def _sqlite_pragmas(in_memory: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+    return on_connect
+
+
+def init_app(app: Flask, db: SQLAlchemy):
+    """Sets up db's engines; call after SQLAlchemy(app) with engine_options() in the config."""
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _sqlite_pragmas(engine.url.database in (None, "", ":memory:")))
+    if hasattr(os, "register_at_fork"):
+        # Connections opened before a fork (gunicorn --preload) belong to the parent; a forked
+        # worker opens its own and leaves the parent's sockets alone
+        os.register_at_fork(after_in_child=lambda: [engine.dispose(close=False) for engine in engines])
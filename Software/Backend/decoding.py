@@ -0,0 +1,73 @@
+"""
+Audio decoding for uploads: uncompressed WAV/AIFF/FLAC through
+speech_recognition as before, compressed MP3 and Ogg (Vorbis/Opus) through
+libsndfile (soundfile) with a streaming resampler (soxr).
+
+Compressed recordings are decoded block by block straight from the upload
+buffer (no temporary files), downmixed to mono and resampled to 16 kHz
+16-bit PCM as they go, so only the compressed input and the PCM output are
+ever held in memory. The format is sniffed from the first bytes, not taken
+from the file name.
+"""
+from typing import IO, Union
+
+import speech_recognition as sr
+
+COMPRESSED_EXTENSIONS = {"mp3", "ogg", "oga", "opus"}
+TARGET_RATE = 16000  # what the ASR engines and the DEMENTIA features expect
+BLOCK_FRAMES = 64 * 1024
+
+
+def _head(audio: Union[str, IO[bytes]], n: int = 4) -> bytes:
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return f.read(n)
+    audio.seek(0)
+    head = audio.read(n)
+    audio.seek(0)
+    return head
+
+
+def is_compressed(audio: Union[str, IO[bytes]]) -> bool:
+    """True for MP3 (ID3 tag or MPEG frame sync) and Ogg containers."""
+    head = _head(audio)
+    return head[:4] == b"OggS" or head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+
+def decode_compressed(audio: Union[str, IO[bytes]], rate: int = TARGET_RATE) -> "sr.AudioData":
+    """Streams an MP3/Ogg recording into `rate` Hz mono 16-bit sr.AudioData."""
+    try:
+        import numpy as np
+        import soundfile as sf
+        import soxr
+    except ImportError as e:
+        raise ValueError(f"Compressed audio needs soundfile and soxr installed ({e.name} is missing)")
+    if not isinstance(audio, str):
+        audio.seek(0)
+    out = bytearray()
+    try:
+        with sf.SoundFile(audio) as f:
+            resampler = soxr.ResampleStream(f.samplerate, rate, 1, dtype="float32") if f.samplerate != rate else None
+            while True:
+                block = f.read(BLOCK_FRAMES, dtype="float32", always_2d=True)
+                last = len(block) < BLOCK_FRAMES
+                mono = block.mean(axis=1, dtype="float32")
+                if resampler is not None:
+                    mono = resampler.resample_chunk(mono, last=last)
+                out += (np.clip(mono, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+                if last:
+                    break
+    except sf.LibsndfileError as e:
+        raise ValueError(f"Audio file could not be decoded as MP3/Ogg: {e.error_string}")
+    finally:
+        if not isinstance(audio, str):
+            audio.seek(0)
+    return sr.AudioData(bytes(out), rate, 2)
+
+
+def read_audio(audio: Union[str, IO[bytes]]) -> "sr.AudioData":
+    """Decodes a WAV/FLAC/AIFF/MP3/Ogg path or file object into sr.AudioData."""
+    if is_compressed(audio):
+        return decode_compressed(audio)
+    with sr.AudioFile(audio) as source:
+        return sr.Recognizer().record(source)
@@ -0,0 +1,276 @@
+"""
+Inference-time features for the local DEMENTIA model (api.KerasBackend).
+
+Turns one recording plus its transcript into exactly the tensors
+MainCode/models.py trains on:
+    in_a    MFCC-CMVN sequence, (AUDIO_FRAMES, 39)       -- dataset.feat_mfcc
+    mask_a  audio padding mask, (1, AUDIO_FRAMES)
+    in_t    DistilBERT token embeddings, (TEXT_TOKENS, 768) -- dataset.feat_bert
+    in_h    14 standardised handcrafted features          -- dataset.HandcraftedFeatures.get_all_feat
+
+MainCode/dataset.py cannot be imported by the server (it needs the training
+config and loads HanLP at import), so the extraction steps are mirrored
+here for a plain ASR transcript instead of a CHAT (.cha) file. DistilBERT,
+HanLP and NLTK data are loaded once per process; the acoustic (MFCC +
+Praat) branch, the BERT branch and the parsing branch run concurrently.
+
+The handcrafted features are standardised with the StandardScaler fitted
+on the training set: models.py writes it as {"mean": [...14], "scale": [...14]}
+to handcrafted_scaler.json next to DEMENTIA.h5; copy it to
+HANDCRAFTED_SCALER_PATH along with the model.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from decoding import read_audio
+
+AUDIO_FRAMES = int(os.getenv("FEATURE_AUDIO_FRAMES", "7526"))  # frame_len_max in GetFeatures.get_features
+TEXT_TOKENS = 510  # 512 BERT positions minus [CLS]/[SEP]
+BERT_MODEL_NAME = os.getenv("BERT_MODEL_NAME", "distilbert-base-uncased")
+BERT_MODEL_PATH = os.getenv("BERT_MODEL_PATH")  # directory holding BERT_MODEL_NAME; the HF hub if unset
+HANLP_MODEL = os.getenv("HANLP_MODEL", "UD_ONTONOTES_TOK_POS_LEM_FEA_NER_SRL_DEP_SDP_CON_XLMR_BASE")
+NLTK_DATA_PATH = os.getenv("NLTK_DATA_PATH")
+HANDCRAFTED_SCALER_PATH = os.getenv("HANDCRAFTED_SCALER_PATH",
+                                    os.path.join(os.path.dirname(__file__), "models", "handcrafted_scaler.json"))
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", "3"))
+
+# Same lists as HandcraftedFeatures
+EMPTY_WORDS = {'oh', 'uh', '&uh', '=laughs', '&=laughs', 'down', 'well', 'some', 'what', 'fall', 'xxx',
+               'she', 'he', 'him', 'hm', 'it'}
+FUNCTION_TAGS = {'ADV', 'ADP', 'CONJ', 'PRON', 'DET', 'NUM'}
+LEXICAL_TAGS = {'VERB', 'NOUN', 'ADJ'}
+NON_LEXICAL_VERBS = {'is', 'am', 'are', 'was', 'were', "'s", "'m", "'re", 'can', 'cannot', 'could', 'couldn', "'t",
+                     "'d", 'uh', 'um', 'mhm', 'oh'}
+
+
+def load_sound(audio: Union[str, IO[bytes]]):
+    """parselmouth.Sound from a WAV/FLAC/AIFF/MP3/Ogg path or file object, decoded in memory."""
+    import parselmouth
+    if hasattr(audio, "seek"):
+        audio.seek(0)
+    data = read_audio(audio)
+    pcm = np.frombuffer(data.get_raw_data(convert_width=2), dtype="<i2").astype(np.float64) / 32768.0
+    return parselmouth.Sound(pcm, sampling_frequency=data.sample_rate)
+
+
+def fit_length(arr: np.ndarray, frames: int) -> np.ndarray:
+    """Zero-pads or truncates along time, like adjust_len in GetFeatures.get_features."""
+    if arr.shape[0] < frames:
+        return np.vstack([arr, np.zeros((frames - arr.shape[0], arr.shape[1]), dtype=arr.dtype)])
+    return arr[:frames, :]
+
+
+MFCC_ARGS = dict(number_of_coefficients=12, window_length=0.025, time_step=0.01,
+                 firstFilterFreqency=100.0, distance_between_filters=100.0)
+
+
+def mfcc_cmvn(sound) -> np.ndarray:
+    """39-dim CMVN-normalised MFCC (+ deltas), as the second output of dataset.feat_mfcc."""
+    return normalise_mfcc(sound.to_mfcc(**MFCC_ARGS).to_array().T)
+
+
+def normalise_mfcc(mfcc_f: np.ndarray) -> np.ndarray:
+    """(frames, 13) raw Praat MFCCs -> (frames, 39) CMVN MFCCs with first and second deltas."""
+    import librosa
+    from speechpy.processing import cmvn
+    mfcc_f_cmvn = cmvn(mfcc_f, variance_normalization=True)
+    mfcc_delta1_cmvn = librosa.feature.delta(mfcc_f_cmvn)
+    mfcc_delta2_cmvn = librosa.feature.delta(mfcc_f_cmvn, order=2)
+    return np.hstack((mfcc_f_cmvn, mfcc_delta1_cmvn, mfcc_delta2_cmvn)).astype(np.float32)
+
+
+def voicing_segments(sound, sil_thr: float = -25.0, min_sil: float = 0.1,
+                     min_snd: float = 0.1) -> Tuple[List[List[float]], List[List[float]]]:
+    """([start, end] of voiced intervals, [start, end] of silent ones) from Praat's silence TextGrid."""
+    from parselmouth.praat import call
+    tg = call(sound, "To TextGrid (silences)", 100, 0.0, sil_thr, min_sil, min_snd, 'U', 'V')
+    voiced, unvoiced = [], []
+    for i in range(1, call(tg, "Get number of intervals", 1) + 1):
+        seg = [call(tg, "Get start time of interval", 1, i), call(tg, "Get end time of interval", 1, i)]
+        (voiced if call(tg, "Get label of interval", 1, i) == 'V' else unvoiced).append(seg)
+    return voiced, unvoiced
+
+
+def acoustic_features(sound, f0min: int = 75, f0max: int = 600) -> Dict[str, float]:
+    """F0 SD, DPI, voiced rate and hesitation ratio, as in HandcraftedFeatures."""
+    from parselmouth.praat import call
+    total = sound.get_total_duration()
+    pitch = call(sound, "To Pitch", 0.0, f0min, f0max)
+    f0_sd = call(pitch, "Get standard deviation", 0.0, 0.0, "semitones")
+    return {"F0 SD(st)": f0_sd, **pause_features(*voicing_segments(sound), total)}
+
+
+def pause_features(voiced: List[List[float]], unvoiced: List[List[float]], total: float) -> Dict[str, float]:
+    """DPI, voiced rate and hesitation ratio from the voiced/silent intervals of a recording."""
+    pauses = np.array([e - s for s, e in unvoiced]) if unvoiced else np.zeros(0)
+    if not len(unvoiced):
+        hesi_r = 0.0
+    elif not len(voiced):
+        hesi_r = 1.0
+    else:
+        hesi_r = float(np.sum(pauses[pauses > 0.03]) / total)
+    return {
+        "DPI(ms)": float(1000 * np.median(pauses)) if len(pauses) else 0.0,
+        "Voiced Rate(1/s)": len(voiced) / total,
+        "Hesitation Ratio": hesi_r,
+    }
+
+
+def _yngve(tree, parent: int) -> int:
+    if isinstance(tree, str):
+        return parent
+    return sum(_yngve(child, parent + i) for i, child in enumerate(reversed(tree)))
+
+
+def _phrase_rate(con, tag: str, sent_num: int) -> float:
+    phrases = []
+    for child in con:
+        last = ''
+        for subtree in child.subtrees(lambda t: t.label() == tag):
+            if len(subtree.leaves()) > 1 and ''.join(subtree.leaves()) not in last:
+                phrases.append(subtree.leaves())
+            last = ''.join(subtree.leaves())
+    return len(phrases) / sent_num
+
+
+class FeaturePipeline:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._scaler: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Loaded weights stay shared copy-on-write; only locks and threads are per process
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def load(self):
+        """Loads DistilBERT, HanLP, NLTK data and the scaler (once per process)."""
+        with self._lock:
+            if self._loaded:
+                return
+            # Checked before the slow loads below, so a missing file fails warm-up straight away
+            if not os.path.isfile(HANDCRAFTED_SCALER_PATH):
+                raise FileNotFoundError(f"Handcrafted feature scaler not found at {HANDCRAFTED_SCALER_PATH}; "
+                                        "copy handcrafted_scaler.json from the model's training directory "
+                                        "(written by MainCode/models.py) or set HANDCRAFTED_SCALER_PATH.")
+            import hanlp
+            import nltk
+            from transformers import DistilBertTokenizer, TFDistilBertModel, logging
+            logging.set_verbosity_error()
+            if NLTK_DATA_PATH:
+                nltk.data.path.append(NLTK_DATA_PATH)
+            source = os.path.join(BERT_MODEL_PATH, BERT_MODEL_NAME) if BERT_MODEL_PATH else BERT_MODEL_NAME
+            self.tokenizer = DistilBertTokenizer.from_pretrained(source)
+            self.bert = TFDistilBertModel.from_pretrained(source)
+            # devices=-1: CPU only, as in dataset.py
+            self.hanlp = hanlp.pipeline().append(hanlp.utils.rules.split_sentence, output_key='sentences') \
+                .append(hanlp.load(getattr(hanlp.pretrained.mtl, HANLP_MODEL), devices=-1), output_key='xlm')
+            with open(HANDCRAFTED_SCALER_PATH) as f:
+                scaler = json.load(f)
+            self._scaler = (np.asarray(scaler["mean"], dtype=np.float32), np.asarray(scaler["scale"], dtype=np.float32))
+            self._loaded = True
+
+    def __call__(self, model_input) -> Dict[str, np.ndarray]:
+        """api.ModelInput -> {"in_a", "mask_a", "in_t", "in_h"}."""
+        return self.extract(model_input.audio, model_input.transcript, model_input.acoustics)
+
+    def warm_up(self):
+        self.load()
+        normalise_mfcc(np.random.default_rng(0).standard_normal((100, 13)))  # imports librosa and speechpy
+        self.text_embedding("the boy is on the stool")
+        self.linguistic_features("the boy is on the stool", 2.0)
+
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=FEATURE_WORKERS, thread_name_prefix="features")
+            return self._pool
+
+    def text_embedding(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(TEXT_TOKENS, 768) token embeddings and their attention mask, as dataset.feat_bert."""
+        enc = self.tokenizer([text], max_length=TEXT_TOKENS + 2, padding='max_length', truncation=True,
+                             return_tensors='tf')
+        hidden = self.bert(enc)[0]
+        return hidden[0, 1:-1, :].numpy(), enc['attention_mask'][0, 1:-1].numpy()
+
+    def linguistic_features(self, text: str, total_duration: float) -> Dict[str, float]:
+        """The ten transcript-based HandcraftedFeatures, for an ASR transcript."""
+        import nltk
+        tokens = nltk.word_tokenize(text)
+        words = [t for t in tokens if any(c.isalnum() for c in t)]
+        n_words = max(len(words), 1)
+        tagged = nltk.pos_tag(tokens, tagset='universal')
+        doc = self.hanlp(text)['xlm']
+        con, dep = doc['con'], doc['dep']
+        sent_num = max(len(con), 1)
+        trees = [c for c in con if c.label() != 'PU']
+        sen_dep = []
+        for i_dep in dep:
+            sen_dep.append(sum(abs(i_dep.index(j) + 1 - j[0]) for j in i_dep if j[0] != 0))
+        return {
+            "Empty Word Freq": sum(1 for w in text.split(' ') if w in EMPTY_WORDS),
+            "Word Rate(-/s)": len(words) / total_duration,
+            "Function Word Ratio": sum(1 for _, tag in tagged if tag in FUNCTION_TAGS) / n_words,
+            "Lexical Density": sum(1 for w, tag in tagged if tag in LEXICAL_TAGS and w.lower() not in NON_LEXICAL_VERBS)
+                               / n_words,
+            "MLU": len(words) / sent_num,
+            "Noun Phrase Rate": _phrase_rate(con, 'NP', sent_num),
+            "Verb Phrase Rate": _phrase_rate(con, 'VP', sent_num),
+            "Parse Tree Height": float(np.mean([t.height() for t in trees])) if trees else 0.0,
+            "Yngve Depth Total": float(sum(_yngve(t, 0) / len(t.leaves()) for t in trees)),
+            "Dependency Distance Total": float(np.mean(sen_dep)) if sen_dep else 0.0,
+        }
+
+    def extract(self, audio: Union[str, IO[bytes]], transcript: str,
+                acoustics: Optional[dict] = None) -> Dict[str, np.ndarray]:
+        """
+        The model inputs (without batch dimension) for one recording.
+        `acoustics` ({"mfcc", "features", "duration"}, from
+        streaming.StreamAnalyzer.acoustics()) replaces the audio branch.
+        """
+        self.load()
+        pool = self.pool()
+        if acoustics is None:
+            sound = load_sound(audio)
+            duration = sound.get_total_duration()
+        else:
+            duration = acoustics["duration"]
+        f_text = pool.submit(self.text_embedding, transcript)
+        f_ling = pool.submit(self.linguistic_features, transcript, duration)
+        if acoustics is None:
+            f_mfcc = pool.submit(mfcc_cmvn, sound)
+            acoustic = acoustic_features(sound)  # Praat analysis on this thread, alongside the others
+            mfcc = f_mfcc.result()
+        else:
+            mfcc, acoustic = acoustics["mfcc"], acoustics["features"]
+
+        mfcc = fit_length(mfcc, AUDIO_FRAMES)
+        mask_a = (mfcc[:, 0] != 0).astype(np.float32)  # zero padding is masked, as in DementiaDetectionModel
+        emb, _ = f_text.result()
+        feats = dict(acoustic, **f_ling.result())
+        hand = np.array([feats[k] for k in HANDCRAFTED_ORDER], dtype=np.float32)
+        mean, scale = self._scaler
+        return {
+            "in_a": mfcc,
+            "mask_a": mask_a[np.newaxis, :],
+            "in_t": emb.astype(np.float32),
+            "in_h": (hand - mean) / scale,
+        }
+
+
+# Column order of HandcraftedFeatures.get_all_feat
+HANDCRAFTED_ORDER = ["F0 SD(st)", "DPI(ms)", "Voiced Rate(1/s)", "Hesitation Ratio", "Empty Word Freq",
+                     "Word Rate(-/s)", "Function Word Ratio", "Lexical Density", "MLU", "Noun Phrase Rate",
+                     "Verb Phrase Rate", "Parse Tree Height", "Yngve Depth Total", "Dependency Distance Total"]
+
+# The api.KerasBackend featurizer (LOCAL_MODEL_FEATURIZER=features:pipeline)
+pipeline = FeaturePipeline()
@@ -0,0 +1,34 @@
+# gunicorn -c gunicorn.conf.py main:app
+#
+# With PRELOAD_MODELS=1 the app (and the model weights, see preload_models)
+# is imported once in the master; workers are forked from it and share the
+# weights copy-on-write instead of each loading their own copy. Every worker
+# then runs one warm-up pass in the background and reports readiness on
+# GET /api/ready, so a load balancer only routes to warm workers.
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:6350")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("PRELOAD_MODELS", "0") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        # Move everything loaded so far out of the collector's generations:
+        # gc passes in the workers would otherwise touch (and so copy) every
+        # shared page holding a refcounted object header
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Inference runs per worker, after the fork: TensorFlow/Vosk thread
+    # pools started in the master do not survive fork()
+    from api import start_warm_up
+    start_warm_up()
+    # Likewise the mail sender (it also picks up mail spooled before a restart)
+    # and the OTP sweeper threads
+    from main import start_background
+    start_background()
@@ -0,0 +1,99 @@
+"""
+Background jobs: a bounded worker pool plus an in-memory job table.
+
+A job runs a view-like function returning (body, http_status); clients poll
+the job until it is "done" or "failed". Finished jobs are dropped after ttl
+seconds. State is per process, so pollers must reach the worker that took
+the job (sticky sessions or a single worker process).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already queued or running."""
+
+
+class Job:
+    def __init__(self, owner: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result: Optional[dict] = None
+        self.http_status: Optional[int] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        out = {"job_id": self.id, "status": self.status, "created_at": self.created_at}
+        if self.finished_at is not None:
+            out["finished_at"] = self.finished_at
+            out["http_status"] = self.http_status
+            if self.status == "done":
+                out["result"] = self.result
+            else:
+                out["error"] = self.result.get("error")
+        return out
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_pending: int, ttl: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Worker threads do not survive a fork; start over in the child
+        self._jobs, self._pending = {}, 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, fn: Callable[..., Tuple[dict, int]], *args: Any, owner: Optional[str] = None) -> Job:
+        with self._lock:
+            self._evict()
+            if self._pending >= self.max_pending:
+                raise QueueFull()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="predict-job")
+            job = Job(owner)
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "jobs": len(self._jobs), "workers": self.workers}
+
+    def _run(self, job: Job, fn: Callable[..., Tuple[dict, int]], args: tuple):
+        job.status = "running"
+        try:
+            body, status = fn(*args)
+        except Exception:
+            body, status = {"error": "Internal error"}, 500
+        job.result, job.http_status = body, status
+        job.finished_at = time.time()
+        job.status = "done" if status < 400 else "failed"
+        with self._lock:
+            self._pending -= 1
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        expired = [jid for jid, j in self._jobs.items() if j.finished_at is not None and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
@@ -0,0 +1,261 @@
+"""
+Outbound mail queue. A request only spools the message to disk and
+returns; a background sender thread delivers it over SMTP.
+
+The spool is a maildir-like directory:
+    new/     waiting; files are named <not before, ms>-<id>.json
+    cur/     being sent. Renaming new/ -> cur/ is the claim, so the worker
+             processes of a host can share one spool
+    failed/  given up on after max_attempts; deleted after failed_ttl
+A message stays on disk until the SMTP server has accepted it, so pending
+mail survives restarts. Claims older than claim_timeout (a sender that died
+mid-send) go back to new/. The sender keeps one SMTP connection open while
+there is mail and for `keepalive` seconds after. A message that fails is
+retried later with capped exponential backoff and full jitter; the others
+keep going. A message queued with a ttl (a one-time code, say) is never
+sent after it expires: it is deleted instead, and if it is given up on, its
+body is not kept in failed/.
+"""
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from typing import Optional
+
+from flask import Flask
+from flask_mail import Connection, Mail, Message
+
+from metrics import callback, counter, histogram
+
+SENT = counter("neurovoice_mail_sent_total", "Emails accepted by the SMTP server.")
+FAILURES = counter("neurovoice_mail_failures_total", "Failed send attempts, by outcome (retry, gave_up, expired).",
+                   ["outcome"])
+SEND_SECONDS = histogram("neurovoice_mail_send_seconds", "SMTP time per email, connecting included when it did.",
+                         buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+DELIVERY_SECONDS = histogram("neurovoice_mail_delivery_seconds", "Time from queueing an email to its delivery.",
+                             buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0, 3600.0))
+
+
+class _TimeoutConnection(Connection):
+    """flask_mail.Connection whose SMTP socket has a timeout."""
+
+    def __init__(self, mail, timeout: float):
+        super().__init__(mail)
+        self.timeout = timeout
+
+    def configure_host(self):
+        cls = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = cls(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+class MailQueue:
+    _all = []
+
+    def __init__(self, app: Flask, mail: Mail, root: str, timeout: float = 30.0, max_attempts: int = 8,
+                 retry_base: float = 5.0, retry_cap: float = 60.0, keepalive: float = 30.0,
+                 claim_timeout: float = 300.0, poll: float = 5.0, failed_ttl: float = 7 * 86400.0):
+        self.app = app
+        self.mail = mail
+        self.root = root
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.keepalive = keepalive
+        self.claim_timeout = claim_timeout
+        self.poll = poll  # how often to look for mail queued by other processes and retries
+        self.failed_ttl = failed_ttl
+        for d in ("tmp", "new", "cur", "failed"):
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+        MailQueue._all.append(self)
+
+    def _reset(self):
+        # The sender thread does not survive a fork; start() again in the child
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, to: str, subject: str, body: str, sender=None, ttl: Optional[float] = None) -> str:
+        """
+        Spools one plain-text email and returns its id; it is sent in the
+        background. With a ttl it is deleted if not sent within ttl seconds.
+        """
+        msg_id = uuid.uuid4().hex
+        now = time.time()
+        message = {"id": msg_id, "to": to, "subject": subject, "body": body, "sender": sender,
+                   "queued_at": now, "expires_at": None if ttl is None else now + ttl,
+                   "attempts": 0, "last_error": None}
+        self._write(message, time.time())
+        self.start()
+        self._wakeup.set()
+        return msg_id
+
+    def start(self):
+        """Starts this process's sender thread, if not running; it also delivers mail left from before a restart."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+
+    def depth(self) -> dict:
+        return {state: len(os.listdir(os.path.join(self.root, state))) for state in ("new", "cur", "failed")}
+
+    # --- Sender ---
+    def _run(self):
+        conn = None
+        last_sent = time.monotonic()
+        last_recovered = 0.0
+        while True:
+            if time.monotonic() - last_recovered >= self.poll:
+                self._recover()
+                last_recovered = time.monotonic()
+            claimed = self._claim()
+            if claimed is None:
+                idle = time.monotonic() - last_sent
+                if conn is not None and idle >= self.keepalive:
+                    conn = self._close(conn)
+                timeout = self.poll
+                due = self._next_due()
+                if due is not None:
+                    timeout = min(timeout, max(0.0, due - time.time()))
+                if conn is not None:
+                    timeout = min(timeout, self.keepalive - idle)
+                self._wakeup.wait(max(timeout, 0.01))
+                self._wakeup.clear()
+                continue
+
+            path, message = claimed
+            if self._expired(message, time.time()):
+                self._expire(message)
+                os.unlink(path)
+                continue
+            t0 = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    if conn is None:
+                        conn = _TimeoutConnection(self.mail, self.timeout).__enter__()
+                    conn.send(self._message(message))
+            except Exception as e:
+                conn = self._close(conn)  # in an unknown state after an error
+                self._failed(path, message, e)
+            else:
+                SEND_SECONDS.observe(time.perf_counter() - t0)
+                DELIVERY_SECONDS.observe(time.time() - message["queued_at"])
+                SENT.inc()
+                os.unlink(path)
+                print(f"[EMAIL SENT] To: {message['to']}")
+            last_sent = time.monotonic()
+
+    def _message(self, message: dict) -> Message:
+        sender = message["sender"]
+        return Message(sender=tuple(sender) if isinstance(sender, list) else sender, subject=message["subject"],
+                       recipients=[message["to"]], body=message["body"])
+
+    def _close(self, conn) -> None:
+        if conn is not None and conn.host is not None:
+            try:
+                conn.host.quit()
+            except Exception:
+                pass
+        return None
+
+    def _expired(self, message: dict, at: float) -> bool:
+        expires_at = message.get("expires_at")  # not in messages spooled before ttls existed
+        return expires_at is not None and at >= expires_at
+
+    def _expire(self, message: dict):
+        # Not kept in failed/: the body is a one-time code, useless to anyone but an attacker now
+        FAILURES.inc(outcome="expired")
+        print(f"[EMAIL ERROR] Dropping expired email to {message['to']} after {message['attempts']} attempts")
+
+    def _failed(self, path: str, message: dict, error: Exception):
+        message["attempts"] += 1
+        message["last_error"] = repr(error)
+        delay = random.uniform(0, min(self.retry_cap, self.retry_base * 2 ** (message["attempts"] - 1)))
+        if message["attempts"] >= self.max_attempts:
+            FAILURES.inc(outcome="gave_up")
+            if message.get("expires_at") is not None:
+                message["body"] = None  # a one-time code; see _expire()
+            self._write(message, time.time(), state="failed")
+            print(f"[EMAIL ERROR] Giving up on {message['to']} after {message['attempts']} attempts: {error!r}")
+        elif self._expired(message, time.time() + delay):
+            self._expire(message)  # the retry would come too late
+        else:
+            FAILURES.inc(outcome="retry")
+            self._write(message, time.time() + delay)
+            print(f"[EMAIL ERROR] {error!r}; retrying in {delay:.0f}s")
+        os.unlink(path)
+
+    # --- Spool ---
+    def _write(self, message: dict, not_before: float, state: str = "new"):
+        name = f"{int(not_before * 1000):015d}-{message['id']}.json"
+        tmp = os.path.join(self.root, "tmp", name)
+        with open(tmp, "w") as f:
+            json.dump(message, f)
+        os.replace(tmp, os.path.join(self.root, state, name))
+
+    def _waiting(self):
+        return sorted(os.listdir(os.path.join(self.root, "new")))
+
+    def _next_due(self) -> Optional[float]:
+        waiting = self._waiting()
+        return int(waiting[0].split("-", 1)[0]) / 1000 if waiting else None
+
+    def _claim(self) -> Optional[tuple]:
+        """Moves the first due message to cur/; (path, message), or None when nothing is due."""
+        now_ms = time.time() * 1000
+        for name in self._waiting():
+            if int(name.split("-", 1)[0]) > now_ms:
+                return None
+            path = os.path.join(self.root, "cur", name)
+            try:
+                os.rename(os.path.join(self.root, "new", name), path)
+                os.utime(path)  # claim time, for _recover()
+                with open(path) as f:
+                    return path, json.load(f)
+            except FileNotFoundError:
+                continue  # another process claimed it
+        return None
+
+    def _recover(self):
+        """Puts claims abandoned by a crashed sender back in new/, and deletes failed/ mail older than failed_ttl."""
+        cur = os.path.join(self.root, "cur")
+        cutoff = time.time() - self.claim_timeout
+        for name in os.listdir(cur):
+            try:
+                if os.path.getmtime(os.path.join(cur, name)) < cutoff:
+                    os.rename(os.path.join(cur, name), os.path.join(self.root, "new", name))
+            except FileNotFoundError:
+                pass
+        failed = os.path.join(self.root, "failed")
+        cutoff = time.time() - self.failed_ttl
+        for name in os.listdir(failed):
+            try:
+                if os.path.getmtime(os.path.join(failed, name)) < cutoff:
+                    os.unlink(os.path.join(failed, name))
+            except FileNotFoundError:
+                pass  # another process's sender got there first
+
+
+def _depth():
+    out = {}
+    for queue in MailQueue._all:
+        for state, n in queue.depth().items():
+            out[(state,)] = out.get((state,), 0) + n
+    return out
+
+
+callback("neurovoice_mail_queue_depth", "Spooled emails by state (new = waiting, cur = being sent, failed).",
+         "gauge", ["state"], _depth)
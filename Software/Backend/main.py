@@ -1,29 +1,48 @@
-from api import api
+from api import api, UploadRequest, preload_models, start_warm_up, prediction_listeners, MODEL_VERSION
+from admission import Overloaded
+from cache import TieredCache
+from mailer import MailQueue
+from sweeper import BatchSweeper
+from writebehind import WriteBehindBuffer
+import database
+import metrics
+import passwords
 from flask_migrate import Migrate
 from datetime import datetime, timedelta
 import os, secrets, re
+from typing import Optional
 from email_validator import validate_email, EmailNotValidError
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, or_
 from dotenv import load_dotenv
-from flask_mail import Mail, Message
+from flask_mail import Mail
 
 load_dotenv()
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.register_blueprint(api)
     app.config["MAX_CONTENT_LENGTH"] = 30 * 1024 * 1024  # 30MB cap
+    metrics.init_app(app)
     return app
 
 app = create_app()
 
+# PRELOAD_MODELS=1 loads model weights at import; under gunicorn --preload that
+# happens once in the master and workers inherit them (see gunicorn.conf.py)
+if os.getenv("PRELOAD_MODELS", "0") == "1":
+    preload_models()
+
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret-change-me")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv('DATABASE_URL', 'sqlite:///test.db')
+app.config["SQLALCHEMY_DATABASE_URI"] = database.database_url(os.getenv('DATABASE_URL', 'sqlite:///test.db'))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Connection pool for PostgreSQL, WAL and a busy timeout for SQLite (see database.py)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = database.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 db = SQLAlchemy(app)
+database.init_app(app, db)
 migrate = Migrate(app, db)
 
 app.config["MAIL_SERVER"] = "smtp.gmail.com"
@@ -35,9 +54,31 @@ app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", app.co
 
 mail = Mail(app)
 
+# Password reset codes are valid this long; their email is not sent any later
+OTP_LIFETIME = timedelta(minutes=10)
+
+# Emails are spooled and sent by a background thread (see mailer.py), not inside the request
+mail_queue = MailQueue(
+    app, mail,
+    root=os.getenv("MAIL_SPOOL_DIR", os.path.join(os.path.dirname(__file__), "instance", "mail")),
+    timeout=float(os.getenv("MAIL_TIMEOUT_SECONDS", "30")),
+    max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", "8")),
+    retry_base=float(os.getenv("MAIL_RETRY_BASE_SECONDS", "5")),
+    # With the defaults all 8 attempts (timeouts included) fit in OTP_LIFETIME
+    retry_cap=float(os.getenv("MAIL_RETRY_CAP_SECONDS", "60")),
+    keepalive=float(os.getenv("MAIL_KEEPALIVE_SECONDS", "30")),  # keep the SMTP connection this long when idle
+    failed_ttl=float(os.getenv("MAIL_FAILED_TTL_SECONDS", str(7 * 86400))),  # undeliverable mail is kept this long
+)
+
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
+# load_user() runs on every authenticated request; profiles are cached per process.
+# A change made through another worker shows up here within USER_CACHE_TTL seconds.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))  # 0 disables
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+user_cache = TieredCache("users", USER_CACHE_SIZE, USER_CACHE_TTL)
+
 # ---------- Models ----------
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -49,11 +90,12 @@ class User(db.Model, UserMixin):
     age = db.Column(db.Integer)
     mmse_score = db.Column(db.Integer)
 
+    # Hashing runs on passwords.py's bounded pool; both may raise Overloaded
     def set_password(self, pw):
-        self.password_hash = generate_password_hash(pw)
+        self.password_hash = passwords.hash_password(pw)
 
     def check_password(self, pw):
-        return check_password_hash(self.password_hash, pw)
+        return passwords.verify_password(self.password_hash, pw)
 
 class OTPCode(db.Model):
     """Stores one-time codes for actions like password reset."""
@@ -66,22 +108,124 @@ class OTPCode(db.Model):
 
     user = db.relationship("User", backref="otps")
 
+    __table_args__ = (
+        # verify_code looks codes up by all four columns, reset deletes by the first three
+        db.Index("ix_otp_code_lookup", "user_id", "purpose", "used", "code"),
+        # the sweeper deletes used codes, then unused expired ones
+        db.Index("ix_otp_code_sweep", "used", "expires_at"),
+    )
+
+# Used and expired codes are deleted in the background (see sweeper.py)
+otp_sweeper = BatchSweeper(
+    app, db, OTPCode,
+    conditions=lambda: [OTPCode.used == True, (OTPCode.used == False) & (OTPCode.expires_at < datetime.utcnow())],
+    interval=float(os.getenv("OTP_SWEEP_INTERVAL_SECONDS", "300")),  # 0 disables
+    batch=int(os.getenv("OTP_SWEEP_BATCH", "1000")),
+)
+
+class Prediction(db.Model):
+    """One prediction served to a user: what went in, what came out and which model said it."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    transcript = db.Column(db.Text, nullable=False)
+    sex = db.Column(db.Integer)
+    age = db.Column(db.Integer)
+    mmse = db.Column(db.Integer)
+    label = db.Column(db.String(64), nullable=False)  # e.g., "Likely Dementia"
+    confidence = db.Column(db.Float)
+    model_version = db.Column(db.String(255), nullable=False)  # MODEL_VERSION, else the endpoint/model path
+    backend = db.Column(db.String(32))  # the backend that answered, e.g., "local" after a fallback
+
+    user = db.relationship("User", backref=db.backref("predictions", lazy="dynamic"))
+
+    # the history page: one user's predictions, newest first
+    __table_args__ = (db.Index("ix_prediction_user_created", "user_id", "created_at", "id"),)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() + "Z",
+            "inputs": {"sex": self.sex, "age": self.age, "mmse": self.mmse},
+            "transcript": self.transcript,
+            "prediction": self.label,
+            "confidence": self.confidence,
+            "model_version": self.model_version,
+            "backend": self.backend,
+        }
+
+# Predictions served are recorded by a background writer (see writebehind.py), never on the
+# response path; they show up in /api/predictions within PREDICTION_HISTORY_FLUSH_SECONDS
+PREDICTION_HISTORY = os.getenv("PREDICTION_HISTORY", "1") == "1"
+prediction_history = WriteBehindBuffer(
+    app, db, Prediction,
+    interval=float(os.getenv("PREDICTION_HISTORY_FLUSH_SECONDS", "1")),
+    batch=int(os.getenv("PREDICTION_HISTORY_BATCH", "500")),  # rows per INSERT
+    max_pending=int(os.getenv("PREDICTION_HISTORY_MAX_PENDING", "10000")),  # oldest dropped beyond this
+)
+
+def record_prediction(user_id, body: dict):
+    if user_id is None:
+        return
+    prediction_history.add(
+        user_id=int(user_id),
+        created_at=datetime.utcnow(),
+        transcript=body["transcript"],
+        sex=body["inputs"]["sex"],
+        age=body["inputs"]["age"],
+        mmse=body["inputs"]["mmse"],
+        label=body["prediction"],
+        confidence=body["confidence"],
+        model_version=MODEL_VERSION or body["endpoint"],
+        backend=body["backend"],
+    )
+
+if PREDICTION_HISTORY:
+    prediction_listeners.append(record_prediction)
+
+class SessionUser(UserMixin):
+    """
+    current_user after login: a cached copy of the User fields requests
+    read. It is not attached to the database session; query User to change
+    anything.
+    """
+    FIELDS = ("id", "username", "email", "sex", "age", "mmse_score")
+
+    def __init__(self, fields: dict):
+        self.__dict__.update(fields)
+
 # ---------- Auth plumbing ----------
 @login_manager.user_loader
 def load_user(uid):
-    return User.query.get(int(uid))
-
-
-def send_email(to_email: str, subject: str, body: str):
+    key = str(int(uid))
+    fields = user_cache.get(key)
+    if fields is None:
+        user = User.query.get(int(uid))
+        if user is None:
+            return None
+        fields = {f: getattr(user, f) for f in SessionUser.FIELDS}
+        user_cache.set(key, fields)
+    return SessionUser(fields)
+
+def forget_user(uid):
+    """Drops a user's cached profile; call after changing the user's row."""
+    user_cache.delete(str(int(uid)))
+
+
+def send_email(to_email: str, subject: str, body: str, ttl: Optional[timedelta] = None):
     """
-    Sends an email via the configured SMTP server.
+    Queues an email for the configured SMTP server and returns at once;
+    mail_queue sends it in the background and retries if that fails, for
+    at most `ttl` if given (mail that is useless later, like a code).
     """
-    try:
-        msg = Message(sender=('NeuroVoice', f'{app.config["MAIL_DEFAULT_SENDER"]}'), subject=subject, recipients=[to_email], body=body)
-        mail.send(msg)
-        print(f"[EMAIL SENT] To: {to_email}")
-    except Exception as e:
-        print(f"[EMAIL ERROR] {e}")
+    mail_queue.enqueue(to_email, subject, body, sender=('NeuroVoice', f'{app.config["MAIL_DEFAULT_SENDER"]}'),
+                       ttl=None if ttl is None else ttl.total_seconds())
+
+
+def start_background():
+    """Starts this process's mail sender and OTP sweeper threads; call again in a forked worker."""
+    mail_queue.start()
+    otp_sweeper.start()
 
 
 def valid_password(pw: str) -> bool:
@@ -91,6 +235,15 @@ def generate_numeric_code(n=6) -> str:
     return "".join(secrets.choice("0123456789") for _ in range(n))
 
 # ---------- Routes ----------
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Password hashing is saturated (see passwords.py): back to the form, to retry in a moment."""
+    headers = {"Retry-After": str(e.retry_after)}
+    if request.blueprint == "api":
+        return jsonify({"error": str(e)}), 429, headers
+    flash(f"The server is busy, please try again in {e.retry_after}s.", "warning")
+    return redirect(request.path), 303, headers
+
 @app.route("/")
 def index():
     return render_template("LandingPage.html")
@@ -138,6 +291,7 @@ def register():
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
+        forget_user(user.id)  # SQLite may hand out the id of a deleted user again
         flash("Registered! You can now log in.", "success")
         return redirect(url_for("login"))
 
@@ -152,6 +306,10 @@ def login():
         if not user or not user.check_password(password):
             flash("Invalid credentials.", "danger")
             return redirect(url_for("login"))
+        if passwords.needs_rehash(user.password_hash):
+            # PASSWORD_HASH_METHOD changed since this hash was made; we have the password now
+            user.set_password(password)
+            db.session.commit()
         login_user(user)
         flash("Logged in!", "success")
         return redirect(url_for("inputPage"))
@@ -192,7 +350,7 @@ def reset():
             user_id=user.id,
             code=code,
             purpose="reset",
-            expires_at=datetime.utcnow() + timedelta(minutes=10)
+            expires_at=datetime.utcnow() + OTP_LIFETIME
         )
         db.session.add(otp)
         db.session.commit()
@@ -200,7 +358,8 @@ def reset():
         send_email(
             to_email=user.email,
             subject="Your password reset code",
-            body=f"Use this code to reset your password: {code}\nIt expires in 10 minutes."
+            body=f"Use this code to reset your password: {code}\nIt expires in 10 minutes.",
+            ttl=OTP_LIFETIME,
         )
 
         # store the email in session to link the flow
@@ -270,6 +429,7 @@ def set_new_password():
 
         user.set_password(pw1)
         db.session.commit()
+        forget_user(user.id)
         # Clear session flags
         session.pop("reset_allowed_for_user_id", None)
         session.pop("reset_email", None)
@@ -287,6 +447,40 @@ def inputPage():
     return redirect(url_for('login'))
 
 
+@app.route("/api/predictions", methods=["GET"])
+def prediction_history_page():
+    """
+    The logged-in user's past predictions, newest first, from the database.
+    ?limit= (1-100, default 20) per page; pass the response's next_cursor
+    as ?cursor= for the next page (null on the last one).
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required."}), 401
+    try:
+        limit = min(max(int(request.args.get("limit", "20")), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer."}), 400
+
+    query = Prediction.query.filter(Prediction.user_id == current_user.id)
+    cursor = request.args.get("cursor")
+    if cursor:
+        # Keyset pagination: rows after (created_at, id) of the previous page's last row
+        try:
+            at, last_id = cursor.split(".")
+            at, last_id = datetime.strptime(at, "%Y%m%d%H%M%S%f"), int(last_id)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor."}), 400
+        query = query.filter(or_(Prediction.created_at < at,
+                                 and_(Prediction.created_at == at, Prediction.id < last_id)))
+    rows = query.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].created_at:%Y%m%d%H%M%S%f}.{rows[-1].id}"
+    return jsonify({"ok": True, "predictions": [row.to_dict() for row in rows], "next_cursor": next_cursor}), 200
+
+
 # ---------- CLI helper ----------
 @app.cli.command("init-db")
 def init_db():
@@ -294,7 +488,14 @@ def init_db():
     db.create_all()
     print("DB initialized.")
 
+@app.cli.command("sweep-otps")
+def sweep_otps():
+    """flask sweep-otps: delete used and expired codes now"""
+    print(f"Deleted {otp_sweeper.sweep()} codes.")
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+    start_warm_up()
+    start_background()
     app.run(debug=True, port=6350)
@@ -0,0 +1,250 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms live in a process-wide registry and are
+served on /metrics by init_app(). `stage()` times one step of a request
+(histogram + in-flight gauge + error counter) and, inside a request, also
+records the timing in the per-request summary that is logged when the
+request ends (on the "neurovoice.stages" logger, to stderr at
+STAGE_LOG_LEVEL) and sent back as a Server-Timing header. Under a multi-process server every worker keeps its own
+numbers, so scrape each worker (or run one process per container).
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, g, has_request_context, request
+
+STAGE_LOG_LEVEL = os.getenv("STAGE_LOG_LEVEL", "INFO").upper()  # WARNING turns the per-request summary off
+
+# Its own handler and level: nothing configures the root logger, whose WARNING default would drop these
+stage_log = logging.getLogger("neurovoice.stages")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, tuple, tuple, float]]:
+        """(suffix, label values, extra label pairs, value) tuples."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", key, (), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key, extra)} {_fmt(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _fmt(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), n
+
+
+class CallbackMetric(Metric):
+    """Values computed at scrape time, e.g. from a component's stats()."""
+
+    def __init__(self, name: str, help: str, type: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        for key, value in self.fn().items():
+            yield "", tuple(str(k) for k in key), (), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def callback(name: str, help: str, type: str, labelnames: Sequence[str],
+             fn: Callable[[], Dict[tuple, float]]) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric(name, help, type, labelnames, fn))
+
+
+STAGE_SECONDS = histogram("neurovoice_stage_seconds", "Time spent in each prediction stage.", ["stage"])
+STAGE_IN_FLIGHT = gauge("neurovoice_stage_in_flight", "Prediction stages currently running.", ["stage"])
+STAGE_ERRORS = counter("neurovoice_stage_errors_total", "Prediction stages that raised.", ["stage"])
+HTTP_SECONDS = histogram("neurovoice_http_request_seconds", "HTTP request latency.", ["endpoint", "status"])
+HTTP_IN_FLIGHT = gauge("neurovoice_http_requests_in_flight", "HTTP requests being served.")
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as prediction stage `name`."""
+    STAGE_IN_FLIGHT.inc(stage=name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_IN_FLIGHT.dec(stage=name)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if has_request_context():
+            timings = g.setdefault("stage_timings", [])
+            timings.append((name, elapsed))
+
+
+def stage_summary() -> Optional[str]:
+    """'upload=3.1ms transcribe=812.0ms ...' for the current request, or None."""
+    timings = g.get("stage_timings")
+    if not timings:
+        return None
+    return " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in timings)
+
+
+def init_app(app: Flask, path: str = "/metrics"):
+    """Adds request timing hooks, per-request stage logging and the /metrics endpoint."""
+    if not stage_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(asctime)s] [%(process)d] [STAGES] %(message)s"))
+        stage_log.addHandler(handler)
+        stage_log.setLevel(STAGE_LOG_LEVEL)
+        stage_log.propagate = False
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.teardown_request
+    def _stop_timer(exc=None):
+        started = g.pop("request_started", None)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - started
+        status = g.pop("response_status", 500)
+        HTTP_SECONDS.observe(elapsed, endpoint=request.endpoint or "unknown", status=status)
+        summary = stage_summary()
+        if summary:
+            stage_log.info("%s %s %s %.1fms %s", request.method, request.path, status, elapsed * 1000, summary)
+
+    @app.after_request
+    def _record_status(response):
+        g.response_status = response.status_code
+        timings = g.get("stage_timings")
+        if timings and not response.is_streamed:
+            response.headers["Server-Timing"] = ", ".join(f"{name};dur={elapsed * 1000:.1f}"
+                                                          for name, elapsed in timings)
+        return response
+
+    @app.route(path)
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,59 @@
+"""initial schema
+
+The tables as `flask init-db` (db.create_all) has been creating them. A
+database made that way already has them, so this revision only creates
+what is missing and `flask db upgrade` can be run on it directly.
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-16 20:32:30.716148
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'user' not in tables:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sex', sa.String(length=1), nullable=True),
+        sa.Column('age', sa.Integer(), nullable=True),
+        sa.Column('mmse_score', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+        )
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_user_email'), ['email'], unique=True)
+
+    if 'otp_code' not in tables:
+        op.create_table('otp_code',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=12), nullable=False),
+        sa.Column('purpose', sa.String(length=32), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('used', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('otp_code')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_email'))
+
+    op.drop_table('user')
@@ -0,0 +1,36 @@
+"""otp_code indexes
+
+ix_otp_code_lookup serves verify_code (user_id, purpose, used, code) and,
+through its prefix, the delete of a user's unused codes in reset.
+ix_otp_code_sweep serves the background sweeper (used, then used and
+expires_at). Skipped where `flask init-db` already created them.
+
+Revision ID: 8b6e0d4c5a21
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-16 20:41:07.412395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b6e0d4c5a21'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('otp_code')}
+    with op.batch_alter_table('otp_code', schema=None) as batch_op:
+        if 'ix_otp_code_lookup' not in existing:
+            batch_op.create_index('ix_otp_code_lookup', ['user_id', 'purpose', 'used', 'code'], unique=False)
+        if 'ix_otp_code_sweep' not in existing:
+            batch_op.create_index('ix_otp_code_sweep', ['used', 'expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('otp_code', schema=None) as batch_op:
+        batch_op.drop_index('ix_otp_code_sweep')
+        batch_op.drop_index('ix_otp_code_lookup')
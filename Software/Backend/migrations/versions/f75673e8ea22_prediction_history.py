@@ -0,0 +1,48 @@
+"""prediction history
+
+Skipped where `flask init-db` already created the table.
+
+Revision ID: f75673e8ea22
+Revises: 8b6e0d4c5a21
+Create Date: 2026-10-16 20:44:53.801951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f75673e8ea22'
+down_revision = '8b6e0d4c5a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'prediction' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('prediction',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('transcript', sa.Text(), nullable=False),
+    sa.Column('sex', sa.Integer(), nullable=True),
+    sa.Column('age', sa.Integer(), nullable=True),
+    sa.Column('mmse', sa.Integer(), nullable=True),
+    sa.Column('label', sa.String(length=64), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('model_version', sa.String(length=255), nullable=False),
+    sa.Column('backend', sa.String(length=32), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.create_index('ix_prediction_user_created', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.drop_index('ix_prediction_user_created')
+
+    op.drop_table('prediction')
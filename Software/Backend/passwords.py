@@ -0,0 +1,91 @@
+"""
+Password hashing off the request threads.
+
+Hashing is deliberately expensive CPU work (werkzeug's scrypt or PBKDF2).
+Done inline, a burst of logins takes every core from the workers' other
+requests, /api/predict included. Here it runs on a small dedicated pool of
+PASSWORD_HASH_WORKERS threads per process, so it uses at most that many
+cores however many logins arrive; hashlib releases the GIL while hashing,
+so the rest of the process keeps going meanwhile. Up to PASSWORD_HASH_QUEUE
+more callers wait their turn for at most PASSWORD_HASH_MAX_WAIT_SECONDS;
+beyond that they get admission.Overloaded (a 429) instead of making every
+login slower.
+
+PASSWORD_HASH_METHOD is a werkzeug method with its cost, e.g.
+"scrypt:32768:8:1" or "pbkdf2:sha256:600000". Stored hashes name the
+method they were made with, so changing it takes effect for existing
+users at their next successful login (needs_rehash()).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from admission import StageLimiter
+from metrics import histogram
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")  # werkzeug's default
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "1"))  # 0: hash inline, unbounded
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+PASSWORD_HASH_MAX_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_MAX_WAIT_SECONDS", "5"))
+
+HASH_SECONDS = histogram("neurovoice_password_hash_seconds",
+                         "Time to compute one password hash, by op (hash, verify).", ["op"],
+                         buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+hash_limiter = StageLimiter("password_hash", PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+                            PASSWORD_HASH_MAX_WAIT_SECONDS)
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_method_prefix: Optional[str] = None
+
+
+def _reset():
+    # Pool threads do not survive a fork
+    global _pool, _pool_lock
+    _pool, _pool_lock = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _timed(op: str, fn, *args):
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        HASH_SECONDS.observe(time.perf_counter() - t0, op=op)
+
+
+def _run(op: str, fn, *args):
+    """fn(*args) on the hashing pool, waiting for a turn; raises Overloaded if none comes up in time."""
+    global _pool
+    if PASSWORD_HASH_WORKERS <= 0:
+        return _timed(op, fn, *args)
+    with hash_limiter.slot():
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    _pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _pool.submit(_timed, op, fn, *args).result()
+
+
+def hash_password(password: str) -> str:
+    return _run("hash", generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return _run("verify", check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """True if pwhash was not made with PASSWORD_HASH_METHOD (algorithm or cost)."""
+    global _method_prefix
+    if _method_prefix is None:
+        # werkzeug fills in default costs ("scrypt" -> "scrypt:32768:8:1"): ask it what it writes
+        _method_prefix = hash_password("").split("$", 1)[0]
+    return pwhash.split("$", 1)[0] != _method_prefix
@@ -0,0 +1,238 @@
+"""
+Deadlines, retries and hedged calls for remote model invocations.
+
+A deadline is set once per request with `deadline_scope()` and read
+anywhere below it with `remaining()`; it lives in a context variable, so it
+follows the request's thread but not work handed to other threads (pass
+`remaining()` along explicitly there). `retry_call()` retries with capped
+exponential backoff and full jitter, never sleeping past the deadline.
+`hedged_call()` starts a second copy of an idempotent call when the first
+has not answered after a delay (typically a recent latency percentile from
+`LatencyWindow`) and returns whichever finishes first. `CircuitBreaker`
+stops sending calls to a remote that keeps failing or running slow.
+"""
+import collections
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+
+from metrics import counter
+
+T = TypeVar("T")
+
+CALLS = counter("neurovoice_remote_calls_total", "Remote call attempts, hedges included.", ["call"])
+RETRIES = counter("neurovoice_remote_retries_total", "Remote call attempts that were retries.", ["call"])
+HEDGES = counter("neurovoice_remote_hedges_total", "Hedged remote calls by outcome (fired, won).", ["call", "outcome"])
+BREAKER_TRANSITIONS = counter("neurovoice_breaker_transitions_total", "Circuit breaker state changes.",
+                              ["breaker", "state"])
+DEADLINES = counter("neurovoice_deadline_exceeded_total", "Calls abandoned because the request deadline passed.", ["call"])
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the call finished."""
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Runs the block with a deadline `seconds` from now; an enclosing, earlier deadline wins."""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (may be <= 0), or None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def check_deadline(call: str):
+    left = remaining()
+    if left is not None and left <= 0:
+        DEADLINES.inc(call=call)
+        raise DeadlineExceeded(f"{call}: deadline exceeded")
+
+
+class LatencyWindow:
+    """The last `size` latencies of a call, for picking a hedge delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th percentile (0-100), or None until min_samples have been seen."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+def retry_call(fn: Callable[[], T], call: str, attempts: int, retryable: Callable[[BaseException], bool],
+               base: float = 0.05, cap: float = 2.0) -> T:
+    """
+    fn() up to `attempts` times while it raises something `retryable`.
+    Waits uniform(0, min(cap, base * 2**n)) between attempts and gives up
+    with DeadlineExceeded rather than sleep past the deadline.
+    """
+    for attempt in range(attempts):
+        if attempt:
+            RETRIES.inc(call=call)
+        check_deadline(call)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not retryable(e):
+                raise
+            delay = random.uniform(0, min(cap, base * 2 ** attempt))
+            left = remaining()
+            if left is not None and delay >= left:
+                DEADLINES.inc(call=call)
+                raise DeadlineExceeded(f"{call}: deadline exceeded") from e
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def hedged_call(fn: Callable[[], T], call: str, pool: Executor, hedge_after: Optional[float] = None,
+                latencies: Optional[LatencyWindow] = None) -> T:
+    """
+    fn() on `pool`; if it has not finished after `hedge_after` seconds, a
+    second fn() is started and the first to succeed wins (the loser is left
+    to finish in the background). Without a hedge delay or deadline fn runs
+    inline. Waiting stops at the deadline with DeadlineExceeded, which frees
+    the caller even if the remote side never answers.
+    """
+    check_deadline(call)
+    if hedge_after is None and remaining() is None:
+        return _timed(fn, call, latencies)
+
+    started = time.monotonic()
+    futures = {pool.submit(_timed, fn, call, latencies)}
+    hedge: Optional[Future] = None
+    errors = []
+    while futures:
+        left = remaining()
+        hedge_due = None
+        if hedge is None and hedge_after is not None:
+            hedge_due = max(0.0, started + hedge_after - time.monotonic())
+        waits = [t for t in (left, hedge_due) if t is not None]
+        done, _ = wait(futures, timeout=max(0.0, min(waits)) if waits else None, return_when=FIRST_COMPLETED)
+        for fut in done:
+            futures.discard(fut)
+            if fut.exception() is None:
+                if fut is hedge:
+                    HEDGES.inc(call=call, outcome="won")
+                return fut.result()
+            errors.append(fut.exception())
+        if done:
+            continue  # a failed attempt is not hedged; retry_call decides whether to try again
+        if hedge_due is not None and (left is None or hedge_due < left):
+            HEDGES.inc(call=call, outcome="fired")
+            hedge = pool.submit(_timed, fn, call, latencies)
+            futures.add(hedge)
+            continue
+        DEADLINES.inc(call=call)
+        raise DeadlineExceeded(f"{call}: deadline exceeded")
+    raise errors[-1]
+
+
+def _timed(fn: Callable[[], T], call: str, latencies: Optional[LatencyWindow]) -> T:
+    CALLS.inc(call=call)
+    t0 = time.perf_counter()
+    result = fn()
+    if latencies is not None:
+        latencies.observe(time.perf_counter() - t0)
+    return result
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through and the last `window` outcomes are kept; once
+    there are at least `min_calls` and the share of failures (errors, or
+    calls slower than `slow_after` seconds) reaches `failure_rate`, it opens.
+    open: allow() is False for `cooldown` seconds, then it is half-open.
+    half_open: allow() lets one probe call through; its outcome closes the
+    breaker again or reopens it for another cooldown.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_after: Optional[float] = None, cooldown: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_after = slow_after
+        self.cooldown = cooldown
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether the next call may go to the remote; every allowed call must be record()ed."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._set(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, ok: bool, seconds: float = 0.0):
+        failed = not ok or (self.slow_after is not None and seconds > self.slow_after)
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self._outcomes.clear()
+                    self._set(self.CLOSED)
+                return
+            if self._state != self.CLOSED:
+                return  # a call allowed before the breaker opened
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and \
+                    sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._set(self.OPEN)
+
+    def _set(self, state: str):
+        self._state = state
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
@@ -0,0 +1,256 @@
+"""
+Incremental audio analysis for the streaming prediction endpoint
+(/api/predict/stream in asgi.py).
+
+A StreamAnalyzer is fed mono 16-bit PCM in whatever pieces the client sends
+and only analyses the new audio each time:
+    - a 10 ms intensity track. It cuts utterances for incremental ASR in the
+      middle of the first `min_pause` pause after speech (the pause rule of
+      api.split_on_silence, against the loudest frame so far), and it gives
+      pause statistics at any moment (stats());
+    - with acoustic=True, the raw Praat MFCCs and the F0 track, one block of
+      STREAM_ANALYSIS_BLOCK_SECONDS at a time, on the 10 ms grid of a
+      whole-recording analysis.
+Once the recording has ended, acoustics() only normalises the MFCCs and
+segments the intensity track against the final loudest frame. The local
+model gets the audio branch of features.FeaturePipeline without the
+recording being analysed again. The voiced/silent segmentation mirrors
+Praat's "To TextGrid (silences)" as HandcraftedFeatures uses it (-25 dB,
+0.1 s minimum pause and sound), but on a plain RMS intensity, so pause
+figures are close to the offline ones, not identical.
+"""
+import io
+import math
+import os
+import wave
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from decoding import TARGET_RATE
+from features import MFCC_ARGS, normalise_mfcc, pause_features
+
+ANALYSIS_BLOCK_SECONDS = float(os.getenv("STREAM_ANALYSIS_BLOCK_SECONDS", "1"))  # MFCC/pitch work per step
+
+HOP = TARGET_RATE // 100  # 10 ms, the time step of every track
+INTENSITY_WINDOW = int(0.032 * TARGET_RATE)  # 3.2 / 100 Hz, as Praat's silence TextGrid
+MFCC_WINDOW = int(0.05 * TARGET_RATE)  # physical width of the 25 ms Gaussian MFCC window
+PITCH_WINDOW = int(0.04 * TARGET_RATE)  # three periods of the 75 Hz pitch floor
+# HandcraftedFeatures defaults
+SIL_THR = -25.0
+MIN_SIL = 0.1
+MIN_SND = 0.1
+
+
+class StreamAnalyzer:
+    def __init__(self, rate: int = TARGET_RATE, acoustic: bool = True, min_pause: float = 0.3,
+                 max_utterance: float = 30.0, silence_db: float = -25.0):
+        self.acoustic = acoustic
+        self.pcm = bytearray()  # the recording so far, 16 kHz
+        self._resampler = None
+        if rate != TARGET_RATE:
+            import soxr
+            self._resampler = soxr.ResampleStream(rate, TARGET_RATE, 1, dtype="int16")
+        self._odd = b""
+        self._db: List[float] = []
+        self._loudest = -math.inf
+        # Utterance cutting
+        self._silence_db = abs(silence_db)
+        self._min_pause = max(1, int(min_pause * 100))
+        self._max_samples = int(max_utterance * TARGET_RATE)
+        self._start = 0
+        self._pause = 0
+        self._speech = False
+        # Acoustic tracks
+        self._block = max(1, int(ANALYSIS_BLOCK_SECONDS * 100))
+        self._mfcc: List[np.ndarray] = []
+        self._frames = 0
+        self._f0 = [0, 0.0, 0.0]  # voiced frames, sum and sum of squares of their semitones
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (2 * TARGET_RATE)
+
+    @property
+    def in_utterance(self) -> bool:
+        """Speech since the last cut, i.e. audio that flush() would still return."""
+        return self._speech
+
+    @property
+    def trailing_silence(self) -> float:
+        """Seconds of pause at the end of the audio so far."""
+        return self._pause * HOP / TARGET_RATE
+
+    def feed(self, data: bytes) -> List[Tuple[int, int]]:
+        """Appends PCM; returns the (start, end) sample ranges of utterances that ended in it."""
+        data = self._odd + data
+        self._odd = data[len(data) & ~1:]
+        data = data[:len(data) & ~1]
+        if self._resampler is not None:
+            pcm = np.frombuffer(data, dtype="<i2")
+            data = self._resampler.resample_chunk(pcm).astype("<i2").tobytes()
+        self.pcm += data
+        cuts = self._intensity()
+        if self.acoustic:
+            self._analyse(final=False)
+        return cuts
+
+    def flush(self) -> List[Tuple[int, int]]:
+        """Ends the recording; returns the utterances that end with it, as feed()."""
+        if self._resampler is not None:
+            self.pcm += self._resampler.resample_chunk(np.zeros(0, dtype="<i2"), last=True).astype("<i2").tobytes()
+            self._resampler = None
+        cuts = self._intensity()
+        if self._speech:
+            cuts.append(self._cut(len(self.pcm) // 2))
+        return cuts
+
+    def audio(self, start: int, end: int) -> bytes:
+        return bytes(self.pcm[2 * start:2 * end])
+
+    def wav(self) -> bytes:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(TARGET_RATE)
+            w.writeframes(self.pcm)
+        return buf.getvalue()
+
+    # --- Pauses ---
+    def voicing(self) -> Tuple[List[List[float]], List[List[float]]]:
+        """([start, end] of voiced intervals, [start, end] of silent ones), as features.voicing_segments."""
+        db = np.asarray(self._db)
+        if not len(db):
+            return [], []
+        threshold = max(db.max() - abs(SIL_THR), db.min())
+        sounding = db >= threshold
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(sounding.astype(np.int8))) + 1, [len(db)]))
+        runs = [[bool(sounding[a]), int(a), int(b)] for a, b in zip(bounds[:-1], bounds[1:])]
+        runs = _absorb_short(runs, False, int(MIN_SIL * 100))
+        runs = _absorb_short(runs, True, int(MIN_SND * 100))
+
+        def at(frame: int) -> float:  # boundary between frame - 1 and frame
+            return (frame * HOP + (INTENSITY_WINDOW - HOP) / 2) / TARGET_RATE
+
+        total = self.duration
+        voiced, unvoiced = [], []
+        for i, (label, a, b) in enumerate(runs):
+            seg = [0.0 if i == 0 else at(a), total if i == len(runs) - 1 else at(b)]
+            (voiced if label else unvoiced).append(seg)
+        return voiced, unvoiced
+
+    def stats(self) -> Dict[str, float]:
+        """Pause statistics of the audio so far."""
+        voiced, unvoiced = self.voicing()
+        duration = self.duration
+        if not duration:
+            return {"duration": 0.0}
+        feats = pause_features(voiced, unvoiced, duration)
+        return {
+            "duration": round(duration, 3),
+            "speech_seconds": round(sum(e - s for s, e in voiced), 3),
+            "pauses": len(unvoiced),
+            "hesitation_ratio": round(feats["Hesitation Ratio"], 4),
+            "pause_median_ms": round(feats["DPI(ms)"], 1),
+            "voiced_rate": round(feats["Voiced Rate(1/s)"], 4),
+        }
+
+    # --- Acoustic features ---
+    def acoustics(self) -> dict:
+        """{"mfcc", "features", "duration"} for features.FeaturePipeline.extract(); call after flush()."""
+        self._analyse(final=True)
+        raw = np.vstack(self._mfcc) if self._mfcc else np.zeros((0, 13))
+        if len(raw) < 9:  # librosa's delta window
+            raise ValueError("Recording too short.")
+        n, total, squares = self._f0
+        f0_sd = math.sqrt(max(0.0, squares - total * total / n) / (n - 1)) if n > 1 else math.nan
+        return {
+            "mfcc": normalise_mfcc(raw),
+            "features": {"F0 SD(st)": f0_sd, **pause_features(*self.voicing(), self.duration)},
+            "duration": self.duration,
+        }
+
+    def _intensity(self) -> List[Tuple[int, int]]:
+        n = len(self.pcm) // 2
+        first = len(self._db)
+        last = (n - INTENSITY_WINDOW) // HOP  # last frame whose window is complete
+        if last < first:
+            return []
+        x = self._samples(first * HOP, last * HOP + INTENSITY_WINDOW)
+        windows = np.lib.stride_tricks.sliding_window_view(x, INTENSITY_WINDOW)[::HOP]
+        power = windows.var(axis=1)  # DC removed, as Praat's intensity
+        cuts = []
+        for k, db in enumerate((10 * np.log10(power + 1e-12)).tolist(), start=first):
+            self._db.append(db)
+            self._loudest = max(self._loudest, db)
+            cut = self._segment(k, db)
+            if cut is not None:
+                cuts.append(cut)
+        return cuts
+
+    def _segment(self, k: int, db: float) -> Optional[Tuple[int, int]]:
+        if db < self._loudest - self._silence_db:
+            self._pause += 1
+            if self._speech and self._pause == self._min_pause:
+                return self._cut((k + 1 - self._pause // 2) * HOP)
+            if not self._speech and self._pause > self._min_pause:
+                self._start = (k + 1 - self._min_pause // 2) * HOP  # no long lead-in silence
+        else:
+            self._pause = 0
+            self._speech = True
+            if (k + 1) * HOP - self._start >= self._max_samples:
+                return self._cut((k + 1) * HOP)  # no pause in max_utterance seconds: cut anyway
+        return None
+
+    def _cut(self, end: int) -> Tuple[int, int]:
+        cut = (self._start, end)
+        self._start = end
+        self._speech = False
+        return cut
+
+    def _analyse(self, final: bool):
+        from parselmouth.praat import call
+        n = len(self.pcm) // 2
+        available = (n - MFCC_WINDOW) // HOP + 1 - self._frames  # frame k is centred at 25 ms + k * 10 ms
+        while available >= (1 if final else self._block):
+            count = available if final else self._block
+            a = self._frames * HOP
+            span = (count - 1) * HOP
+            self._mfcc.append(self._praat(a, span + MFCC_WINDOW, lambda snd: snd.to_mfcc(**MFCC_ARGS))
+                              .to_array().T[:count])
+            pitch = self._praat(a, span + PITCH_WINDOW, lambda snd: call(snd, "To Pitch", 0.0, 75, 600))
+            f0 = pitch.selected_array["frequency"][:count]
+            semitones = 12 * np.log2(f0[f0 > 0] / 100.0)
+            self._f0[0] += len(semitones)
+            self._f0[1] += float(semitones.sum())
+            self._f0[2] += float(np.square(semitones).sum())
+            self._frames += count
+            available -= count
+
+    def _praat(self, start: int, length: int, analyse):
+        """
+        analyse(Sound of `length` samples from `start`). One sample of slack:
+        without it Praat's frame count sometimes rounds down, re-centring
+        every frame of the block.
+        """
+        from parselmouth import Sound
+        return analyse(Sound(self._samples(start, start + length + 1), sampling_frequency=TARGET_RATE))
+
+    def _samples(self, start: int, end: int) -> np.ndarray:
+        """Samples start..end as floats, zero-padded past the end of the audio so far."""
+        x = np.frombuffer(self.audio(start, end), dtype="<i2").astype(np.float64) / 32768.0
+        return np.pad(x, (0, end - start - len(x)))
+
+
+def _absorb_short(runs: List[list], label: bool, min_frames: int) -> List[list]:
+    """Relabels `label` runs shorter than min_frames as their neighbours and merges equal neighbours."""
+    out: List[list] = []
+    for run in runs:
+        if run[0] == label and run[2] - run[1] < min_frames:
+            run = [not label, run[1], run[2]]
+        if out and out[-1][0] == run[0]:
+            out[-1][2] = run[2]
+        else:
+            out.append(run)
+    return out
@@ -0,0 +1,91 @@
+"""
+Background deletion of rows that are no longer needed (expired or used
+one-time codes), in small batches.
+
+Each batch selects at most `batch` primary keys matching one condition,
+deletes them and commits, then sleeps `pause` seconds, so a sweep never holds
+the write lock (all of SQLite) for long and requests interleave with it.
+Conditions are swept one at a time so each can be served by an index; an OR
+of them usually is not. A thread per process sweeps every `interval`
+seconds; with several worker processes they may race for the same rows,
+which only means one of them deletes fewer.
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, select
+
+from metrics import counter, histogram
+
+DELETED = counter("neurovoice_sweeper_deleted_total", "Rows deleted by background sweepers, by table.", ["table"])
+SWEEP_SECONDS = histogram("neurovoice_sweep_seconds", "Duration of one background sweep, by table.", ["table"],
+                          buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+class BatchSweeper:
+    def __init__(self, app: Flask, db: SQLAlchemy, model, conditions: Callable[[], List], interval: float = 300.0,
+                 batch: int = 1000, pause: float = 0.05):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.table = model.__tablename__
+        self.conditions = conditions  # () -> [where clause, ...], evaluated at every sweep (e.g. for "now")
+        self.interval = interval  # 0 disables the thread; sweep() can still be called
+        self.batch = batch
+        self.pause = pause
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # The thread does not survive a fork; start() again in the child
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts this process's sweeper thread, if enabled and not running."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"sweep-{self.table}", daemon=True)
+                self._thread.start()
+
+    def sweep(self) -> int:
+        """Deletes every matching row, batch by batch; returns how many. Needs an app context."""
+        t0 = time.perf_counter()
+        pk = self.model.__table__.primary_key.columns.values()[0]
+        deleted = 0
+        for condition in self.conditions():
+            while True:
+                ids = self.db.session.scalars(select(pk).where(condition).limit(self.batch)).all()
+                if ids:
+                    n = self.db.session.execute(delete(self.model).where(pk.in_(ids))).rowcount
+                    self.db.session.commit()
+                    deleted += n
+                    DELETED.inc(n, table=self.table)
+                else:
+                    self.db.session.rollback()  # end the read transaction
+                if len(ids) < self.batch:
+                    break
+                time.sleep(self.pause)
+        SWEEP_SECONDS.observe(time.perf_counter() - t0, table=self.table)
+        return deleted
+
+    def _run(self):
+        # Spread the worker processes' sweeps over the interval
+        time.sleep(random.uniform(0, self.interval))
+        while True:
+            try:
+                with self.app.app_context():
+                    n = self.sweep()
+                if n:
+                    print(f"[SWEEP] Deleted {n} rows from {self.table}")
+            except Exception as e:
+                print(f"[SWEEP ERROR] {self.table}: {e!r}")
+            time.sleep(self.interval)
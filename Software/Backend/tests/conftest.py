@@ -0,0 +1,79 @@
+"""
+Shared fixtures. The app is configured through the environment before
+main.py is first imported: a throwaway SQLite database and spool/upload
+directories, the stub ASR engine, cheap password hashes and no background
+threads that are not under test.
+
+    cd Software/Backend && python -m pytest tests
+"""
+import io
+import math
+import os
+import struct
+import sys
+import tempfile
+import wave
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="neurovoice-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_tmp}/test.db",
+    MAIL_SPOOL_DIR=os.path.join(_tmp, "mail"),
+    UPLOAD_STORE_DIR=os.path.join(_tmp, "uploads"),
+    ASR_ENGINE="stub",
+    RESULT_CACHE_SIZE="0",
+    USER_CACHE_SIZE="0",
+    PREDICTION_HISTORY_FLUSH_SECONDS="3600",
+    OTP_SWEEP_INTERVAL_SECONDS="0",
+    PASSWORD_HASH_METHOD="pbkdf2:sha256:1000",
+    AWS_REGION="us-east-1",
+    AWS_ACCESS_KEY_ID="test",
+    AWS_SECRET_ACCESS_KEY="test",
+)
+
+
+def make_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * i / rate)))
+                               for i in range(int(seconds * rate))))
+    return buf.getvalue()
+
+
+@pytest.fixture
+def main():
+    import main as main_module
+    main_module.prediction_history.flush()  # history left by the previous test goes with its tables
+    with main_module.app.app_context():
+        main_module.db.drop_all()
+        main_module.db.create_all()
+    yield main_module
+
+
+@pytest.fixture
+def client(main):
+    return main.app.test_client()
+
+
+@pytest.fixture
+def user(main):
+    with main.app.app_context():
+        u = main.User(email="a@example.com", username="a", sex="M", age=70, mmse_score=25)
+        u.set_password("password123")
+        main.db.session.add(u)
+        main.db.session.commit()
+        return u.id
+
+
+@pytest.fixture
+def auth_client(main, user):
+    c = main.app.test_client()
+    r = c.post("/login", data={"email": "a@example.com", "password": "password123"})
+    assert r.status_code == 302 and r.location.endswith("/ai")
+    return c
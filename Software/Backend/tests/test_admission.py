@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import Overloaded, StageLimiter
+
+
+def test_slot_refuses_beyond_the_queue():
+    limiter = StageLimiter("test", limit=1, max_queue=0, max_wait=1)
+    with limiter.slot():
+        with pytest.raises(Overloaded) as exc:
+            with limiter.slot():
+                pass
+    assert exc.value.stage == "test" and exc.value.retry_after >= 1
+    with limiter.slot():
+        pass
+
+
+def test_slot_times_out_in_the_queue():
+    limiter = StageLimiter("test", limit=1, max_queue=1, max_wait=0.05)
+    with limiter.slot():
+        with pytest.raises(Overloaded):
+            with limiter.slot():
+                pass
+    assert limiter.stats() == {"running": 0, "waiting": 0, "limit": 1}
+
+
+def test_async_slot_waits_for_a_thread_to_release():
+    limiter = StageLimiter("test", limit=1, max_queue=1, max_wait=5)
+    taken, release = threading.Event(), threading.Event()
+
+    def hold():
+        with limiter.slot():
+            taken.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    taken.wait(5)
+
+    async def main():
+        waiting = asyncio.ensure_future(_use(limiter))
+        await asyncio.sleep(0.05)
+        assert limiter.stats()["waiting"] == 1
+        release.set()
+        await waiting
+
+    asyncio.run(main())
+    thread.join()
+    assert limiter.stats() == {"running": 0, "waiting": 0, "limit": 1}
+
+
+def test_async_slot_times_out_and_gives_the_slot_back():
+    limiter = StageLimiter("test", limit=1, max_queue=4, max_wait=0.05)
+
+    async def main():
+        async with limiter.async_slot():
+            with pytest.raises(Overloaded):
+                await _use(limiter)
+            assert limiter.stats()["waiting"] == 0
+        await _use(limiter)
+
+    asyncio.run(main())
+    assert limiter.stats() == {"running": 0, "waiting": 0, "limit": 1}
+
+
+def test_async_slot_cancelled_while_queued():
+    limiter = StageLimiter("test", limit=1, max_queue=4, max_wait=5)
+
+    async def main():
+        async with limiter.async_slot():
+            waiting = asyncio.ensure_future(_use(limiter))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+        await _use(limiter)
+
+    asyncio.run(main())
+    assert limiter.stats() == {"running": 0, "waiting": 0, "limit": 1}
+
+
+def test_async_slot_queue_full():
+    limiter = StageLimiter("test", limit=1, max_queue=0, max_wait=5)
+
+    async def main():
+        async with limiter.async_slot():
+            with pytest.raises(Overloaded):
+                await _use(limiter)
+
+    asyncio.run(main())
+
+
+async def _use(limiter):
+    async with limiter.async_slot():
+        await asyncio.sleep(0)
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+import api
+from admission import StageLimiter
+from tests.conftest import make_wav
+
+
+@pytest.fixture
+def asgi_client(main, user):
+    import asgi
+    with TestClient(asgi.app, follow_redirects=False) as c:
+        r = c.post("/login", data={"email": "a@example.com", "password": "password123"})
+        assert r.status_code == 302
+        yield c
+
+
+def test_predict_requires_login(main):
+    import asgi
+    with TestClient(asgi.app) as c:
+        r = c.post("/api/predict", files={"audio": ("a.wav", make_wav(), "audio/wav")})
+    assert r.status_code == 401
+
+
+def test_predict_is_refused_while_asr_is_saturated(asgi_client, monkeypatch):
+    limiter = StageLimiter("asr-test", limit=1, max_queue=0, max_wait=1)
+    monkeypatch.setattr(api, "asr_limiter", limiter)
+    with limiter.slot():
+        r = asgi_client.post("/api/predict", files={"audio": ("a.wav", make_wav(), "audio/wav")})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert "asr-test" in r.json()["error"]
+
+
+def test_stream_is_refused_while_asr_is_saturated(asgi_client, monkeypatch):
+    limiter = StageLimiter("asr-test", limit=1, max_queue=0, max_wait=1)
+    monkeypatch.setattr(api, "asr_limiter", limiter)
+    pcm = make_wav(0.5)[44:]
+    with limiter.slot():
+        with asgi_client.websocket_connect("/api/predict/stream") as ws:
+            ws.send_bytes(pcm)
+            ws.send_json({"type": "stop"})
+            message = ws.receive_json()
+            while message["type"] != "error":
+                assert message["type"] in ("partial", "stats")
+                message = ws.receive_json()
+    assert message["status"] == 429 and message["retry_after"] >= 1
+
+
+def test_chunked_upload_over_the_limit_is_refused(asgi_client, main, monkeypatch):
+    monkeypatch.setitem(main.app.config, "MAX_CONTENT_LENGTH", 64 * 1024)
+    wav = make_wav(5.0)  # ~160 KB
+    boundary = "nvboundary"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"a.wav\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n").encode() + wav + f"\r\n--{boundary}--\r\n".encode()
+
+    def chunks():
+        for start in range(0, len(body), 16 * 1024):
+            yield body[start:start + 16 * 1024]
+
+    r = asgi_client.post("/api/predict", content=chunks(),
+                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert r.status_code == 413
+
+
+def test_lifespan_warms_the_worker_up(main):
+    import asgi
+    with TestClient(asgi.app) as c:
+        deadline = time.monotonic() + 5
+        while c.get("/api/ready").json()["state"] in ("cold", "warming") and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert c.get("/api/ready").json()["state"] != "cold"
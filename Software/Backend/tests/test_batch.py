@@ -0,0 +1,40 @@
+import io
+import json
+
+from tests.conftest import make_wav
+
+
+def test_batch_requires_login(client):
+    r = client.post("/api/predict/batch", data={"audio": (io.BytesIO(make_wav()), "a.wav")})
+    assert r.status_code == 401
+    assert r.get_json() == {"error": "Login required."}
+
+
+def test_batch_without_files(auth_client):
+    r = auth_client.post("/api/predict/batch", data={})
+    assert r.status_code == 400
+
+
+def test_batch_rejects_bad_files_per_line(auth_client):
+    r = auth_client.post("/api/predict/batch", data={"audio": [(io.BytesIO(b"not audio"), "notes.txt")]})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["index"] == 0 and lines[0]["ok"] is False and lines[0]["status"] == 415
+
+
+def test_batch_files_spill_to_disk(auth_client, monkeypatch):
+    import api
+
+    spools = []
+
+    class Spool(api._UploadSpool):
+        def __init__(self, spool_mb=api.UPLOAD_SPOOL_MB):
+            super().__init__(spool_mb)
+            spools.append(self)
+
+    monkeypatch.setattr(api, "_UploadSpool", Spool)
+    monkeypatch.setattr(api, "BATCH_SPOOL_MB", 0.01)
+    r = auth_client.post("/api/predict/batch", data={"audio": [(io.BytesIO(make_wav(1)), "a.wav")]})
+    r.get_data()
+    assert spools and all(spool._rolled for spool in spools)
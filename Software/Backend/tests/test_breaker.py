@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from api import FallbackBackend, InferenceBackend, ModelInput, PredictError
+from resilience import CircuitBreaker
+
+ROW = ModelInput(sex=1, age=70, mmse=25, transcript="hello")
+
+
+class FakeBackend(InferenceBackend):
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.calls = 0
+
+    def predict(self, inputs):
+        self.calls += 1
+        if self.fail:
+            raise PredictError(f"{self.name} down", 502)
+        return [f"{self.name},0.9" for _ in inputs]
+
+
+def test_opens_at_the_failure_rate():
+    breaker = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5)
+    for ok in (True, False, True):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", window=2, min_calls=2, failure_rate=1.0, slow_after=0.1)
+    breaker.record(True, 0.5)
+    breaker.record(True, 0.5)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test", window=1, min_calls=1, cooldown=0.01)
+    breaker.record(False)
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # the probe is in flight
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test", window=1, min_calls=1, cooldown=0.01)
+    breaker.record(False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_fallback_answers_a_failed_call():
+    primary, local = FakeBackend("remote", fail=True), FakeBackend("local")
+    backend = FallbackBackend(primary, local, CircuitBreaker("test", window=10, min_calls=10))
+    answered, outputs = backend.answer([ROW])
+    assert answered is local and outputs == ["local,0.9"]
+    assert backend.describe() == "remote"
+
+
+def test_open_breaker_skips_the_remote():
+    primary, local = FakeBackend("remote", fail=True), FakeBackend("local")
+    backend = FallbackBackend(primary, local, CircuitBreaker("test", window=2, min_calls=2, cooldown=60))
+    for _ in range(5):
+        backend.answer([ROW])
+    assert primary.calls == 2
+    assert local.calls == 5
+
+
+def test_remote_error_is_reported_when_the_fallback_fails_too():
+    backend = FallbackBackend(FakeBackend("remote", fail=True), FakeBackend("local", fail=True),
+                              CircuitBreaker("test"))
+    with pytest.raises(PredictError, match="remote down"):
+        backend.answer([ROW])
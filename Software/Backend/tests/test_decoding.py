@@ -0,0 +1,38 @@
+import io
+import threading
+
+import pytest
+
+import api
+from decoding import TARGET_RATE, is_compressed, read_audio
+from tests.conftest import make_wav
+
+
+def test_read_audio_wav():
+    audio = read_audio(io.BytesIO(make_wav(0.5)))
+    assert audio.sample_rate == TARGET_RATE
+    assert api.audio_duration(audio) == 0.5
+
+
+def test_is_compressed_sniffs_content():
+    assert not is_compressed(io.BytesIO(make_wav(0.1)))
+    assert is_compressed(io.BytesIO(b"OggS" + b"\0" * 10))
+    assert is_compressed(io.BytesIO(b"ID3\x04" + b"\0" * 10))
+
+
+def test_decode_audio_runs_on_the_decode_pool(monkeypatch):
+    monkeypatch.setattr(api, "ADMIT_DECODE_CONCURRENCY", 2)
+    threads = []
+
+    def read_audio(audio):
+        threads.append(threading.current_thread().name)
+        return "decoded"
+
+    monkeypatch.setattr(api, "read_audio", read_audio)
+    assert api.decode_audio(io.BytesIO(b"")) == "decoded"
+    assert threads[0].startswith("decode") and threads[0] != threading.current_thread().name
+
+
+def test_decode_audio_errors_reach_the_caller():
+    with pytest.raises(ValueError):
+        api.decode_audio(io.BytesIO(b"not audio at all"))
@@ -0,0 +1,32 @@
+import io
+
+from tests.conftest import make_wav
+
+
+def test_submit_requires_login(client):
+    r = client.post("/api/predict/jobs", data={"audio": (io.BytesIO(make_wav()), "a.wav")})
+    assert r.status_code == 401
+    assert r.get_json() == {"error": "Login required."}
+
+
+def test_status_of_unknown_job_is_404(auth_client):
+    assert auth_client.get("/api/predict/jobs/nope").status_code == 404
+
+
+def test_jobs_get_the_long_deadline(main, monkeypatch):
+    import api
+    from resilience import remaining
+    budgets = []
+
+    def run_prediction(audio, sex, age, mmse):
+        budgets.append(remaining())
+        return api.prediction_body(api.InferenceBackend(), api.ModelInput(sex, age, mmse, "hello"), "0,0.2")
+
+    monkeypatch.setattr(api, "run_prediction", run_prediction)
+    body, status = api._prediction_job(io.BytesIO(b""), 1, 70, 25, None)
+    assert status == 200
+    assert api.PREDICT_DEADLINE_SECONDS < budgets[0] <= api.PREDICT_LONG_DEADLINE_SECONDS
+
+    monkeypatch.setattr(api, "PREDICT_LONG_DEADLINE_SECONDS", 0)
+    api._prediction_job(io.BytesIO(b""), 1, 70, 25, None)
+    assert budgets[1] is None
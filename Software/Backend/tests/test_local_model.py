@@ -0,0 +1,43 @@
+import sys
+import types
+
+import pytest
+
+from api import KerasBackend, ModelInput, PredictError, prediction_cache_key
+
+
+def local_key(path):
+    return prediction_cache_key("digest", ModelInput(1, 70, 25, "hello"), KerasBackend(str(path), lambda i: {}))
+
+
+def test_cache_key_follows_the_model_weights(tmp_path, monkeypatch):
+    monkeypatch.setattr("api.MODEL_VERSION", None)
+    path = tmp_path / "DEMENTIA.h5"
+    path.write_bytes(b"weights v1")
+    first = local_key(path)
+    assert local_key(path) == first
+    path.write_bytes(b"weights v2")
+    assert local_key(path) != first
+
+
+def test_model_without_cls_ad_is_refused(tmp_path, monkeypatch):
+    model = types.SimpleNamespace(output_names=["reg_mmse"])
+    modules = {"tensorflow": types.ModuleType("tensorflow"), "tensorflow.keras": types.ModuleType("tensorflow.keras"),
+               "tensorflow.keras.models": types.SimpleNamespace(load_model=lambda *a, **kw: model),
+               "attention": types.SimpleNamespace(Attention=None), "concretedropout": types.ModuleType("concretedropout"),
+               "concretedropout.tensorflow": types.SimpleNamespace(ConcreteDenseDropout=None)}
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    path = tmp_path / "DEMENTIA.h5"
+    path.write_bytes(b"weights")
+    with pytest.raises(PredictError) as e:
+        KerasBackend(str(path), lambda i: {}).load()
+    assert e.value.status == 503 and "cls_ad" in str(e.value)
+
+
+def test_missing_scaler_fails_the_load(tmp_path, monkeypatch):
+    import features
+
+    monkeypatch.setattr(features, "HANDCRAFTED_SCALER_PATH", str(tmp_path / "handcrafted_scaler.json"))
+    with pytest.raises(FileNotFoundError, match="handcrafted_scaler.json"):
+        features.FeaturePipeline().load()
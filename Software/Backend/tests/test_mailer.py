@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import mailer
+from mailer import MailQueue
+
+
+class FakeConnection:
+    """Stands in for the SMTP connection: records messages, or fails while `fail` is set."""
+    sent = []
+    fail = False
+
+    def __init__(self, mail, timeout):
+        self.host = None
+
+    def __enter__(self):
+        return self
+
+    def send(self, message):
+        if FakeConnection.fail:
+            raise ConnectionRefusedError("smtp down")
+        FakeConnection.sent.append(message)
+
+
+@pytest.fixture
+def queue(main, tmp_path, monkeypatch):
+    FakeConnection.sent, FakeConnection.fail = [], False
+    monkeypatch.setattr(mailer, "_TimeoutConnection", FakeConnection)
+    q = MailQueue(main.app, main.mail, str(tmp_path), retry_base=60, poll=0.05)
+    yield q
+    MailQueue._all.remove(q)
+
+
+def _spooled(queue, state):
+    out = []
+    for name in sorted(os.listdir(os.path.join(queue.root, state))):
+        with open(os.path.join(queue.root, state, name)) as f:
+            out.append(json.load(f))
+    return out
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_enqueued_mail_is_sent_in_the_background(queue):
+    queue.enqueue("a@example.com", "Hello", "Body", sender=("NeuroVoice", "noreply@example.com"))
+    _wait_for(lambda: FakeConnection.sent)
+    message = FakeConnection.sent[0]
+    assert message.recipients == ["a@example.com"] and message.subject == "Hello"
+    _wait_for(lambda: queue.depth() == {"new": 0, "cur": 0, "failed": 0})
+
+
+def test_failed_send_is_retried_later(queue):
+    FakeConnection.fail = True
+    queue.enqueue("a@example.com", "Hello", "Body")
+    _wait_for(lambda: _spooled(queue, "new") and _spooled(queue, "new")[0]["attempts"] == 1)
+    message = _spooled(queue, "new")[0]
+    assert "smtp down" in message["last_error"]
+    assert FakeConnection.sent == []
+
+
+def test_expired_mail_is_not_sent(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    queue.enqueue("a@example.com", "Code", "1234", ttl=0)
+    assert queue.depth()["new"] == 1
+    threading.Thread(target=queue._run, daemon=True).start()
+    _wait_for(lambda: queue.depth()["new"] == 0)
+    assert FakeConnection.sent == []
+    assert queue.depth() == {"new": 0, "cur": 0, "failed": 0}  # deleted, code and all
+
+
+def test_no_retry_after_expiry(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    monkeypatch.setattr(mailer.random, "uniform", lambda a, b: b)  # the longest backoff: 60 s
+    queue.enqueue("a@example.com", "Code", "1234", ttl=30)
+    path, message = queue._claim()
+    queue._failed(path, message, ConnectionRefusedError("smtp down"))
+    assert queue.depth() == {"new": 0, "cur": 0, "failed": 0}
+
+    queue.enqueue("a@example.com", "Code", "1234", ttl=3600)
+    path, message = queue._claim()
+    queue._failed(path, message, ConnectionRefusedError("smtp down"))
+    assert queue.depth() == {"new": 1, "cur": 0, "failed": 0}
+
+
+def test_gives_up_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    queue.max_attempts = 2
+    queue.enqueue("a@example.com", "Hello", "Body")
+    for _ in range(2):
+        path, message = queue._claim()
+        queue._failed(path, message, ConnectionRefusedError("smtp down"))
+        for name in os.listdir(os.path.join(queue.root, "new")):  # make the retry due now
+            os.rename(os.path.join(queue.root, "new", name), os.path.join(queue.root, "new", "0" * 15 + name[15:]))
+    assert queue.depth() == {"new": 0, "cur": 0, "failed": 1}
+    assert _spooled(queue, "failed")[0]["attempts"] == 2
+
+
+def test_given_up_codes_are_not_kept(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    queue.max_attempts = 1
+    queue.enqueue("a@example.com", "Code", "1234", ttl=3600)
+    path, message = queue._claim()
+    queue._failed(path, message, ConnectionRefusedError("smtp down"))
+    failed = _spooled(queue, "failed")
+    assert len(failed) == 1 and failed[0]["body"] is None
+
+
+def test_old_failed_mail_is_deleted(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    queue.max_attempts = 1
+    for _ in range(2):
+        queue.enqueue("a@example.com", "Hello", "Body")
+        path, message = queue._claim()
+        queue._failed(path, message, ConnectionRefusedError("smtp down"))
+    old = sorted(os.listdir(os.path.join(queue.root, "failed")))[0]
+    os.utime(os.path.join(queue.root, "failed", old), (0, 0))
+    queue._recover()
+    assert queue.depth()["failed"] == 1
+    assert old not in os.listdir(os.path.join(queue.root, "failed"))
+
+
+def test_abandoned_claims_are_recovered(queue, monkeypatch):
+    monkeypatch.setattr(queue, "start", lambda: None)
+    queue.enqueue("a@example.com", "Hello", "Body")
+    path, _ = queue._claim()
+    queue._recover()
+    assert queue.depth()["cur"] == 1
+    os.utime(path, (0, 0))
+    queue._recover()
+    assert queue.depth() == {"new": 1, "cur": 0, "failed": 0}
+
+
+def test_default_retries_fit_in_the_code_lifetime(main):
+    q = main.mail_queue
+    worst = sum(min(q.retry_cap, q.retry_base * 2 ** n) for n in range(q.max_attempts - 1))
+    assert worst + q.max_attempts * q.timeout < main.OTP_LIFETIME.total_seconds()
+
+
+def test_reset_code_email_expires_with_the_code(main, queue, client, user, monkeypatch):
+    monkeypatch.setattr(main, "mail_queue", queue)
+    monkeypatch.setattr(queue, "start", lambda: None)
+    monkeypatch.setattr(main, "validate_email", lambda email: None)  # no DNS lookups here
+    r = client.post("/reset", data={"email": "a@example.com"})
+    assert r.status_code == 302 and r.location.endswith("/verify-code")
+    message = _spooled(queue, "new")[0]
+    assert message["to"] == "a@example.com"
+    assert message["expires_at"] - message["queued_at"] == pytest.approx(main.OTP_LIFETIME.total_seconds())
@@ -0,0 +1,18 @@
+import logging
+
+import metrics
+
+
+def test_stage_logger_is_on_by_default(main):
+    assert metrics.stage_log.handlers
+    assert metrics.stage_log.isEnabledFor(logging.INFO)
+
+
+def test_request_stages_are_logged_and_sent_as_server_timing(auth_client, caplog, monkeypatch):
+    monkeypatch.setattr(metrics.stage_log, "propagate", True)  # to caplog's handler
+    with caplog.at_level(logging.INFO, logger="neurovoice.stages"):
+        r = auth_client.post("/api/predict", data={})
+    assert r.status_code == 400
+    assert "upload;dur=" in r.headers["Server-Timing"]
+    assert any(rec.getMessage().startswith("POST /api/predict 400") and "upload" in rec.getMessage()
+               for rec in caplog.records)
@@ -0,0 +1,24 @@
+import pytest
+
+from api import parse_model_output, split_model_output
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('[{"prediction": "1", "confidence": 0.9}, {"prediction": "0", "confidence": 0.2}]',
+     [("1", 0.9), ("0", 0.2)]),
+    ('{"predictions": [["1", 0.9], ["0", 0.2]]}', [("1", 0.9), ("0", 0.2)]),
+    ('["1", "0", "1"]', [("1", None), ("0", None), ("1", None)]),
+    ("[1, 0]", [("1", None), ("0", None)]),
+    ('{"predictions": ["dementia", "control"]}', [("dementia", None), ("control", None)]),
+    ("1,0.9\n0,0.2\n", [("1", 0.9), ("0", 0.2)]),
+    ("1\n\n0\n", [("1", None), ("0", None)]),
+])
+def test_one_output_per_row(raw, expected):
+    assert [parse_model_output(out) for out in split_model_output(raw)] == expected
+
+
+def test_single_row_shapes():
+    assert parse_model_output('["1", 98.2]') == ("1", 98.2)
+    assert parse_model_output('{"prediction": "0", "confidence": 0.4}') == ("0", 0.4)
+    assert parse_model_output("1,0.7") == ("1", 0.7)
+    assert parse_model_output("dementia") == ("dementia", None)
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+from admission import Overloaded, StageLimiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_method_prefix(monkeypatch):
+    monkeypatch.setattr(passwords, "_method_prefix", None)
+
+
+def test_hash_and_verify():
+    pwhash = passwords.hash_password("password123")
+    assert pwhash.startswith(passwords.PASSWORD_HASH_METHOD + "$")
+    assert passwords.verify_password(pwhash, "password123")
+    assert not passwords.verify_password(pwhash, "password124")
+
+
+def test_needs_rehash_compares_method_and_cost(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    assert not passwords.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:1000"))
+    assert passwords.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:2000"))
+    assert passwords.needs_rehash(generate_password_hash("x", "scrypt:16384:8:1"))
+
+
+def test_needs_rehash_knows_werkzeugs_default_costs(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_METHOD", "scrypt")
+    assert not passwords.needs_rehash(generate_password_hash("x", "scrypt:32768:8:1"))
+    assert passwords.needs_rehash(generate_password_hash("x", "scrypt:16384:8:1"))
+
+
+def test_hashing_runs_off_the_calling_thread(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WORKERS", 1)
+    threads = []
+    passwords._run("hash", lambda: threads.append(threading.current_thread().name))
+    assert threads[0].startswith("password-hash")
+
+
+def test_hashing_sheds_load_when_saturated(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(passwords, "hash_limiter", StageLimiter("password_hash_test", 1, 0, 1))
+    with passwords.hash_limiter.slot():
+        with pytest.raises(Overloaded):
+            passwords.hash_password("password123")
+
+
+def test_login_upgrades_outdated_hashes(main, client, user, monkeypatch):
+    with main.app.app_context():
+        old = main.db.session.get(main.User, user).password_hash
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000")
+    r = client.post("/login", data={"email": "a@example.com", "password": "password123"})
+    assert r.status_code == 302
+    with main.app.app_context():
+        new = main.db.session.get(main.User, user).password_hash
+    assert old.startswith("pbkdf2:sha256:1000$") and new.startswith("pbkdf2:sha256:2000$")
+    assert passwords.verify_password(new, "password123")
+
+
+def test_login_keeps_current_hashes(main, client, user):
+    with main.app.app_context():
+        old = main.db.session.get(main.User, user).password_hash
+    client.post("/login", data={"email": "a@example.com", "password": "password123"})
+    with main.app.app_context():
+        assert main.db.session.get(main.User, user).password_hash == old
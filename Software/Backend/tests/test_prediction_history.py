@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import api
+
+
+def _body(label="Not Dementia", confidence=0.2):
+    return {"transcript": "hello", "inputs": {"sex": 1, "age": 70, "mmse": 25}, "prediction": label,
+            "confidence": confidence, "endpoint": "test-endpoint", "backend": "sagemaker"}
+
+
+def _add(main, user_id, created_at, n=1):
+    for _ in range(n):
+        main.prediction_history.add(user_id=user_id, created_at=created_at, transcript="hello", sex=1, age=70,
+                                    mmse=25, label="Not Dementia", confidence=0.2, model_version="v1",
+                                    backend="sagemaker")
+    main.prediction_history.flush()
+
+
+def _pages(client, limit):
+    ids, cursor = [], None
+    while True:
+        r = client.get("/api/predictions", query_string={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        page = r.get_json()
+        assert len(page["predictions"]) <= limit
+        ids.append([p["id"] for p in page["predictions"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_history_requires_login(client):
+    assert client.get("/api/predictions").status_code == 401
+
+
+def test_served_predictions_are_recorded(main, auth_client, user):
+    api.prediction_served(str(user), _body("Likely Dementia", 0.9))
+    api.prediction_served(None, _body())  # anonymous: not recorded
+    assert main.prediction_history.flush() == 1
+    predictions = auth_client.get("/api/predictions").get_json()["predictions"]
+    assert len(predictions) == 1
+    assert predictions[0]["prediction"] == "Likely Dementia" and predictions[0]["confidence"] == 0.9
+
+
+def test_keyset_pages_are_newest_first_without_gaps_or_repeats(main, auth_client, user):
+    t = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    _add(main, user, t, 3)  # same timestamp: ordered by id
+    _add(main, user, t + timedelta(seconds=1), 2)
+    _add(main, user, t - timedelta(days=1), 2)
+    _add(main, user + 1, t, 3)  # someone else's
+
+    everything = _pages(auth_client, 100)
+    assert len(everything) == 1 and len(everything[0]) == 7
+    for limit in (1, 2, 3):
+        pages = _pages(auth_client, limit)
+        assert [i for page in pages for i in page] == everything[0]
+
+    rows = auth_client.get("/api/predictions").get_json()["predictions"]
+    keys = [(r["created_at"], r["id"]) for r in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_cursor_survives_new_predictions(main, auth_client, user):
+    t = datetime(2026, 1, 1)
+    _add(main, user, t, 4)
+    first = auth_client.get("/api/predictions?limit=2").get_json()
+    _add(main, user, t + timedelta(hours=1), 2)  # arrive while the client pages
+    second = auth_client.get(f"/api/predictions?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [p["id"] for p in second["predictions"]] == [2, 1]
+    assert second["next_cursor"] is None
+
+
+def test_bad_limit_and_cursor(auth_client):
+    assert auth_client.get("/api/predictions?limit=ten").status_code == 400
+    for cursor in ("nope", "2026.x", "20260101000000000000", "1.2.3"):
+        r = auth_client.get("/api/predictions", query_string={"cursor": cursor})
+        assert r.status_code == 400 and r.get_json() == {"error": "Invalid cursor."}
+
+
+def test_limit_is_clamped(main, auth_client, user):
+    _add(main, user, datetime(2026, 1, 1), 3)
+    assert len(auth_client.get("/api/predictions?limit=0").get_json()["predictions"]) == 1
+    assert len(auth_client.get("/api/predictions?limit=1000").get_json()["predictions"]) == 3
+
+
+def test_rows_are_kept_when_a_flush_fails(main, user, monkeypatch):
+    buffer = main.prediction_history
+    execute = main.db.session.execute
+
+    def down(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(main.db.session, "execute", down)
+    api.prediction_served(str(user), _body())
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer.pending() == 1
+    monkeypatch.setattr(main.db.session, "execute", execute)
+    assert buffer.flush() == 1 and buffer.pending() == 0
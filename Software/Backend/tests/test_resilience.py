@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resilience import (DeadlineExceeded, LatencyWindow, deadline_scope, hedged_call, remaining,
+                        retry_call)
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def test_deadline_scope_nests_to_the_earlier_deadline():
+    assert remaining() is None
+    with deadline_scope(10):
+        with deadline_scope(60):
+            assert remaining() <= 10
+        with deadline_scope(None):
+            assert remaining() <= 10
+    assert remaining() is None
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=100, min_samples=10)
+    for i in range(9):
+        window.observe(i)
+    assert window.percentile(50) is None
+    for i in range(9, 100):
+        window.observe(i)
+    assert window.percentile(95) == 95
+
+
+def test_retry_call_retries_retryable_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert retry_call(flaky, "test", attempts=3, retryable=lambda e: True, base=0.001) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_call_does_not_retry_other_errors():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        retry_call(broken, "test", attempts=3, retryable=lambda e: isinstance(e, ConnectionError))
+    assert len(calls) == 1
+
+
+def test_retry_call_stops_at_the_deadline():
+    def failing():
+        raise ConnectionError("reset")
+
+    with deadline_scope(0.01), pytest.raises(DeadlineExceeded):
+        retry_call(failing, "test", attempts=10, retryable=lambda e: True, base=1.0, cap=1.0)
+
+
+def test_hedged_call_inline_without_hedge_or_deadline(pool):
+    caller = threading.get_ident()
+    assert hedged_call(threading.get_ident, "test", pool) == caller
+
+
+def test_hedge_wins_over_a_slow_first_call(pool):
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)  # the first attempt hangs
+            return "first"
+        return "hedge"
+
+    try:
+        assert hedged_call(call, "test", pool, hedge_after=0.01) == "hedge"
+        assert len(calls) == 2
+    finally:
+        release.set()
+
+
+def test_no_hedge_when_the_first_call_is_fast(pool):
+    calls = []
+
+    def call():
+        calls.append(1)
+        return "first"
+
+    assert hedged_call(call, "test", pool, hedge_after=1.0) == "first"
+    assert len(calls) == 1
+
+
+def test_hedged_call_frees_the_caller_at_the_deadline(pool):
+    release = threading.Event()
+    t0 = time.monotonic()
+    try:
+        with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+            hedged_call(lambda: release.wait(5), "test", pool)
+    finally:
+        release.set()
+    assert time.monotonic() - t0 < 1
+
+
+def test_hedged_call_raises_the_last_error(pool):
+    def call():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        hedged_call(call, "test", pool, hedge_after=1.0)
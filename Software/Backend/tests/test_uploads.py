@@ -0,0 +1,228 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import api
+import uploads
+from resilience import remaining
+from uploads import UploadError, UploadStore
+
+WAV = b"RIFF" + os.urandom(2996)
+SHA = hashlib.sha256(WAV).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), max_bytes=10000, chunk_bytes=1024, ttl=3600)
+
+
+def _upload(store, data=WAV, owner="1", size=None, sha256=SHA):
+    upload_id = store.initiate(owner, "a.wav", size, sha256)["upload_id"]
+    for n, start in enumerate(range(0, len(data), 1000)):
+        store.append(upload_id, owner, n, io.BytesIO(data[start:start + 1000]))
+    return upload_id
+
+
+# --- UploadStore ---
+def test_chunks_in_any_order_assemble_in_order(store):
+    upload_id = store.initiate("1", "a.wav", len(WAV), SHA)["upload_id"]
+    for n in (2, 0, 1):
+        store.append(upload_id, "1", n, io.BytesIO(WAV[n * 1000:(n + 1) * 1000]))
+    stored = store.finalize(upload_id, "1")
+    assert stored["sha256"] == SHA and stored["bytes"] == len(WAV)
+    with open(stored["path"], "rb") as f:
+        assert f.read() == WAV
+
+
+def test_finalize_again_returns_the_same_object(store):
+    upload_id = _upload(store)
+    first = store.finalize(upload_id, "1")
+    assert store.finalize(upload_id, "1") == first
+    with pytest.raises(UploadError) as exc:
+        store.append(upload_id, "1", 0, io.BytesIO(b"x"))
+    assert exc.value.status == 409
+
+
+def test_sessions_belong_to_their_owner(store):
+    upload_id = _upload(store)
+    with pytest.raises(UploadError) as exc:
+        store.session(upload_id, "2")
+    assert exc.value.status == 404
+
+
+def test_missing_chunks_and_bad_checksums(store):
+    upload_id = store.initiate("1", "a.wav", None, SHA)["upload_id"]
+    store.append(upload_id, "1", 1, io.BytesIO(WAV[:1000]))
+    with pytest.raises(UploadError) as exc:
+        store.finalize(upload_id, "1")
+    assert exc.value.status == 409 and "[0]" in exc.value.message
+
+    upload_id = _upload(store, sha256="0" * 64)
+    with pytest.raises(UploadError) as exc:
+        store.finalize(upload_id, "1")
+    assert exc.value.status == 422
+    assert store.session(upload_id, "1")["received"] == [0, 1, 2]  # chunks kept for a retry
+
+
+def test_chunk_and_recording_limits(store):
+    upload_id = store.initiate("1", "a.wav")["upload_id"]
+    with pytest.raises(UploadError) as exc:
+        store.append(upload_id, "1", 0, io.BytesIO(b"x" * 2000))
+    assert exc.value.status == 413
+    with pytest.raises(UploadError) as exc:
+        store.initiate("1", "a.wav", size=20000)
+    assert exc.value.status == 413
+
+
+def test_chunk_index_is_bounded(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=10000, chunk_bytes=1024, ttl=3600, max_chunks=10)
+    upload_id = store.initiate("1", "a.wav", None, SHA)["upload_id"]
+    store.append(upload_id, "1", 9, io.BytesIO(b"x"))
+    with pytest.raises(UploadError) as exc:
+        store.append(upload_id, "1", 10, io.BytesIO(b"x"))
+    assert exc.value.status == 413
+    assert store.session(upload_id, "1")["received"] == [9]
+
+
+def test_missing_chunks_are_listed_without_the_full_range(store):
+    upload_id = store.initiate("1", "a.wav", None, SHA)["upload_id"]
+    for n in (0, 3, 40):
+        store.append(upload_id, "1", n, io.BytesIO(b"x"))
+    with pytest.raises(UploadError) as exc:
+        store.finalize(upload_id, "1")
+    assert exc.value.status == 409
+    assert exc.value.message == f"Missing chunks: {[1, 2] + list(range(4, 22))}."
+
+
+def test_concurrent_finalize_gets_409(store, monkeypatch):
+    upload_id = _upload(store)
+    assembling, release = threading.Event(), threading.Event()
+    hashing = hashlib.sha256
+
+    def slow_sha256(*args):
+        assembling.set()
+        release.wait(5)
+        return hashing(*args)
+
+    monkeypatch.setattr(uploads.hashlib, "sha256", slow_sha256)
+    results = []
+    first = threading.Thread(target=lambda: results.append(store.finalize(upload_id, "1")))
+    first.start()
+    assembling.wait(5)
+    monkeypatch.setattr(uploads.hashlib, "sha256", hashing)
+    with pytest.raises(UploadError) as exc:
+        store.finalize(upload_id, "1")
+    assert exc.value.status == 409
+    release.set()
+    first.join()
+    assert results[0]["sha256"] == SHA
+    assert store.finalize(upload_id, "1") == results[0]
+
+
+def test_stale_finalize_marker_is_taken_over(store):
+    upload_id = _upload(store)
+    marker = os.path.join(store._session_dir(upload_id), "finalizing")
+    open(marker, "w").close()
+    with pytest.raises(UploadError):
+        store.finalize(upload_id, "1")
+    old = time.time() - uploads.FINALIZE_STALE_SECONDS - 1
+    os.utime(marker, (old, old))
+    assert store.finalize(upload_id, "1")["sha256"] == SHA
+
+
+def test_close_forgets_the_session(store):
+    upload_id = _upload(store)
+    store.close(upload_id, "1")
+    with pytest.raises(UploadError) as exc:
+        store.session(upload_id, "1")
+    assert exc.value.status == 404
+
+
+# --- /api/uploads ---
+def test_initiate_requires_login(client):
+    assert client.post("/api/uploads", json={"filename": "a.wav"}).status_code == 401
+
+
+@pytest.mark.parametrize("body, error", [
+    (["a.wav"], "Body must be a JSON object."),
+    ("a.wav", "Body must be a JSON object."),
+    ({"filename": 5}, "filename must be a string."),
+    ({"filename": "a.wav", "size": "big"}, "size must be a non-negative integer."),
+    ({"filename": "a.wav", "size": 1.5}, "size must be a non-negative integer."),
+    ({"filename": "a.wav", "size": -1}, "size must be a non-negative integer."),
+    ({"filename": "a.wav", "size": True}, "size must be a non-negative integer."),
+    ({"filename": "a.wav", "sha256": 123}, "sha256 must be a string."),
+])
+def test_initiate_rejects_bad_bodies(auth_client, body, error):
+    r = auth_client.post("/api/uploads", json=body)
+    assert r.status_code == 400
+    assert r.get_json() == {"error": error}
+
+
+def test_initiate_refuses_recordings_too_large_to_score(auth_client):
+    r = auth_client.post("/api/uploads", json={"filename": "a.wav",
+                                               "size": int(api.UPLOAD_PREDICT_MAX_MB * 1024 * 1024) + 1})
+    assert r.status_code == 413
+
+
+def test_huge_chunk_index_is_refused(auth_client):
+    r = auth_client.post("/api/uploads", json={"filename": "a.wav"})
+    upload_id = r.get_json()["upload_id"]
+    assert r.get_json()["max_chunks"] == api.upload_store.max_chunks
+    r = auth_client.put(f"/api/uploads/{upload_id}/chunks/1000000000000", data=b"x")
+    assert r.status_code == 413
+    assert auth_client.get(f"/api/uploads/{upload_id}").get_json()["received"] == []
+
+
+def test_finalize_requires_login(client):
+    assert client.post("/api/uploads/" + "0" * 32 + "/finalize", json={}).status_code == 401
+
+
+def _start(auth_client) -> str:
+    r = auth_client.post("/api/uploads", json={"filename": "a.wav", "size": len(WAV), "sha256": SHA})
+    assert r.status_code == 201
+    upload_id = r.get_json()["upload_id"]
+    for n, start in enumerate(range(0, len(WAV), 1000)):
+        r = auth_client.put(f"/api/uploads/{upload_id}/chunks/{n}", data=WAV[start:start + 1000])
+        assert r.status_code == 200
+    return upload_id
+
+
+@pytest.mark.parametrize("body, error", [
+    ([SHA], "Body must be a JSON object."),
+    ({"sha256": 1}, "sha256 must be a string."),
+])
+def test_finalize_rejects_bad_bodies(auth_client, body, error):
+    r = auth_client.post(f"/api/uploads/{_start(auth_client)}/finalize", json=body)
+    assert r.status_code == 400
+    assert r.get_json() == {"error": error}
+
+
+def test_finalize_refuses_recordings_too_large_to_score(auth_client, monkeypatch):
+    upload_id = _start(auth_client)
+    monkeypatch.setattr(api, "UPLOAD_PREDICT_MAX_MB", 1000 / (1024 * 1024))
+    r = auth_client.post(f"/api/uploads/{upload_id}/finalize")
+    assert r.status_code == 413
+
+
+def test_finalize_scores_and_closes_the_session(auth_client, monkeypatch):
+    scored, budgets = [], []
+
+    def run_prediction(path, sex, age, mmse, digest=None):
+        budgets.append(remaining())
+        with open(path, "rb") as f:
+            scored.append(f.read())
+        return api.prediction_body(api.InferenceBackend(), api.ModelInput(sex, age, mmse, "hello"), "0,0.2")
+
+    monkeypatch.setattr(api, "run_prediction", run_prediction)
+    upload_id = _start(auth_client)
+    r = auth_client.post(f"/api/uploads/{upload_id}/finalize")
+    assert r.status_code == 200
+    assert r.get_json()["upload"] == {"sha256": SHA, "bytes": len(WAV), "filename": "a.wav"}
+    assert scored == [WAV]
+    assert budgets[0] > api.PREDICT_DEADLINE_SECONDS  # long recordings get the long deadline
+    assert auth_client.get(f"/api/uploads/{upload_id}").status_code == 404
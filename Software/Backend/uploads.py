@@ -0,0 +1,236 @@
+"""
+Resumable chunked uploads into a content-addressed store on local disk.
+
+A client initiates an upload, PUTs numbered chunks (in any order, retrying
+any that failed; re-sending a chunk replaces it) and finalizes it. Chunks
+are streamed to their own files under <root>/sessions/<id>/, so a request
+never holds more than one read buffer in memory. Finalizing concatenates
+them in order while hashing, checks the sha256 the client announced and
+moves the result to <root>/objects/<aa>/<sha256>; identical recordings are
+stored once. Sessions and objects are swept after ttl seconds. State is on
+disk, so any worker process on the host can serve any chunk of a session;
+a "finalizing" marker file, created atomically, lets only one of them
+finalize a session at a time.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import IO, Optional
+
+_ID = re.compile(r"^[0-9a-f]{32}$")
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+FINALIZE_STALE_SECONDS = 600  # a finalize marker this old was left by a crashed process
+
+
+class UploadError(Exception):
+    """A rejected upload operation, with the HTTP status of its JSON error response."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadStore:
+    def __init__(self, root: str, max_bytes: int, chunk_bytes: int, ttl: float, max_chunks: int = 10000):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.max_chunks = max_chunks  # chunk indexes are 0..max_chunks-1
+        self.ttl = ttl
+        self._sessions = os.path.join(root, "sessions")
+        self._objects = os.path.join(root, "objects")
+
+    # --- sessions ---
+    def initiate(self, owner: Optional[str], filename: str, size: Optional[int] = None,
+                 sha256: Optional[str] = None) -> dict:
+        if size is not None and size > self.max_bytes:
+            raise UploadError(f"Recording too large (> {self.max_bytes / (1024 * 1024):g} MB).", 413)
+        if sha256 is not None and not _SHA256.match(sha256):
+            raise UploadError("sha256 must be 64 lowercase hex digits.")
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        meta = {"upload_id": upload_id, "owner": owner, "filename": filename, "size": size,
+                "sha256": sha256, "created_at": time.time()}
+        os.makedirs(self._session_dir(upload_id))
+        self._write_meta(upload_id, meta)
+        return meta
+
+    def session(self, upload_id: str, owner: Optional[str]) -> dict:
+        """The session's metadata plus the chunks received so far; 404 for unknown or someone else's."""
+        if not _ID.match(upload_id):
+            raise UploadError("Unknown or expired upload.", 404)
+        try:
+            with open(os.path.join(self._session_dir(upload_id), "meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown or expired upload.", 404)
+        if meta["owner"] != owner:
+            raise UploadError("Unknown or expired upload.", 404)
+        chunks = self._chunks(upload_id)
+        meta["received"] = sorted(chunks)
+        meta["bytes"] = sum(chunks.values())
+        return meta
+
+    def append(self, upload_id: str, owner: Optional[str], index: int, stream: IO[bytes],
+               sha256: Optional[str] = None) -> dict:
+        """Streams one chunk to disk; `sha256`, if given, must match the chunk's bytes."""
+        meta = self.session(upload_id, owner)
+        if meta.get("stored"):
+            raise UploadError("Upload already finalized.", 409)
+        if os.path.exists(os.path.join(self._session_dir(upload_id), "finalizing")):
+            raise UploadError("Upload is being finalized.", 409)
+        if index < 0:
+            raise UploadError("Chunk index must be >= 0.")
+        if index >= self.max_chunks:
+            raise UploadError(f"Too many chunks (at most {self.max_chunks}); send larger ones.", 413)
+        others = meta["bytes"] - self._chunks(upload_id).get(index, 0)
+        h = hashlib.sha256()
+        size = 0
+        d = self._session_dir(upload_id)
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: stream.read(64 * 1024), b""):
+                    size += len(block)
+                    if size > self.chunk_bytes:
+                        raise UploadError(f"Chunk too large (> {self.chunk_bytes / (1024 * 1024):g} MB).", 413)
+                    if others + size > self.max_bytes:
+                        raise UploadError(f"Recording too large (> {self.max_bytes / (1024 * 1024):g} MB).", 413)
+                    h.update(block)
+                    out.write(block)
+            if size == 0:
+                raise UploadError("Empty chunk.")
+            if sha256 is not None and h.hexdigest() != sha256.lower():
+                raise UploadError("Chunk checksum mismatch; send it again.", 422)
+            os.replace(tmp, os.path.join(d, f"{index:06d}.chunk"))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return self.session(upload_id, owner)
+
+    def finalize(self, upload_id: str, owner: Optional[str], sha256: Optional[str] = None) -> dict:
+        """
+        Assembles chunks 0..n-1 into the object store and returns
+        {"sha256", "bytes", "path", "filename"}. The session is kept (minus
+        its chunks) until close(), so finalizing again is cheap and returns
+        the same object: a client can retry if scoring it failed. Raises
+        UploadError 409 while another finalize of the session is running.
+        """
+        self.session(upload_id, owner)
+        marker = self._claim_finalize(upload_id)
+        try:
+            return self._finalize(upload_id, owner, sha256)
+        finally:
+            try:
+                os.unlink(marker)
+            except FileNotFoundError:
+                pass  # the session was closed meanwhile
+
+    def _claim_finalize(self, upload_id: str) -> str:
+        marker = os.path.join(self._session_dir(upload_id), "finalizing")
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return marker
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.path.getmtime(marker) < FINALIZE_STALE_SECONDS:
+                    break
+                # Renamed rather than deleted, so only one caller takes a stale marker over
+                os.rename(marker, f"{marker}.{uuid.uuid4().hex}.stale")
+            except FileNotFoundError:
+                pass  # the other finalize just finished
+        raise UploadError("Upload is being finalized; try again shortly.", 409)
+
+    def _finalize(self, upload_id: str, owner: Optional[str], sha256: Optional[str]) -> dict:
+        meta = self.session(upload_id, owner)  # again: another finalize may have completed meanwhile
+        stored = meta.get("stored")
+        if stored and os.path.exists(self.object_path(stored["sha256"])):
+            return dict(stored, path=self.object_path(stored["sha256"]), filename=meta["filename"])
+        expected = (sha256 or meta["sha256"] or "").lower() or None
+        if expected is None:
+            raise UploadError("sha256 of the whole recording is required to finalize.")
+        received = meta["received"]
+        if not received:
+            raise UploadError("No chunks received.")
+        missing, following = [], 0
+        for index in received:  # sorted; the first 20 gaps, without materialising 0..n
+            missing.extend(range(following, index)[:20 - len(missing)])
+            following = index + 1
+        if missing:
+            raise UploadError(f"Missing chunks: {missing[:20]}.", 409)
+        if meta["size"] is not None and meta["bytes"] != meta["size"]:
+            raise UploadError(f"Received {meta['bytes']} bytes, expected {meta['size']}.", 409)
+
+        d = self._session_dir(upload_id)
+        h = hashlib.sha256()
+        fd, assembled = tempfile.mkstemp(dir=d, suffix=".assembled")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for index in received:
+                    with open(os.path.join(d, f"{index:06d}.chunk"), "rb") as f:
+                        for block in iter(lambda: f.read(1 << 20), b""):
+                            h.update(block)
+                            out.write(block)
+            digest = h.hexdigest()
+            if digest != expected:
+                raise UploadError("Checksum mismatch: the assembled recording does not match sha256.", 422)
+        except BaseException:
+            os.unlink(assembled)
+            raise
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(assembled, path)  # same content either way, so replacing an existing object is harmless
+        os.utime(path)
+        for index in received:
+            os.unlink(os.path.join(d, f"{index:06d}.chunk"))
+        stored = {"sha256": digest, "bytes": meta["bytes"]}
+        self._write_meta(upload_id, dict(meta, stored=stored))
+        return dict(stored, path=path, filename=meta["filename"])
+
+    def close(self, upload_id: str, owner: Optional[str]):
+        """Forgets the session (aborting it if not finalized); a stored object stays until swept."""
+        self.session(upload_id, owner)
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self._objects, sha256[:2], sha256)
+
+    # --- housekeeping ---
+    def sweep(self):
+        """Deletes sessions and objects not touched for ttl seconds."""
+        cutoff = time.time() - self.ttl
+        for base, nested in ((self._sessions, False), (self._objects, True)):
+            if not os.path.isdir(base):
+                continue
+            for name in os.listdir(base):
+                p = os.path.join(base, name)
+                entries = [os.path.join(p, n) for n in os.listdir(p)] if nested else [p]
+                for entry in entries:
+                    try:
+                        if os.path.getmtime(entry) < cutoff:
+                            shutil.rmtree(entry) if os.path.isdir(entry) else os.unlink(entry)
+                    except FileNotFoundError:
+                        pass
+
+    def _session_dir(self, upload_id: str) -> str:
+        return os.path.join(self._sessions, upload_id)
+
+    def _write_meta(self, upload_id: str, meta: dict):
+        with open(os.path.join(self._session_dir(upload_id), "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def _chunks(self, upload_id: str) -> dict:
+        d = self._session_dir(upload_id)
+        out = {}
+        for name in os.listdir(d):
+            if name.endswith(".chunk"):
+                out[int(name[:-6])] = os.path.getsize(os.path.join(d, name))
+        return out
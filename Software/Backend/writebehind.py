@@ -0,0 +1,118 @@
+"""
+Write-behind buffer: rows to insert are queued in memory by the request and
+written by a background thread, many per INSERT and commit, so the request
+never waits for the database.
+
+The writer flushes every `interval` seconds, or as soon as `batch` rows are
+waiting. If the database is unavailable, rows stay queued and are retried
+at the next flush; beyond `max_pending` queued rows the oldest are dropped
+(and counted) rather than letting memory grow. Rows still queued when the
+process exits normally are written at exit; a crash loses at most the last
+`interval` seconds of them, so this suits records that are useful but not
+critical, like prediction history.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert
+
+from metrics import callback, counter, histogram
+
+ROWS = counter("neurovoice_writebehind_rows_total", "Rows through write-behind buffers, by table and outcome "
+               "(written, dropped).", ["table", "outcome"])
+FLUSH_FAILURES = counter("neurovoice_writebehind_flush_failures_total", "Failed write-behind flushes, by table.",
+                         ["table"])
+FLUSH_SECONDS = histogram("neurovoice_writebehind_flush_seconds", "Duration of one write-behind flush, by table.",
+                          ["table"], buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+
+class WriteBehindBuffer:
+    _all = []
+
+    def __init__(self, app: Flask, db: SQLAlchemy, model, interval: float = 1.0, batch: int = 500,
+                 max_pending: int = 100000):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.table = model.__tablename__
+        self.interval = interval
+        self.batch = batch
+        self.max_pending = max_pending
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+        WriteBehindBuffer._all.append(self)
+
+    def _reset(self):
+        # A forked child starts empty: the parent writes its own rows
+        self._rows = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, **row):
+        """Queues one row (column=value) for insertion; returns at once."""
+        with self._lock:
+            self._rows.append(row)
+            dropped = len(self._rows) - self.max_pending
+            for _ in range(max(0, dropped)):
+                self._rows.popleft()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"write-{self.table}", daemon=True)
+                self._thread.start()
+        if dropped > 0:
+            ROWS.inc(dropped, table=self.table, outcome="dropped")
+        if len(self._rows) >= self.batch:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def flush(self) -> int:
+        """Writes everything queued so far; returns how many rows. Raises if the database does."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    rows = [self._rows.popleft() for _ in range(min(self.batch, len(self._rows)))]
+                if not rows:
+                    return written
+                t0 = time.perf_counter()
+                try:
+                    with self.app.app_context():
+                        self.db.session.execute(insert(self.model), rows)
+                        self.db.session.commit()
+                except Exception:
+                    FLUSH_FAILURES.inc(table=self.table)
+                    with self._lock:
+                        self._rows.extendleft(reversed(rows))  # first in line again
+                    raise
+                FLUSH_SECONDS.observe(time.perf_counter() - t0, table=self.table)
+                ROWS.inc(len(rows), table=self.table, outcome="written")
+                written += len(rows)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[WRITE-BEHIND ERROR] {self.table}: {e!r}; {self.pending()} rows kept for the next try")
+                time.sleep(self.interval)
+
+
+def _pending():
+    return {(buffer.table,): buffer.pending() for buffer in WriteBehindBuffer._all}
+
+
+callback("neurovoice_writebehind_pending", "Rows queued in write-behind buffers, by table.", "gauge", ["table"],
+         _pending)